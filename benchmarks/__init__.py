@@ -0,0 +1,48 @@
+"""
+Benchmarks of PicScape's hot paths.
+
+Run them from the project root with ``python -m benchmarks.<name>``. They
+work on a throwaway database, so db.sqlite3 is never touched.
+"""
+
+# Utilities
+import os
+
+import django
+
+
+def setup():
+    """
+    Configure Django and create the throwaway benchmark database.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'picscape.settings')
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    connection.settings_dict['TEST']['NAME'] = settings.BASE_DIR / 'bench_db.sqlite3'
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def teardown():
+    """
+    Destroy the benchmark database.
+    """
+    from django.db import connection
+    from django.test.utils import teardown_test_environment
+
+    connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+    teardown_test_environment()
+
+
+def percentile(values, fraction):
+    """
+    Return the given percentile of a list of values, by nearest rank.
+    """
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
@@ -0,0 +1,251 @@
+"""
+Concurrent throughput of the feed, post detail and like views, under ASGI and WSGI.
+
+Seeds a synthetic dataset, then serves each journey to a number of
+concurrent clients: through Django's ASGI handler on an event loop, and
+through its WSGI handler on a pool of threads, the way a threaded WSGI
+server such as gunicorn's gthread workers would. The handlers are called
+directly, so the numbers measure Django and the views rather than a server:
+
+    python -m benchmarks.asgi --concurrency 1 --concurrency 50
+"""
+
+# Benchmarks
+from benchmarks import percentile, setup, teardown
+
+setup()
+
+# Django
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import Client, override_settings
+from django.urls import reverse
+
+# Models
+from django.contrib.auth.models import User
+from posts.models import Post
+
+# Seeding
+from posts import seeding
+
+# Images
+from picscape import images
+
+# Utilities
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+CLIENTS = 20
+
+JOURNEYS = ('feed', 'post_detail', 'like')
+
+
+def session_cookies(user_ids, seed):
+    """
+    Return the session cookies of random logged in users.
+    """
+    rng = random.Random(seed)
+    cookies = []
+    for user in User.objects.filter(pk__in=rng.sample(user_ids, min(CLIENTS, len(user_ids)))):
+        client = Client()
+        client.force_login(user)
+        # Let the session learn that the profile is complete
+        client.get(reverse('posts:feed'))
+        cookies.append('; '.join(f'{name}={morsel.value}' for name, morsel in client.cookies.items()))
+    return cookies
+
+
+def paths(journey, post_ids, count, rng):
+    """
+    Return the paths requested by a journey.
+    """
+    if journey == 'feed':
+        return [reverse('posts:feed')] * count
+    # The like view toggles on GET too, which spares the CSRF tokens
+    view = 'posts:detail' if journey == 'post_detail' else 'posts:like'
+    return [reverse(view, kwargs={'pk': rng.choice(post_ids)}) for _ in range(count)]
+
+
+async def asgi_request(handler, path, cookie):
+    """
+    Serve a GET request through the ASGI handler, return its status code.
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    status = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await handler(scope, receive, send)
+    return status
+
+
+def wsgi_request(handler, path, cookie):
+    """
+    Serve a GET request through the WSGI handler, return its status code.
+    """
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_COOKIE': cookie,
+        'wsgi.input': BytesIO(),
+        'wsgi.url_scheme': 'http',
+    }
+    statuses = []
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+def run_asgi(requests, concurrency):
+    """
+    Serve the requests from concurrent tasks, return their latencies and the total duration.
+    """
+    handler = ASGIHandler()
+    latencies = []
+
+    async def worker(queue):
+        while queue:
+            path, cookie = queue.pop()
+            start = time.perf_counter()
+            status = await asgi_request(handler, path, cookie)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                raise RuntimeError(f'{path} answered {status}')
+
+    async def main():
+        queue = list(reversed(requests))
+        await asyncio.gather(*(worker(queue) for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return latencies, time.perf_counter() - start
+
+
+def run_wsgi(requests, concurrency):
+    """
+    Serve the requests from a pool of threads, return their latencies and the total duration.
+    """
+    handler = WSGIHandler()
+
+    def request(item):
+        path, cookie = item
+        start = time.perf_counter()
+        status = wsgi_request(handler, path, cookie)
+        if status >= 400:
+            raise RuntimeError(f'{path} answered {status}')
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(request, requests))
+    return latencies, time.perf_counter() - start
+
+
+SERVERS = {
+    'asgi': run_asgi,
+    'wsgi': run_wsgi,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.asgi', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200, help='Number of users.')
+    parser.add_argument('--follows', type=int, default=20, help='Mean followees per user.')
+    parser.add_argument('--posts', type=int, default=10, help='Mean posts per user.')
+    parser.add_argument('--likes', type=int, default=50, help='Mean likes per user.')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per journey and run.')
+    parser.add_argument(
+        '--concurrency', type=int, action='append',
+        help='Concurrent clients, repeat to compare several (default: 1, 10 and 50).',
+    )
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset and the requests.')
+    parser.add_argument('--journey', action='append', choices=JOURNEYS, help='Only run these journeys.')
+    options = parser.parse_args(argv)
+
+    seeding.seed(
+        users=options.users,
+        follows=options.follows,
+        posts=options.posts,
+        likes=options.likes,
+        seed=options.seed,
+        images_count=4,
+    )
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+    cookies = session_cookies(user_ids, options.seed)
+    rng = random.Random(options.seed)
+    # Contended writes are slow requests, their reports would drown the results
+    logging.disable(logging.WARNING)
+
+    print(f'{"journey":<14}{"server":<8}{"clients":>8}{"p50 ms":>9}{"p95 ms":>9}{"req/s":>9}')
+    for journey in options.journey or JOURNEYS:
+        for concurrency in options.concurrency or (1, 10, 50):
+            for server, run in SERVERS.items():
+                requests = [
+                    (path, rng.choice(cookies))
+                    for path in paths(journey, post_ids, options.requests, rng)
+                ]
+                run(requests[:concurrency], concurrency)  # Warm up
+                latencies, duration = run(requests, concurrency)
+                print(
+                    f'{journey:<14}{server:<8}{concurrency:>8}'
+                    f'{round(percentile(latencies, 0.50) * 1000, 2):>9}'
+                    f'{round(percentile(latencies, 0.95) * 1000, 2):>9}'
+                    f'{round(len(requests) / duration, 1):>9}'
+                )
+    return 0
+
+
+if __name__ == '__main__':
+    media_root = tempfile.mkdtemp()
+    settings = override_settings(
+        DEBUG=False,
+        MEDIA_ROOT=media_root,
+        PICSCAPE_THUMBNAIL_CACHE_DIR=f'{media_root}/cache',
+    )
+    settings.enable()
+    try:
+        status = main()
+    finally:
+        # Let the pending renditions finish before dropping their database
+        images.get_executor().shutdown()
+        settings.disable()
+        shutil.rmtree(media_root)
+        teardown()
+    sys.exit(status)
@@ -0,0 +1,229 @@
+"""
+Latency, queries and throughput of the core user journeys.
+
+Seeds a synthetic dataset, then drives the feed, post detail, profile,
+like, follow and upload views through the test client, as logged in users
+picked at random. Results can be saved as JSON and compared against a
+previous run, exiting with an error when a journey regressed:
+
+    python -m benchmarks.journeys --output baseline.json
+    python -m benchmarks.journeys --baseline baseline.json
+"""
+
+# Benchmarks
+from benchmarks import percentile, setup, teardown
+
+setup()
+
+# Django
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+import django
+
+# Models
+from django.contrib.auth.models import User
+from posts.models import Post
+
+# Seeding
+from posts import seeding
+
+# Images
+from picscape import images
+
+# Utilities
+from io import BytesIO
+from PIL import Image
+import argparse
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+CLIENTS = 20
+
+
+class Journeys:
+    """
+    Requests of every journey, made by random logged in users.
+    """
+
+    def __init__(self, user_ids, post_ids, seed):
+        self.rng = random.Random(seed)
+        self.post_ids = post_ids
+        self.usernames = dict(User.objects.filter(pk__in=user_ids).values_list('pk', 'username'))
+        self.clients = []
+        for user in User.objects.filter(pk__in=self.rng.sample(user_ids, min(CLIENTS, len(user_ids)))):
+            client = Client()
+            client.force_login(user)
+            # Let the session learn that the profile is complete
+            client.get(reverse('posts:feed'))
+            self.clients.append((user, client))
+
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), 'orange').save(buffer, 'JPEG', quality=90)
+        self.photo = buffer.getvalue()
+
+    def client(self):
+        return self.rng.choice(self.clients)
+
+    def feed(self):
+        _, client = self.client()
+        return client.get(reverse('posts:feed'))
+
+    def post_detail(self):
+        _, client = self.client()
+        return client.get(reverse('posts:detail', kwargs={'pk': self.rng.choice(self.post_ids)}))
+
+    def profile(self):
+        _, client = self.client()
+        username = self.usernames[self.rng.choice(list(self.usernames))]
+        return client.get(reverse('users:detail', kwargs={'username': username}))
+
+    def like(self):
+        _, client = self.client()
+        return client.post(reverse('posts:like', kwargs={'pk': self.rng.choice(self.post_ids)}))
+
+    def follow(self):
+        user, client = self.client()
+        user_id = self.rng.choice([pk for pk in self.usernames if pk != user.pk])
+        return client.post(reverse('users:follow', kwargs={'username': self.usernames[user_id]}))
+
+    def upload(self):
+        _, client = self.client()
+        photo = SimpleUploadedFile('photo.jpeg', self.photo, content_type='image/jpeg')
+        return client.post(reverse('posts:create'), {'title': 'Benchmark', 'photo': photo})
+
+
+JOURNEYS = ('feed', 'post_detail', 'profile', 'like', 'follow', 'upload')
+
+
+def measure(request, count):
+    """
+    Make a journey's request repeatedly and summarize its cost.
+    """
+    request()  # Warm up
+    latencies = []
+    queries = 0
+    for _ in range(count):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = request()
+            latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{request.__name__} answered {response.status_code}')
+        queries += len(captured)
+    return {
+        'requests': count,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries_per_request': round(queries / count, 2),
+        'throughput_rps': round(count / sum(latencies), 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the regressions of the results against a baseline run.
+    """
+    regressions = []
+    for name, previous in baseline['journeys'].items():
+        current = results['journeys'].get(name)
+        if current is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 went from {previous["p95_ms"]} to {current["p95_ms"]} ms')
+        if current['queries_per_request'] > previous['queries_per_request'] + 0.01:
+            regressions.append(
+                f'{name}: queries per request went from '
+                f'{previous["queries_per_request"]} to {current["queries_per_request"]}'
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.journeys', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200, help='Number of users.')
+    parser.add_argument('--follows', type=int, default=20, help='Mean followees per user.')
+    parser.add_argument('--posts', type=int, default=10, help='Mean posts per user.')
+    parser.add_argument('--likes', type=int, default=50, help='Mean likes per user.')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per journey.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset and the requests.')
+    parser.add_argument('--journey', action='append', choices=JOURNEYS, help='Only run these journeys.')
+    parser.add_argument('--output', help='Save the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare the results against this JSON file.')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.25,
+        help='Allowed p95 slowdown against the baseline, as a fraction (default: 0.25).',
+    )
+    options = parser.parse_args(argv)
+
+    dataset_options = {
+        'users': options.users,
+        'follows': options.follows,
+        'posts': options.posts,
+        'likes': options.likes,
+        'seed': options.seed,
+    }
+    seeding.seed(images_count=4, **dataset_options)
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+    journeys = Journeys(user_ids, post_ids, options.seed)
+
+    results = {
+        'dataset': dataset_options,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+        },
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'journeys': {},
+    }
+    print(f'{"journey":<14}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}{"req/s":>9}')
+    for name in options.journey or JOURNEYS:
+        summary = results['journeys'][name] = measure(getattr(journeys, name), options.requests)
+        print(
+            f'{name:<14}{summary["p50_ms"]:>9}{summary["p95_ms"]:>9}{summary["p99_ms"]:>9}'
+            f'{summary["queries_per_request"]:>9}{summary["throughput_rps"]:>9}'
+        )
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+        if baseline['dataset'] != dataset_options:
+            print('Warning: the baseline was run on a different dataset', file=sys.stderr)
+        regressions = compare(results, baseline, options.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    media_root = tempfile.mkdtemp()
+    settings = override_settings(
+        DEBUG=False,
+        MEDIA_ROOT=media_root,
+        PICSCAPE_THUMBNAIL_CACHE_DIR=f'{media_root}/cache',
+    )
+    settings.enable()
+    try:
+        status = main()
+    finally:
+        # Let the pending renditions finish before dropping their database
+        images.get_executor().shutdown()
+        settings.disable()
+        shutil.rmtree(media_root)
+        teardown()
+    sys.exit(status)
@@ -0,0 +1,161 @@
+"""
+Throughput of likes on hot posts, written directly or through the buffer.
+
+Several processes, standing in for gunicorn workers, toggle likes of a
+handful of posts as random users, with the sqlite-production profile. Likes
+are written directly, then buffered in each process's memory, then in a
+file shared by the processes. Each mode works on its own copy of the same
+seeded database, and the counters are checked against the likes after the
+final flush.
+"""
+
+# Benchmarks
+from benchmarks import percentile, setup, teardown
+
+# Utilities
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+WORKERS = 4
+DURATION = 10
+USERS = 500
+HOT_POSTS = 5
+MODES = ('direct', 'memory', 'file')
+
+
+def seed():
+    """
+    Fill the benchmark database with users and a few posts.
+    """
+    from django.contrib.auth.models import User
+    from posts.models import Post
+    from users.models import Profile
+
+    users = [User(username=f'user{i}') for i in range(USERS)]
+    User.objects.bulk_create(users)
+    Profile.objects.bulk_create([Profile(user=user, biography='Hello!') for user in User.objects.all()])
+    author = User.objects.first()
+    for i in range(HOT_POSTS):
+        Post.objects.create(user=author, title=f'Post {i}', photo=f'posts/photos/{i}.jpeg')
+
+
+def work(mode, path, start, results):
+    """
+    Toggle likes until the deadline and report the outcome.
+    """
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'picscape.settings'
+    os.environ['PICSCAPE_SQLITE_PATH'] = path
+    os.environ['PICSCAPE_DB_PROFILE'] = 'sqlite-production'
+
+    import django
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.core import signals
+    from django.db import OperationalError
+    from django.test import override_settings
+    from posts import likes_buffer
+    from posts.models import Post
+
+    override_settings(
+        PICSCAPE_LIKES_BUFFER=None if mode == 'direct' else mode,
+        PICSCAPE_LIKES_BUFFER_PATH=f'{path}.likes',
+    ).enable()
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    signals.request_finished.send(sender=None)
+    time.sleep(max(0, start - time.time()))
+
+    deadline = start + DURATION
+    operations = errors = 0
+    latencies = []
+    while time.time() < deadline:
+        user = User(pk=random.choice(user_ids))
+        began = time.perf_counter()
+        signals.request_started.send(sender=None)
+        try:
+            likes_buffer.toggle(user, random.choice(post_ids))
+            operations += 1
+            latencies.append(time.perf_counter() - began)
+        except OperationalError:
+            errors += 1
+        finally:
+            signals.request_finished.send(sender=None)
+
+    began = time.perf_counter()
+    likes_buffer.flush()
+    results.put((operations, errors, latencies, time.perf_counter() - began))
+
+
+def check(path):
+    """
+    Return the number of likes and whether the counters match them.
+    """
+    import sqlite3
+
+    with sqlite3.connect(path) as connection:
+        likes, = connection.execute('SELECT count(*) FROM posts_likes').fetchone()
+        drifted, = connection.execute(
+            'SELECT count(*) FROM posts_post WHERE likes_count != '
+            '(SELECT count(*) FROM posts_likes WHERE post_id = posts_post.id)'
+        ).fetchone()
+    return likes, not drifted
+
+
+def run(mode, path):
+    """
+    Run the workers against a database and print their results.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    # Leave the processes time to set Django up before measuring
+    start = time.time() + 3
+    processes = [context.Process(target=work, args=(mode, path, start, results)) for _ in range(WORKERS)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    operations = sum(outcome[0] for outcome in outcomes)
+    errors = sum(outcome[1] for outcome in outcomes)
+    latencies = [latency for outcome in outcomes for latency in outcome[2]]
+    final_flush = max(outcome[3] for outcome in outcomes)
+    likes, consistent = check(path)
+    print(
+        f'{mode:<10}{operations / DURATION:>10.0f}{errors:>10}'
+        f'{percentile(latencies, 0.5) * 1000:>10.2f}{percentile(latencies, 0.99) * 1000:>10.2f}'
+        f'{final_flush * 1000:>12.0f}{likes:>10}{"yes" if consistent else "NO":>12}'
+    )
+
+
+def main():
+    from django.db import connection
+
+    seed()
+    connection.close()
+    source = str(connection.settings_dict['NAME'])
+    directory = tempfile.mkdtemp()
+    try:
+        print(
+            f'{"mode":<10}{"likes/s":>10}{"errors":>10}{"p50 ms":>10}{"p99 ms":>10}'
+            f'{"flush ms":>12}{"likes":>10}{"counters ok":>12}'
+        )
+        for mode in MODES:
+            path = os.path.join(directory, f'{mode}.sqlite3')
+            shutil.copyfile(source, path)
+            run(mode, path)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    setup()
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,98 @@
+"""
+Per-request overhead of ProfileCompletionMiddleware.
+
+Compares the middleware against its previous implementation, which
+resolved three URLs and loaded the user's profile on every request.
+"""
+
+# Benchmarks
+from benchmarks import setup, teardown
+
+setup()
+
+# Django
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Middleware
+from picscape.middleware import ProfileCompletionMiddleware
+
+# Models
+from users.models import Profile
+
+# Utilities
+import time
+
+REQUESTS = 2000
+
+
+class PreviousProfileCompletionMiddleware:
+    """
+    ProfileCompletionMiddleware as it was before caching its checks.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_staff and not request.path.startswith(reverse('admin:index')):
+            return redirect(reverse('admin:index'))
+        if (
+            request.user.is_anonymous
+            or request.user.is_staff
+            or request.user.profile.picture and request.user.profile.biography
+            or request.path == reverse('users:profile')
+            or request.path == reverse('users:logout')
+        ):
+            return self.get_response(request)
+        return redirect('users:profile')
+
+
+def measure(middleware_class, user_id):
+    """
+    Return the mean time, in microseconds, and queries of a request.
+    """
+    middleware = middleware_class(lambda request: HttpResponse())
+    factory = RequestFactory()
+    session = SessionStore()
+    path = reverse('posts:feed')
+
+    elapsed = 0
+    queries = 0
+    for _ in range(REQUESTS):
+        # Every request gets a fresh user, as AuthenticationMiddleware does
+        request = factory.get(path)
+        request.user = User.objects.get(pk=user_id)
+        request.session = session
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            middleware(request)
+            elapsed += time.perf_counter() - start
+        queries += len(captured)
+    return elapsed / REQUESTS * 1e6, queries / REQUESTS
+
+
+def main():
+    user = User.objects.create_user(username='benchmark', password='1234')
+    Profile.objects.create(user=user, biography='Hello!', picture='users/pictures/benchmark.jpeg')
+
+    print(f'{"middleware":<12}{"us/request":>12}{"queries/request":>18}')
+    for name, middleware_class in (
+        ('before', PreviousProfileCompletionMiddleware),
+        ('after', ProfileCompletionMiddleware),
+    ):
+        micros, queries = measure(middleware_class, user.pk)
+        print(f'{name:<12}{micros:>12.1f}{queries:>18.2f}')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
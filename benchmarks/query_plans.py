@@ -0,0 +1,72 @@
+"""
+Query plans of the hot queries on a seeded dataset.
+
+Seeds a dataset, gathers the planner statistics and runs EXPLAIN on the
+feed, profile and toggle queries of the busiest users. Exits with an error
+when any of them scans a whole table:
+
+    python -m benchmarks.query_plans --users 2000
+"""
+
+# Benchmarks
+from benchmarks import setup, teardown
+
+setup()
+
+# Django
+from django.db import connection
+from django.test import override_settings
+
+# Models
+from django.contrib.auth.models import User
+from posts.models import Post
+
+# Seeding and plans
+from posts import query_plans, seeding
+
+# Utilities
+import argparse
+import shutil
+import sys
+import tempfile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.query_plans', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000, help='Number of users.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset.')
+    parser.add_argument('--verbose', action='store_true', help='Print every query plan.')
+    options = parser.parse_args(argv)
+
+    seeding.seed(users=options.users, images_count=1, seed=options.seed)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    # The most active follower, looking at the most followed author
+    user = User.objects.order_by('-profile__following_count', 'pk').first()
+    other = User.objects.order_by('-profile__followers_count', 'pk').first()
+    post = Post.objects.filter(user=other).order_by('-created', '-pk')[1]
+
+    failures = 0
+    for name, queryset in query_plans.hot_queries(user, other, post).items():
+        scans = query_plans.full_scans(queryset, query_plans.INDEX_WALKS.get(name, ()))
+        failures += bool(scans)
+        print(f'{name:<20}{"FULL SCAN" if scans else "ok"}')
+        for line in scans:
+            print(f'    {line}')
+        if options.verbose:
+            print(queryset.explain())
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    media_root = tempfile.mkdtemp()
+    settings = override_settings(MEDIA_ROOT=media_root)
+    settings.enable()
+    try:
+        status = main()
+    finally:
+        settings.disable()
+        shutil.rmtree(media_root)
+        teardown()
+    sys.exit(status)
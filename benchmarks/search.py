@@ -0,0 +1,125 @@
+"""
+Latency of full-text searches on a large dataset.
+
+Seeds a dataset, adds posts with generated titles up to the requested count,
+rebuilds the search index, then times searches for common, rare and several
+words, and username autocompletes. Post searches are compared with a naive
+case-insensitive LIKE over the titles:
+
+    python -m benchmarks.search --posts 1000000
+"""
+
+# Benchmarks
+from benchmarks import percentile, setup, teardown
+
+setup()
+
+# Django
+from django.test import override_settings
+
+# Models
+from django.contrib.auth.models import User
+from posts.models import Post
+
+# Seeding and search
+from posts import seeding
+from search import fulltext
+
+# Utilities
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+
+def add_posts(count, seed):
+    """
+    Add posts with generated titles by the seeded users, up to count posts.
+    """
+    rng = random.Random(seed)
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    photo, renditions = Post.objects.values_list('photo', 'photo_renditions').first()
+    ranked_words, word_weights = seeding.popularity(rng, seeding.WORDS)
+    # Searches rank the newest posts by id, their dates do not matter
+    seeding.insert(Post, (
+        Post(
+            user_id=rng.choice(user_ids),
+            title=seeding.title(rng, ranked_words, word_weights),
+            photo=photo,
+            photo_renditions=renditions,
+        )
+        for _ in range(count - Post.objects.count())
+    ), 10000)
+    return ranked_words
+
+
+def measure(search, queries, repeat):
+    """
+    Run a search over the queries repeatedly and return its p50 and p95.
+    """
+    search(queries[0])  # Warm up
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            latencies.append(time.perf_counter() - start)
+    return round(percentile(latencies, 0.50) * 1000, 2), round(percentile(latencies, 0.95) * 1000, 2)
+
+
+def like_search(query):
+    """
+    Search posts the naive way, newest first, with a LIKE over every title.
+    """
+    queryset = Post.objects.order_by('-created', '-pk')
+    for term in fulltext.terms(query):
+        queryset = queryset.filter(title__icontains=term)
+    return list(queryset.values_list('pk', flat=True)[:10])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.search', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000, help='Number of users.')
+    parser.add_argument('--posts', type=int, default=1000000, help='Number of posts.')
+    parser.add_argument('--repeat', type=int, default=20, help='Times each query is measured.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset.')
+    options = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    seeding.seed(users=options.users, follows=5, posts=1, likes=1, images_count=1, seed=options.seed)
+    ranked_words = add_posts(options.posts, options.seed)
+    print(f'Seeded {Post.objects.count()} posts in {time.perf_counter() - start:.1f} s')
+
+    start = time.perf_counter()
+    totals = fulltext.rebuild()
+    print(f'Indexed {totals["posts"]} posts and {totals["users"]} users in {time.perf_counter() - start:.1f} s')
+
+    queries = {
+        'common word': ranked_words[:5],
+        'rare word': ranked_words[-5:],
+        'several words': [f'{a} {b}' for a, b in zip(ranked_words[:5], ranked_words[5:10])],
+    }
+    print(f'{"query":<26}{"p50 ms":>10}{"p95 ms":>10}')
+    for name, words in queries.items():
+        for engine, search in (('full-text', fulltext.search_posts), ('LIKE', like_search)):
+            p50, p95 = measure(search, words, options.repeat)
+            print(f'{f"{name}, {engine}":<26}{p50:>10}{p95:>10}')
+    prefixes = [f'seed{options.seed}-{i}' for i in range(1, 10)]
+    p50, p95 = measure(fulltext.autocomplete, prefixes, options.repeat)
+    print(f'{"autocomplete":<26}{p50:>10}{p95:>10}')
+    return 0
+
+
+if __name__ == '__main__':
+    media_root = tempfile.mkdtemp()
+    settings = override_settings(MEDIA_ROOT=media_root)
+    settings.enable()
+    try:
+        status = main()
+    finally:
+        settings.disable()
+        shutil.rmtree(media_root)
+        teardown()
+    sys.exit(status)
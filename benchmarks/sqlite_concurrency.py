@@ -0,0 +1,151 @@
+"""
+Read/write concurrency of the SQLite database profiles.
+
+Several processes, standing in for gunicorn workers, read home feeds while
+others toggle likes, first with the default settings and then with the
+sqlite-production profile. Each profile works on its own copy of the same
+seeded database and every operation is wrapped in the request signals, so
+connections are closed or reused as they would be in a real request.
+"""
+
+# Benchmarks
+from benchmarks import percentile, setup, teardown
+
+# Utilities
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+READERS = 4
+WRITERS = 2
+DURATION = 10
+USERS = 50
+POSTS_PER_USER = 20
+PROFILES = ('default', 'sqlite-production')
+
+
+def seed():
+    """
+    Fill the benchmark database with users following each other and posts.
+    """
+    from django.contrib.auth.models import User
+    from posts import timelines
+    from posts.models import Post
+    from users.models import Follows, Profile
+
+    random.seed(0)
+    users = []
+    for i in range(USERS):
+        user = User.objects.create_user(username=f'user{i}', password='1234')
+        Profile.objects.create(user=user, biography='Hello!', picture=f'users/pictures/{i}.jpeg')
+        users.append(user)
+    for user in users:
+        for followee in random.sample(users, 10):
+            if followee != user:
+                Follows.objects.follow(user, followee)
+    for i in range(POSTS_PER_USER):
+        for user in users:
+            post = Post.objects.create(user=user, title=f'Post {i}', photo=f'posts/photos/{i}.jpeg')
+            timelines.fan_out(post)
+
+
+def work(profile, path, role, start, results):
+    """
+    Read feeds or toggle likes until the deadline and report the outcome.
+    """
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'picscape.settings'
+    os.environ['PICSCAPE_SQLITE_PATH'] = path
+    if profile == 'default':
+        os.environ.pop('PICSCAPE_DB_PROFILE', None)
+    else:
+        os.environ['PICSCAPE_DB_PROFILE'] = profile
+
+    import django
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.core import signals
+    from django.db import OperationalError
+    from posts import timelines
+    from posts.models import Likes, Post
+
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    signals.request_finished.send(sender=None)
+    time.sleep(max(0, start - time.time()))
+
+    deadline = start + DURATION
+    operations = errors = 0
+    latencies = []
+    while time.time() < deadline:
+        user = User(pk=random.choice(user_ids))
+        began = time.perf_counter()
+        signals.request_started.send(sender=None)
+        try:
+            if role == 'reader':
+                list(timelines.timeline_posts(user).with_feed_data(user)[:5])
+            else:
+                Likes.objects.toggle(user, Post(pk=random.choice(post_ids)))
+            operations += 1
+            latencies.append(time.perf_counter() - began)
+        except OperationalError:
+            errors += 1
+        finally:
+            signals.request_finished.send(sender=None)
+    results.put((role, operations, errors, latencies))
+
+
+def run(profile, path):
+    """
+    Run the readers and writers against a database and print their results.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    # Leave the processes time to set Django up before measuring
+    start = time.time() + 3
+    processes = [
+        context.Process(target=work, args=(profile, path, role, start, results))
+        for role in ['reader'] * READERS + ['writer'] * WRITERS
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    for role in ('reader', 'writer'):
+        operations = sum(outcome[1] for outcome in outcomes if outcome[0] == role)
+        errors = sum(outcome[2] for outcome in outcomes if outcome[0] == role)
+        latencies = [latency for outcome in outcomes if outcome[0] == role for latency in outcome[3]]
+        print(
+            f'{profile:<20}{role + "s":<10}{operations / DURATION:>10.0f}{errors:>10}'
+            f'{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}'
+        )
+
+
+def main():
+    from django.db import connection
+
+    seed()
+    connection.close()
+    source = str(connection.settings_dict['NAME'])
+    directory = tempfile.mkdtemp()
+    try:
+        print(f'{"profile":<20}{"role":<10}{"ops/s":>10}{"errors":>10}{"p50 ms":>10}{"p99 ms":>10}')
+        for profile in PROFILES:
+            path = os.path.join(directory, f'{profile}.sqlite3')
+            shutil.copyfile(source, path)
+            run(profile, path)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    setup()
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,193 @@
+"""
+Peak memory of a photo upload.
+
+Uploads phone-sized JPEG photos through the post creation view, with their
+renditions created inline, and reports how much each upload raised the
+peak RSS of the process. The previous upload path, with Django's default
+upload handlers, Pillow validation and full decoding of the photo, is
+measured for comparison. Every upload runs in a fresh process, so their
+peaks do not hide each other. Linux only, the peaks are read from /proc.
+"""
+
+# Benchmarks
+from benchmarks import setup, teardown
+
+# Utilities
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Photo sizes, in pixels
+SIZES = [(4000, 3000), (6000, 4000), (8000, 6000)]
+MODES = ('previous', 'streamed')
+BOUNDARY = 'UploadMemoryBoundary'
+
+
+def rss(field):
+    """
+    Return the current (VmRSS) or peak (VmHWM) resident set size of the
+    process, in bytes.
+    """
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident set size of the process to its current size.
+    The peak, like ru_maxrss, is otherwise inherited from the parent process.
+    """
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+
+
+def write_body(path, photo):
+    """
+    Write the multipart body of a post creation request.
+    """
+    with open(path, 'wb') as body, open(photo, 'rb') as file:
+        body.write((
+            f'--{BOUNDARY}\r\n'
+            f'Content-Disposition: form-data; name="title"\r\n\r\nPhoto\r\n'
+            f'--{BOUNDARY}\r\n'
+            f'Content-Disposition: form-data; name="photo"; filename="photo.jpeg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'
+        ).encode())
+        shutil.copyfileobj(file, body)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+
+def use_previous_upload_path():
+    """
+    Restore the upload path as it was before streaming the uploads.
+    """
+    from django import forms
+    from django.conf import settings
+    from picscape import images
+    from posts.forms import PostForm
+    from PIL import Image
+
+    settings.FILE_UPLOAD_HANDLERS = [
+        'django.core.files.uploadhandler.MemoryFileUploadHandler',
+        'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+    ]
+    PostForm.base_fields['photo'] = forms.ImageField()
+
+    def open_image(name, max_size=None):
+        with images.default_storage.open(name) as file:
+            image = Image.open(file)
+            image.load()
+        image = images.prepare(image)
+        return image, image.width, image.height
+
+    images.open_image = open_image
+
+
+def upload(mode, database, media_root, path, results):
+    """
+    Upload a photo from a fresh process and report the growth of its peak RSS.
+    """
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'picscape.settings'
+    os.environ['PICSCAPE_SQLITE_PATH'] = database
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+
+    setup_test_environment()
+    # Every upload is a slow request, keep them out of the output
+    logging.disable(logging.WARNING)
+    settings.MEDIA_ROOT = media_root
+    settings.PICSCAPE_IMAGE_ASYNC = False
+    if mode == 'previous':
+        use_previous_upload_path()
+
+    client = Client()
+    client.force_login(User.objects.get(username='benchmark'))
+
+    def post(path):
+        # The test client would build the whole body in memory, stream it instead
+        with open(path, 'rb') as body:
+            environ = client._base_environ(**{
+                'PATH_INFO': reverse('posts:create'),
+                'REQUEST_METHOD': 'POST',
+                'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+                'CONTENT_LENGTH': str(os.path.getsize(path)),
+                'wsgi.input': body,
+            })
+            return client.handler(environ)
+
+    # Warm up the imports and the caches with a small photo
+    post(os.path.join(os.path.dirname(path), 'small.body'))
+
+    reset_peak_rss()
+    before = rss('VmRSS')
+    response = post(path)
+    assert response.status_code == 302, response.status_code
+    results.put(rss('VmHWM') - before)
+
+
+def main():
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from PIL import Image
+    from users.models import Profile
+
+    user = User.objects.create_user(username='benchmark', password='1234')
+    Profile.objects.create(user=user, biography='Hello!', picture='users/pictures/benchmark.jpeg')
+    connection.close()
+
+    directory = tempfile.mkdtemp()
+    context = multiprocessing.get_context('spawn')
+    try:
+        Image.new('RGB', (640, 480), 'gray').save(os.path.join(directory, 'small.jpeg'))
+        write_body(os.path.join(directory, 'small.body'), os.path.join(directory, 'small.jpeg'))
+        print(f'{"photo":<16}{"file MB":>9}{"decoded MB":>12}{"previous MB":>13}{"streamed MB":>13}')
+        for width, height in SIZES:
+            path = os.path.join(directory, f'{width}x{height}.jpeg')
+            Image.effect_noise((width, height), 32).convert('RGB').save(path, quality=75)
+            write_body(f'{path}.body', path)
+
+            peaks = {}
+            for mode in MODES:
+                media_root = os.path.join(directory, mode)
+                results = context.Queue()
+                process = context.Process(
+                    target=upload,
+                    args=(mode, str(settings.DATABASES['default']['NAME']), media_root, f'{path}.body', results),
+                )
+                process.start()
+                process.join()
+                if process.exitcode:
+                    raise RuntimeError(f'The {mode} upload of {width}x{height} failed')
+                peaks[mode] = results.get()
+
+            print(
+                f'{f"{width * height / 1e6:.0f} MP":<16}'
+                f'{os.path.getsize(path) / 2 ** 20:>9.1f}'
+                f'{width * height * 3 / 2 ** 20:>12.1f}'
+                f'{peaks["previous"] / 2 ** 20:>13.1f}'
+                f'{peaks["streamed"] / 2 ** 20:>13.1f}',
+                flush=True,
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    setup()
+    try:
+        main()
+    finally:
+        teardown()
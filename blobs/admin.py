@@ -0,0 +1,15 @@
+# Django
+from django.contrib import admin
+
+# Models
+from blobs.models import Blob
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    """
+    Blob admin, read only.
+    """
+    list_display = ('name', 'size', 'refs')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'size', 'refs')
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class BlobsConfig(AppConfig):
+    """
+    Blobs application settings.
+    """
+    default_auto_field = "django.db.models.BigAutoField"
+    name = 'blobs'
+    verbose_name = 'Blobs'
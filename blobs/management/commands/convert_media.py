@@ -0,0 +1,40 @@
+# Django
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+# Blobs
+from blobs import references
+from blobs.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    """
+    Move the existing media files into content-addressed blobs.
+    """
+    help = (
+        "Move the pictures and renditions stored before the blobs into blobs, "
+        "then recount the references and delete the unreferenced blobs. "
+        "Running it again only recounts the references."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help='Keep the original files once converted.',
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('The default storage is not content-addressed, see STORAGES.')
+        report = references.convert(
+            keep_originals=options['keep_originals'],
+            log=lambda message: self.stdout.write(message),
+        )
+        self.stdout.write(
+            f'{report["drifted"]} blobs had their references recounted, '
+            f'{report["collected"] + report["orphans"]} unreferenced files were deleted.'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Converted {report["converted"]} files, {report["blobs"]} blobs are stored.'
+        ))
@@ -0,0 +1,84 @@
+# Django
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+
+
+class BlobManager(models.Manager):
+    """
+    Blob manager.
+    Counts the references to the stored files.
+    """
+
+    def retain(self, names):
+        """
+        Count a new reference to each of the given files.
+        """
+        names = set(names)
+        if not names:
+            return
+        for attempt in range(3):
+            try:
+                with transaction.atomic():
+                    existing = set(self.filter(name__in=names).values_list('name', flat=True))
+                    if self.filter(name__in=existing).update(refs=F('refs') + 1) != len(existing):
+                        # Collected by a concurrent release
+                        raise IntegrityError('A blob vanished while being retained')
+                    self.bulk_create([
+                        Blob(name=name, size=blob_size(name), refs=1)
+                        for name in names - existing
+                    ])
+                return
+            except IntegrityError:
+                # Created or collected concurrently, count again
+                if attempt == 2:
+                    raise
+
+    def release(self, names):
+        """
+        Discount a reference to each of the given files, and delete the ones
+        no longer referenced once the transaction commits.
+        """
+        names = set(names)
+        if not names:
+            return
+        self.filter(name__in=names, refs__gt=0).update(refs=F('refs') - 1)
+        transaction.on_commit(lambda: self.collect(names))
+
+    def collect(self, names):
+        """
+        Delete the given files if nothing references them.
+        """
+        for name in self.filter(name__in=names, refs=0).values_list('name', flat=True):
+            default_storage.delete(name)
+
+
+def blob_size(name):
+    """
+    Return the size of a stored file, or 0 if it is missing.
+    """
+    try:
+        return default_storage.size(name)
+    except FileNotFoundError:
+        return 0
+
+
+class Blob(models.Model):
+    """
+    File stored once under the digest of its content.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+
+    size = models.PositiveBigIntegerField(default=0)
+
+    # Number of pictures and renditions pointing to the file
+    refs = models.PositiveIntegerField(default=0)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        """
+        Return name and references.
+        """
+        return f'{self.name} ({self.refs} references)'
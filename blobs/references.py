@@ -0,0 +1,206 @@
+"""
+References to the blobs.
+
+Posts and profiles point to blobs through their picture and its renditions.
+The signal receivers and the renditions workers keep the reference counts
+in sync, and reconcile() recounts them from scratch after bulk changes.
+"""
+
+# Django
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+# Models
+from blobs.models import Blob, blob_size
+from posts.models import Post
+from users.models import Profile
+
+# Storage
+from blobs.storage import INCOMING, PREFIX, is_blob
+
+# Utilities
+from collections import Counter
+import os
+import time
+
+# (model, picture field), the renditions are stored in {field}_renditions
+REFERENCES = [
+    (Post, 'photo'),
+    (Profile, 'picture'),
+]
+
+BATCH_SIZE = 1000
+
+
+def names(name, renditions):
+    """
+    Return the blobs referenced by a picture and its renditions.
+    """
+    found = {name}
+    for value in (renditions or {}).values():
+        if isinstance(value, list):
+            found.update(path for _, path in value)
+    return {name for name in found if is_blob(name)}
+
+
+def names_of(instance, field):
+    """
+    Return the blobs referenced by an object's picture.
+    """
+    return names(getattr(instance, field).name, getattr(instance, f'{field}_renditions'))
+
+
+def stored(model, pk, field):
+    """
+    Return the blobs referenced by an object's picture, as saved in the database.
+    """
+    row = model.objects.filter(pk=pk).values_list(field, f'{field}_renditions').first()
+    return names(*row) if row else set()
+
+
+def replace(previous, current):
+    """
+    Count the references that appeared and discount the ones that went away.
+    """
+    Blob.objects.retain(current - previous)
+    Blob.objects.release(previous - current)
+
+
+def count():
+    """
+    Return the actual number of references to every blob.
+    """
+    counts = Counter()
+    for model, field in REFERENCES:
+        rows = model.objects.values_list(field, f'{field}_renditions')
+        for name, renditions in rows.iterator(chunk_size=BATCH_SIZE):
+            counts.update(names(name, renditions))
+    return counts
+
+
+def stored_files():
+    """
+    Yield the name of every blob file and staging file.
+    """
+    root = default_storage.path(PREFIX)
+    for directory, _, files in os.walk(root):
+        for file in files:
+            yield os.path.relpath(os.path.join(directory, file), default_storage.location).replace('\\', '/')
+
+
+def reconcile(fix=True):
+    """
+    Recount the references to every blob, then delete the blobs and
+    staging files nothing refers to. Return a report of what was found.
+    """
+    report = {'blobs': 0, 'drifted': 0, 'drift': 0, 'collected': 0, 'orphans': 0}
+    counts = count()
+
+    with transaction.atomic():
+        drifted = []
+        for pk, name, refs in Blob.objects.values_list('pk', 'name', 'refs'):
+            actual = counts.pop(name, 0)
+            if refs != actual:
+                drifted.append(Blob(pk=pk, refs=actual))
+                report['drift'] += abs(refs - actual)
+        # Referenced blobs that were never counted
+        missing = [Blob(name=name, size=blob_size(name), refs=refs) for name, refs in counts.items()]
+        report['drift'] += sum(blob.refs for blob in missing)
+        report['drifted'] = len(drifted) + len(missing)
+        if fix:
+            Blob.objects.bulk_update(drifted, ['refs'], batch_size=BATCH_SIZE)
+            Blob.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+
+    if fix:
+        unreferenced = list(Blob.objects.filter(refs=0).values_list('name', flat=True))
+        for name in unreferenced:
+            default_storage.delete(name)
+        report['collected'] = len(unreferenced) - Blob.objects.filter(refs=0).count()
+
+        known = set(Blob.objects.values_list('name', flat=True))
+        for name in stored_files():
+            if name in known:
+                continue
+            if is_blob(name):
+                default_storage.delete(name)
+                report['orphans'] += not default_storage.exists(name)
+            elif name.startswith(f'{PREFIX}/{INCOMING}/'):
+                # Left behind by an interrupted upload
+                path = default_storage.path(name)
+                if time.time() - os.path.getmtime(path) >= settings.PICSCAPE_BLOB_GRACE_SECONDS:
+                    os.remove(path)
+                    report['orphans'] += 1
+
+    report['blobs'] = Blob.objects.count()
+    return report
+
+
+def convert(keep_originals=False, log=None):
+    """
+    Move the pictures and renditions stored before the blobs into blobs,
+    then recount the references. Return the report of reconcile(), along
+    with the number of converted files.
+    """
+    log = log or (lambda message: None)
+    converted = {}
+
+    def blob(name):
+        if not name or is_blob(name):
+            return name
+        if name not in converted:
+            try:
+                with default_storage.open(name) as file:
+                    converted[name] = default_storage.save(name, file)
+            except FileNotFoundError:
+                log(f'Missing file {name}, left as is')
+                converted[name] = name
+        return converted[name]
+
+    now = timezone.now()
+    for model, field in REFERENCES:
+        renditions_field = f'{field}_renditions'
+        log(f'Converting {model._meta.verbose_name_plural}...')
+        last = 0
+        while True:
+            # Walk the rows in primary key batches, so they are never all in memory
+            rows = list(
+                model.objects.filter(pk__gt=last).order_by('pk')
+                .values_list('pk', field, renditions_field)[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            last = rows[-1][0]
+            changed = []
+            for pk, name, renditions in rows:
+                new_name = blob(name)
+                new_renditions = {
+                    key: [[width, blob(path)] for width, path in value] if isinstance(value, list) else value
+                    for key, value in (renditions or {}).items()
+                }
+                if renditions and renditions.get('source') == name:
+                    new_renditions['source'] = new_name
+                if new_name != name or new_renditions != renditions:
+                    # The new modified date also refreshes their cached fragments
+                    changed.append(model(pk=pk, **{
+                        field: new_name,
+                        renditions_field: new_renditions,
+                        'modified': now,
+                    }))
+            model.objects.bulk_update(changed, [field, renditions_field, 'modified'])
+
+    originals = [name for name, new_name in converted.items() if new_name != name]
+    if not keep_originals:
+        log(f'Deleting {len(originals)} original files...')
+        for name in originals:
+            # The storage never deletes files outside the blobs itself
+            try:
+                os.remove(default_storage.path(name))
+            except FileNotFoundError:
+                pass
+
+    log('Counting references...')
+    report = reconcile()
+    report['converted'] = len(originals)
+    return report
@@ -0,0 +1,100 @@
+"""
+Content-addressed media storage.
+
+Every file is stored once, under the SHA-256 digest of its content, so
+re-uploads and identical pictures share a single blob. Blob names never
+change meaning, which lets their URLs be cached forever. The references to
+each blob are counted in the Blob model, and a blob is only deleted once
+nothing points to it anymore.
+"""
+
+# Django
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+# Models
+from blobs.models import Blob
+
+# Utilities
+from uuid import uuid4
+import hashlib
+import os
+import time
+
+# Directory of the blobs, and of the uploads being stored
+PREFIX = 'blobs'
+INCOMING = '.incoming'
+
+
+def is_blob(name):
+    """
+    Return whether a storage name is a content-addressed blob.
+    """
+    return bool(name) and name.startswith(f'{PREFIX}/') and not name.startswith(f'{PREFIX}/{INCOMING}/')
+
+
+def blob_name(digest, name):
+    """
+    Return the storage name of a blob, keeping the extension of its original name.
+    """
+    extension = os.path.splitext(name)[1].lower()
+    return f'{PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def content_digest(content):
+    """
+    Return the SHA-256 digest of a file, from the upload handler if it hashed
+    it already, or by reading it.
+    """
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming files after the digest of their content.
+    """
+
+    def _save(self, name, content):
+        name = blob_name(content_digest(content), name)
+        path = self.path(name)
+        if os.path.exists(path):
+            # Stored already, mark it as in use so it is not collected meanwhile
+            os.utime(path)
+            return name
+
+        # Write a staging file, then move it into place, so concurrent
+        # uploads of the same content never see a partial blob
+        staged = super()._save(f'{PREFIX}/{INCOMING}/{uuid4().hex}', content)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self.path(staged), path)
+        return name
+
+    def delete(self, name):
+        """
+        Delete a blob, unless it is referenced or was stored recently.
+        Files stored before the blobs are left alone, they may be shared.
+        """
+        if not is_blob(name):
+            return
+        path = self.path(name)
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(name=name).first()
+            if blob and blob.refs:
+                return
+            try:
+                age = time.time() - os.path.getmtime(path)
+            except FileNotFoundError:
+                age = None
+            if age is not None and age < settings.PICSCAPE_BLOB_GRACE_SECONDS:
+                # Possibly about to be referenced by an upload in flight
+                return
+            if blob:
+                blob.delete()
+            super().delete(name)
@@ -0,0 +1,162 @@
+# Django
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+# Utilities
+from io import BytesIO, StringIO
+from PIL import Image
+import os
+import shutil
+import tempfile
+
+# Models
+from blobs.models import Blob
+from posts.models import Post
+from users.models import Profile
+
+# Blobs
+from blobs import references
+
+
+def photo(color='red'):
+    """
+    Return an uploaded JPEG photo of the given color.
+    """
+    buffer = BytesIO()
+    Image.new('RGB', (300, 200), color).save(buffer, 'JPEG')
+    return SimpleUploadedFile('photo.jpeg', buffer.getvalue(), 'image/jpeg')
+
+
+class BlobsTestCase(TestCase):
+    """
+    Content-addressed storage tests.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(
+            MEDIA_ROOT=media_root,
+            PICSCAPE_IMAGE_ASYNC=False,
+            PICSCAPE_BLOB_GRACE_SECONDS=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username='author', password='1234')
+
+    def refs(self, name):
+        return Blob.objects.get(name=name).refs
+
+    def test_identical_files_are_stored_once(self):
+        first = default_storage.save('posts/photos/a.JPEG', ContentFile(b'same'))
+        second = default_storage.save('users/pictures/b.jpeg', ContentFile(b'same'))
+        other = default_storage.save('posts/photos/a.jpeg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^blobs/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.jpeg$')
+        with default_storage.open(first) as file:
+            self.assertEqual(file.read(), b'same')
+
+    def test_digests_of_uploads_are_not_computed_again(self):
+        upload = photo()
+        upload.sha256 = 'ab' * 32
+        name = default_storage.save('posts/photos/a.jpeg', upload)
+        self.assertEqual(name, f'blobs/ab/ab/{"ab" * 32}.jpeg')
+
+    def test_shared_blobs_are_deleted_with_their_last_reference(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Post.objects.create(user=self.user, title='First', photo=photo())
+            second = Post.objects.create(user=self.user, title='Second', photo=photo())
+        first.refresh_from_db()
+        self.assertEqual(first.photo.name, second.photo.name)
+        self.assertEqual(self.refs(first.photo.name), 2)
+        # The 300 and 150 pixels wide renditions, in both formats, are shared too
+        blobs = references.names_of(first, 'photo')
+        self.assertEqual(len(blobs), 5)
+        for name in blobs:
+            self.assertEqual(self.refs(name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.refs(second.photo.name), 1)
+        self.assertTrue(default_storage.exists(second.photo.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.exists())
+        for name in blobs:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_replaced_pictures_are_released(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile.objects.create(user=self.user, biography='Hello!', picture=photo('red'))
+        old = references.stored(Profile, profile.pk, 'picture')
+        self.assertEqual(len(old), 5)
+
+        profile.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.picture = photo('blue')
+            profile.save()
+        new = references.stored(Profile, profile.pk, 'picture')
+        self.assertEqual(len(new), 5)
+        self.assertFalse(old & new)
+        self.assertEqual(set(Blob.objects.values_list('name', flat=True)), new)
+        for name in old:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_recent_blobs_are_not_deleted(self):
+        name = default_storage.save('posts/photos/a.jpeg', ContentFile(b'upload in flight'))
+        with override_settings(PICSCAPE_BLOB_GRACE_SECONDS=3600):
+            default_storage.delete(name)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_files_outside_the_blobs_are_not_deleted(self):
+        legacy = default_storage.path('posts/photos/legacy.jpeg')
+        FileSystemStorage(location=default_storage.location).save('posts/photos/legacy.jpeg', ContentFile(b'old'))
+        default_storage.delete('posts/photos/legacy.jpeg')
+        self.assertTrue(os.path.exists(legacy))
+
+    def test_reconcile_fixes_counts_and_deletes_orphans(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(user=self.user, title='Photo', photo=photo())
+        Blob.objects.filter(name=post.photo.name).update(refs=5)
+        orphan = default_storage.save('posts/photos/orphan.jpeg', ContentFile(b'orphan'))
+
+        report = references.reconcile()
+        self.assertEqual(report['drifted'], 1)
+        self.assertEqual(report['drift'], 4)
+        self.assertEqual(report['orphans'], 1)
+        self.assertEqual(self.refs(post.photo.name), 1)
+        self.assertFalse(default_storage.exists(orphan))
+
+    def test_convert_media(self):
+        legacy = FileSystemStorage(location=default_storage.location)
+        buffer = photo().read()
+        legacy.save('posts/photos/author-1.jpeg', ContentFile(buffer))
+        legacy.save('users/pictures/author.jpeg', ContentFile(buffer))
+        legacy.save('renditions/posts/photos/author-1-feed.jpeg', ContentFile(b'rendition'))
+        renditions = {
+            'source': 'posts/photos/author-1.jpeg',
+            'jpeg': [[640, 'renditions/posts/photos/author-1-feed.jpeg']],
+        }
+        post = Post.objects.create(
+            user=self.user, title='Photo', photo='posts/photos/author-1.jpeg', photo_renditions=renditions,
+        )
+        Profile.objects.create(user=self.user, picture='users/pictures/author.jpeg')
+
+        call_command('convert_media', stdout=StringIO())
+
+        post.refresh_from_db()
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(post.photo.name, profile.picture.name)
+        self.assertEqual(post.photo_renditions['source'], post.photo.name)
+        rendition = post.photo_renditions['jpeg'][0][1]
+        self.assertTrue(rendition.startswith('blobs/'))
+        self.assertEqual(self.refs(post.photo.name), 2)
+        self.assertEqual(self.refs(rendition), 1)
+        self.assertFalse(legacy.exists('posts/photos/author-1.jpeg'))
+        self.assertFalse(legacy.exists('users/pictures/author.jpeg'))
@@ -0,0 +1,53 @@
+"""
+Helpers for the JSON API.
+
+The API answers with plain dicts built from .values() rows, so no model
+instance is created to serialize a response. Like the pages, it is
+authenticated with the session cookie, and its writes need a CSRF token.
+"""
+
+# Django
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.views.generic import View
+
+# Async views
+from picscape.async_views import AsyncLoginRequiredMixin
+
+
+def error(message, status):
+    """
+    Return a JSON error response.
+    """
+    return JsonResponse({'error': message}, status=status)
+
+
+def picture(name, renditions):
+    """
+    Return the URLs of a picture and of its renditions, by format.
+    """
+    if not name:
+        return None
+    return {
+        'url': default_storage.url(name),
+        'renditions': {
+            extension: [[width, default_storage.url(path)] for width, path in value]
+            for extension, value in (renditions or {}).items()
+            if isinstance(value, list)
+        },
+    }
+
+
+class ApiView(AsyncLoginRequiredMixin, View):
+    """
+    Base of the API views, answering errors in JSON too.
+    """
+
+    def handle_no_permission(self):
+        return error('Authentication required', 401)
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404 as e:
+            return error(str(e) or 'Not found', 404)
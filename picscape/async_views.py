@@ -0,0 +1,48 @@
+"""
+Helpers for the async views.
+
+Under ASGI, async views run on the event loop and only hop to a thread for
+the queries themselves. These helpers stand in for the sync-only parts of
+Django 4.2 that the views need.
+"""
+
+# Django
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject, empty
+
+# Utilities
+from asgiref.sync import sync_to_async
+
+
+async def auser(request):
+    """
+    Return the user of a request, loading it from a thread only when no
+    middleware accessed it yet.
+    """
+    user = request.user
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        await sync_to_async(user._setup)()
+    return user
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    """
+    Return the object matching the lookup, or raise Http404.
+    """
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.verbose_name} found matching the query')
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """
+    Verify that the current user is authenticated, for views with async handlers.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await auser(request)
+        if not user.is_authenticated:
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
@@ -0,0 +1,68 @@
+"""
+Cache backends that keep hit and miss statistics.
+
+They work without any external service: use LocMemCache for a
+per-process cache or FileBasedCache to share it between workers.
+"""
+
+# Django
+from django.core.cache.backends import filebased, locmem
+
+# Utilities
+import threading
+
+
+class StatsMixin:
+    """
+    Count the hits and misses of a cache backend in this process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hits, misses):
+        """
+        Add lookups to the statistics.
+        """
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = super().get(key, sentinel, version=version)
+        if value is sentinel:
+            self.record(0, 1)
+            return default
+        self.record(1, 0)
+        return value
+
+    def stats(self):
+        """
+        Return the lookups counted so far.
+        """
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / lookups if lookups else None,
+        }
+
+
+class LocMemCache(StatsMixin, locmem.LocMemCache):
+    """
+    Local-memory cache with statistics.
+    """
+    pass
+
+
+class FileBasedCache(StatsMixin, filebased.FileBasedCache):
+    """
+    File-based cache with statistics.
+    """
+    pass
@@ -0,0 +1,57 @@
+"""
+Validators of the pages, for conditional GETs.
+
+Pages are rendered for their viewer, so their ETags hash the version of
+everything they show: modified dates, counters, and the viewer's likes and
+follows. The views read these versions with a single small query before
+building their context, and answer 304 Not Modified when nothing changed.
+
+No Last-Modified header is sent: counters, likes and follows change without
+touching any modified date, so a date alone cannot validate these pages.
+"""
+
+# Django
+from django.db.models import Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+# Models
+from users.models import Profile
+
+# Utilities
+import hashlib
+
+
+def etag(*versions):
+    """
+    Return a weak ETag hashing the given versions.
+    """
+    return 'W/"{}"'.format(hashlib.sha1(repr(versions).encode()).hexdigest())
+
+
+def viewer_version(user):
+    """
+    Return a subquery of the version of the viewer's profile, whose picture
+    is shown in the navigation bar of every page.
+    """
+    return Subquery(Profile.objects.filter(user=user).values('modified')[:1])
+
+
+def not_modified(request, etag):
+    """
+    Return a 304 Not Modified response if the client's copy of the page is
+    still current, None otherwise.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        set_validator(response, etag)
+    return response
+
+
+def set_validator(response, etag):
+    """
+    Add the validator of a page to its response.
+    """
+    response['ETag'] = etag
+    # Personal pages, to revalidate on every visit
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
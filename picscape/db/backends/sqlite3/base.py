@@ -0,0 +1,50 @@
+"""
+SQLite backend for production deployments.
+
+It adds the "init_command" and "transaction_mode" options that Django's
+own SQLite backend only supports from 5.1 on, so pragmas such as WAL mode
+are applied to every new connection and write transactions can take the
+database lock as soon as they begin.
+"""
+
+# Django
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite database wrapper applying init commands and a transaction mode.
+    """
+
+    def get_connection_params(self):
+        """
+        Take this backend's options out of the sqlite3.connect() arguments.
+        """
+        params = super().get_connection_params()
+        self.init_command = params.pop('init_command', '')
+        self.transaction_mode = (params.pop('transaction_mode', None) or 'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES OPTIONS 'transaction_mode' must be one of "
+                f"{', '.join(TRANSACTION_MODES)}."
+            )
+        return params
+
+    def get_new_connection(self, conn_params):
+        """
+        Open a connection and run the init commands on it.
+        """
+        conn = super().get_new_connection(conn_params)
+        for command in self.init_command.split(';'):
+            if command.strip():
+                conn.execute(command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        """
+        Start a transaction in the configured mode.
+        """
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,44 @@
+"""
+Cached template fragments.
+
+Post cards and profile headers only cache their viewer-independent parts,
+keyed by the version (modified date) of the objects they show. Likes,
+counters and follow buttons are rendered on top of them on every request.
+"""
+
+# Django
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+
+# Name of the cache holding the fragments
+CACHE = 'fragments'
+
+
+def post_card_key(post_id, post_modified, profile_modified):
+    """
+    Return the cache key of a post card, as built by posts/post.html.
+    """
+    return make_template_fragment_key(
+        'post_card',
+        [post_id, post_modified.timestamp(), profile_modified.timestamp()],
+    )
+
+
+def profile_header_keys(user_id, profile_modified):
+    """
+    Return the cache keys of a profile header, as built by users/detail.html.
+    """
+    return [
+        make_template_fragment_key(
+            'profile_header',
+            [user_id, profile_modified.timestamp(), part],
+        )
+        for part in ('picture', 'biography')
+    ]
+
+
+def invalidate(keys):
+    """
+    Drop cached fragments.
+    """
+    caches[CACHE].delete_many(keys)
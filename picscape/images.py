@@ -0,0 +1,182 @@
+"""
+Responsive image renditions.
+
+Uploaded pictures are decoded once, oriented according to their EXIF data
+and saved as several smaller renditions, without metadata, in every format
+listed in PICSCAPE_IMAGE_FORMATS.
+"""
+
+# Django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+# Blobs
+from blobs import references
+
+# Utilities
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image, ImageOps
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# EXIF tag of the picture orientation, values 5 to 8 swap its width and height
+ORIENTATION = 0x0112
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def rendition_name(name, label, extension):
+    """
+    Return the storage name of a rendition of the given file.
+    """
+    root, _ = os.path.splitext(name)
+    return os.path.join('renditions', f'{root}-{label}.{extension}')
+
+
+def prepare(image):
+    """
+    Apply the EXIF orientation of a decoded image and normalize its mode.
+    """
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+
+def open_image(name, max_size=None):
+    """
+    Decode a stored picture and apply its EXIF orientation.
+    Return it along with its original width and height.
+
+    When a maximum size is given, JPEG pictures are decoded at the smallest
+    scale still larger than it, so large photos are never decoded in full.
+    """
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        width, height = image.size
+        if image.getexif().get(ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        if max_size:
+            image.draft('RGB', (max_size, max_size))
+        image.load()
+    return prepare(image), width, height
+
+
+def encode(image, extension):
+    """
+    Encode an image in the given format, without metadata.
+    """
+    format, options = FORMATS[extension]
+    if format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def create_renditions(name):
+    """
+    Save the renditions of a stored picture.
+    Return their description, to be stored alongside the picture.
+    """
+    image, width, height = open_image(name, max(settings.PICSCAPE_IMAGE_RENDITIONS.values()))
+    renditions = {'source': name, 'width': width, 'height': height}
+    for extension in settings.PICSCAPE_IMAGE_FORMATS:
+        renditions[extension] = []
+
+    # Derive each rendition from the previous, larger one
+    widths = sorted(settings.PICSCAPE_IMAGE_RENDITIONS.items(), key=lambda item: -item[1])
+    for label, width in widths:
+        if width < image.width:
+            height = round(image.height * width / image.width)
+            image = image.resize((width, height), Image.LANCZOS)
+        elif renditions[settings.PICSCAPE_IMAGE_FORMATS[0]]:
+            # Pictures are never upscaled, this size is already saved
+            continue
+        for extension in settings.PICSCAPE_IMAGE_FORMATS:
+            path = default_storage.save(rendition_name(name, label, extension), encode(image, extension))
+            renditions[extension].append([image.width, path])
+
+    return renditions
+
+
+def process(model, pk, field):
+    """
+    Create the renditions of an object's picture and store them on it.
+    """
+    name = model.objects.filter(pk=pk).values_list(field, flat=True).first()
+    if not name or not default_storage.exists(name):
+        return
+    try:
+        renditions = create_renditions(name)
+    except (OSError, Image.DecompressionBombError):
+        logger.exception('Could not create the renditions of %s', name)
+        return
+    with transaction.atomic():
+        # Write first, so the transaction holds the write lock before reading
+        if not model.objects.filter(pk=pk, **{field: name}).update(modified=timezone.now()):
+            # The picture was replaced meanwhile, its blobs are collected by reconcile()
+            return
+        previous = model.objects.filter(pk=pk).values_list(f'{field}_renditions', flat=True).first()
+        model.objects.filter(pk=pk).update(**{f'{field}_renditions': renditions})
+        references.replace(references.names(name, previous), references.names(name, renditions))
+
+
+def process_in_background(model, pk, field):
+    """
+    Run process() from a worker thread, with its own database connection.
+    """
+    close_old_connections()
+    try:
+        process(model, pk, field)
+    except Exception:
+        logger.exception('Could not process %s %s', model.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    """
+    Return the worker pool that processes the uploads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PICSCAPE_IMAGE_WORKERS,
+                thread_name_prefix='renditions',
+            )
+    return _executor
+
+
+def schedule(instance, field):
+    """
+    Create the renditions of an object's picture once the transaction commits.
+    """
+    args = (type(instance), instance.pk, field)
+    if settings.PICSCAPE_IMAGE_ASYNC:
+        transaction.on_commit(lambda: get_executor().submit(process_in_background, *args))
+    else:
+        transaction.on_commit(lambda: process(*args))
+
+
+def needs_renditions(instance, field):
+    """
+    Return whether an object's picture changed since its renditions were made.
+    """
+    name = getattr(instance, field).name
+    renditions = getattr(instance, f'{field}_renditions')
+    return bool(name) and renditions.get('source') != name
@@ -0,0 +1,182 @@
+"""
+Delivery of the media files.
+
+Like every page, media files are only served to signed-in users. Django
+checks that a file may be served and answers conditional requests, then
+hands the transfer to the front proxy if PICSCAPE_MEDIA_OFFLOAD is set:
+nginx with X-Accel-Redirect, Apache or lighttpd with X-Sendfile. The proxy
+sends the file and its byte ranges without holding a worker.
+
+Otherwise Django streams the file, or the requested byte range, itself.
+WSGI servers with a file wrapper, such as gunicorn, are given the open file
+positioned at the start of the range, and send it with os.sendfile.
+"""
+
+# Django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+# Blobs
+from blobs.storage import is_blob
+
+# Thumbnails
+from picscape import thumbnails
+
+# Utilities
+from urllib.parse import quote
+import mimetypes
+import os
+import re
+import stat as stat_module
+
+# Read size when the file is streamed by Django
+BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    Part of an open file, read from its current position.
+    The file descriptor stays available for os.sendfile.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def can_access(request, name):
+    """
+    Return whether a media file may be served to the request: only to
+    signed-in users, and never hidden files such as the uploads being stored.
+    """
+    return request.user.is_authenticated and not any(part.startswith('.') for part in name.split('/'))
+
+
+def parse_range(header, size):
+    """
+    Return the first and last byte of the range requested by a Range
+    header, or None to send the whole file. Several ranges are answered
+    with the whole file too. Raise ValueError if the range is past the end.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range, the last bytes of the file
+        length = min(int(last), size)
+        if not length:
+            raise ValueError(header)
+        return size - length, size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        if first >= size:
+            raise ValueError(header)
+        # Invalid, ignored
+        return None
+    return first, last
+
+
+def cache_control(request, name, version):
+    """
+    Return the Cache-Control header of a media file. Files are only kept by
+    browsers, as shared caches would serve them to anyone.
+    """
+    if is_blob(name) or request.GET.get('v') == version:
+        # Blobs are named after their content, and versioned URLs change along with the file
+        return 'private, max-age=31536000, immutable'
+    return 'private, max-age=3600'
+
+
+def offload(name, path):
+    """
+    Return a response telling the front proxy to send the file, or None
+    if Django sends it.
+    """
+    mode = settings.PICSCAPE_MEDIA_OFFLOAD
+    if not mode:
+        return None
+    response = HttpResponse(content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+    if mode == 'x-accel':
+        response['X-Accel-Redirect'] = settings.PICSCAPE_MEDIA_ACCEL_PREFIX + quote(name)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ImproperlyConfigured(f'Unknown PICSCAPE_MEDIA_OFFLOAD {mode!r}, use "x-accel" or "x-sendfile".')
+    return response
+
+
+def stream(request, path, size, etag, last_modified):
+    """
+    Return a response streaming a file, or the byte range requested.
+    """
+    header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if if_range is not None and if_range not in (etag, last_modified):
+        # The client's part is of another version, send the whole file
+        header = None
+    try:
+        byte_range = parse_range(header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    first, last = byte_range or (0, size - 1)
+    file = RangeFile(open(path, 'rb'), first, last - first + 1)
+    response = FileResponse(file, content_type=content_type, status=206 if byte_range else 200)
+    response.block_size = BLOCK_SIZE
+    response['Content-Length'] = last - first + 1
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    return response
+
+
+def serve(request, name):
+    """
+    Return the response sending a media file.
+    """
+    if not can_access(request, name):
+        raise Http404('Media file not found')
+    try:
+        path = thumbnails.source_path(name)
+        stat = os.stat(path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Media file not found')
+    if not stat_module.S_ISREG(stat.st_mode):
+        raise Http404('Media file not found')
+
+    version = thumbnails.version(name, stat)
+    etag = f'"{version}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = offload(name, path)
+    if response is None:
+        response = stream(request, path, stat.st_size, etag, http_date(stat.st_mtime))
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control(request, name, version)
+    return response
@@ -1,8 +1,58 @@
 # Django
+from django.conf import settings
+from django.db import connections
 from django.shortcuts import redirect
 from django.urls import reverse
 
-class ProfileCompletionMiddleware:
+# Routers
+from picscape import routers
+
+# Performance
+from picscape.performance import RequestProfile
+
+# Utilities
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from contextlib import ExitStack
+import json
+import logging
+import random
+
+performance_logger = logging.getLogger('picscape.performance')
+slow_requests_logger = logging.getLogger('picscape.performance.slow')
+
+# Session key holding the id of the user whose profile is known to be complete
+PROFILE_COMPLETE_SESSION_KEY = '_profile_complete'
+
+# Cookie keeping a user who just wrote on the primary database
+PIN_TO_PRIMARY_COOKIE = 'picscape_primary'
+
+
+class AsyncCapableMiddleware:
+    """
+    Base of the middlewares running natively in both sync and async chains.
+    Subclasses hand the request to __acall__ from __call__ in async mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+def remember_profile_completion(request, profile):
+    """
+    Store in the session whether the user's profile is complete.
+    """
+    if profile.is_complete:
+        request.session[PROFILE_COMPLETE_SESSION_KEY] = profile.user_id
+    else:
+        request.session.pop(PROFILE_COMPLETE_SESSION_KEY, None)
+
+
+class ProfileCompletionMiddleware(AsyncCapableMiddleware):
     """
     Ensure every user that is interacting with the platform
     has their profile picture and biography.
@@ -11,24 +61,164 @@ class ProfileCompletionMiddleware:
     def __init__(self, get_response):
         """
         Middleware initialization.
+        Resolve the URLs checked on every request only once.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.admin_url = reverse('admin:index')
+        self.exempt_urls = {reverse('users:profile'), reverse('users:logout')}
+        # Media files are shown on every page, the admin and the profile form included
+        self.media_urls = (f'/{settings.MEDIA_URL.lstrip("/")}', '/thumbs/')
 
     def __call__(self, request):
         """
         Code to be executed for each request before the view is called.
         """
-        if request.user.is_staff and not request.path.startswith(reverse('admin:index')):
-            return redirect(reverse('admin:index'))
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.redirect(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        """
+        Same as __call__, for the async chain. The user, its session and its
+        profile are loaded from a thread, and stay loaded for the view.
+        """
+        return await sync_to_async(self.redirect)(request) or await self.get_response(request)
+
+    def redirect(self, request):
+        """
+        Return where the user must go instead of the requested page, if anywhere.
+        """
+        if request.path.startswith(self.media_urls):
+            return None
+        user = request.user
+        if user.is_staff and not request.path.startswith(self.admin_url):
+            return redirect(self.admin_url)
         if (
-            request.user.is_anonymous
-            or request.user.is_anonymous
-            or request.user.is_staff
-            or request.user.profile.picture and 
-            request.user.profile.biography
-            or request.path == reverse('users:profile')
-            or request.path == reverse('users:logout')
+            user.is_anonymous
+            or user.is_staff
+            or request.path in self.exempt_urls
+            or self.profile_is_complete(request)
         ):
-            response = self.get_response(request)
-            return response
+            return None
         return redirect('users:profile')
+
+    def profile_is_complete(self, request):
+        """
+        Return whether the user's profile is complete.
+        Only load the profile when the session does not know it yet.
+        """
+        if request.session.get(PROFILE_COMPLETE_SESSION_KEY) == request.user.pk:
+            return True
+        profile = request.user.profile
+        remember_profile_completion(request, profile)
+        return profile.is_complete
+
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    """
+    Record the time, queries and template rendering of a sample of the requests.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= settings.PICSCAPE_PERFORMANCE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = request.performance_profile = RequestProfile()
+        with ExitStack() as stack:
+            self.watch_queries(stack, profile)
+            response = self.get_response(request)
+        return self.report(request, response, profile)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PICSCAPE_PERFORMANCE_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        # The queries of a request run in its own thread, where the
+        # connections are wrapped and unwrapped
+        profile = request.performance_profile = RequestProfile()
+        stack = ExitStack()
+        await sync_to_async(self.watch_queries)(stack, profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, profile)
+
+    def watch_queries(self, stack, profile):
+        """
+        Record the queries of every connection of the current thread.
+        """
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+
+    def report(self, request, response, profile):
+        """
+        Log the profile of a request and add its Server-Timing header.
+        """
+        profile.finish()
+        if settings.PICSCAPE_PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = profile.server_timing()
+        summary = profile.summary(request, response)
+        performance_logger.info(json.dumps(summary))
+        if summary['total_ms'] >= settings.PICSCAPE_SLOW_REQUEST_MS:
+            summary['sql'] = profile.expensive_queries()
+            slow_requests_logger.warning(json.dumps(summary))
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        Time the rendering of the response's template.
+        Runs last among the middlewares, right before the rendering.
+        """
+        profile = getattr(request, 'performance_profile', None)
+        if profile is not None:
+            profile.start_rendering()
+            response.add_post_render_callback(lambda response: profile.finish_rendering())
+        return response
+
+
+class ReplicaPinningMiddleware(AsyncCapableMiddleware):
+    """
+    Route the reads of each request to the read replicas, unless the user
+    wrote recently, so likes and follows show up on the page that follows.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with routers.routing(self.is_pinned(request)) as state:
+            response = self.get_response(request)
+        return self.pin(response, state)
+
+    async def __acall__(self, request):
+        # The routing state is a context variable, seen by the query threads too
+        with routers.routing(self.is_pinned(request)) as state:
+            response = await self.get_response(request)
+        return self.pin(response, state)
+
+    def is_pinned(self, request):
+        """
+        Return whether the request must only use the primary database.
+        """
+        return (
+            request.method not in self.safe_methods
+            or PIN_TO_PRIMARY_COOKIE in request.COOKIES
+        )
+
+    def pin(self, response, state):
+        """
+        Keep a user who just wrote on the primary database for a while.
+        """
+        if state.wrote and settings.PICSCAPE_DB_REPLICAS:
+            response.set_cookie(
+                PIN_TO_PRIMARY_COOKIE,
+                '1',
+                max_age=settings.PICSCAPE_DB_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
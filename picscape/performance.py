@@ -0,0 +1,112 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware records the total time, the SQL queries and the
+template rendering time of a sample of the requests. It reports them in the
+Server-Timing header and in the picscape.performance log, and writes the
+requests slower than PICSCAPE_SLOW_REQUEST_MS with their most expensive
+queries to the picscape.performance.slow log.
+"""
+
+# Utilities
+from collections import Counter, defaultdict
+from logging.handlers import WatchedFileHandler
+import os
+import time
+
+
+class RequestProfile:
+    """
+    Costs recorded while serving a request.
+    Used as a database execute wrapper to time every query.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = None
+        self.queries = []
+        self.template_start = None
+        self.template_time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    def start_rendering(self):
+        self.template_start = time.perf_counter()
+
+    def finish_rendering(self):
+        self.template_time += time.perf_counter() - self.template_start
+
+    @property
+    def total_time(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    @property
+    def duplicates(self):
+        """
+        Number of queries whose SQL, without parameters, repeats an earlier one.
+        """
+        return len(self.queries) - len({sql for sql, _ in self.queries})
+
+    def expensive_queries(self, limit=10):
+        """
+        Return the statements that took the most time, with their count.
+        """
+        durations = defaultdict(float)
+        counts = Counter()
+        for sql, duration in self.queries:
+            durations[sql] += duration
+            counts[sql] += 1
+        statements = sorted(durations, key=durations.get, reverse=True)[:limit]
+        return [
+            {'sql': sql, 'count': counts[sql], 'ms': round(durations[sql] * 1000, 2)}
+            for sql in statements
+        ]
+
+    def server_timing(self):
+        """
+        Return the value of the Server-Timing header.
+        """
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{len(self.queries)} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+    def summary(self, request, response):
+        """
+        Return the fields of the request's log line.
+        """
+        match = request.resolver_match
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(self.total_time * 1000, 2),
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'queries': len(self.queries),
+            'duplicates': self.duplicates,
+            'template_ms': round(self.template_time * 1000, 2),
+        }
+
+
+class SlowRequestFileHandler(WatchedFileHandler):
+    """
+    Log file handler that creates the log's directory when first writing.
+    """
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
@@ -0,0 +1,75 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary. Reads made while serving a request go to
+a random replica from PICSCAPE_DB_REPLICAS, unless the request already wrote
+or is in a transaction, or the user wrote shortly before and was pinned to
+the primary by ReplicaPinningMiddleware. Reads made outside requests, such
+as in commands and background workers, always go to the primary.
+"""
+
+# Django
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Utilities
+from contextlib import contextmanager
+import contextvars
+import random
+
+_routing = contextvars.ContextVar('routing', default=None)
+
+
+class Routing:
+    """
+    Routing state of the request being served.
+    """
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+@contextmanager
+def routing(pinned=False):
+    """
+    Route the reads of the enclosed code to the replicas, unless pinned.
+    """
+    token = _routing.set(Routing(pinned))
+    try:
+        yield _routing.get()
+    finally:
+        _routing.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send writes to the primary and reads to the replicas.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        replicas = settings.PICSCAPE_DB_REPLICAS
+        if (
+            not replicas
+            or state is None
+            or state.pinned
+            or state.wrote
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema from the primary
+        return db == DEFAULT_DB_ALIAS
@@ -42,12 +42,20 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
 
     # Local apps
+    "blobs",
     "posts",
+    "search",
     "users",
 ]
 
 MIDDLEWARE = [
 
+    # Instrumentation, first so it covers every other middleware
+    "picscape.middleware.PerformanceMiddleware",
+
+    # Database routing, first so it covers the session and user lookups
+    "picscape.middleware.ReplicaPinningMiddleware",
+
     # Django middlewares
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -90,10 +98,78 @@ WSGI_APPLICATION = "picscape.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.environ.get("PICSCAPE_SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+        "TEST": {
+            # Kept on disk, so concurrent tests can share it between threads
+            "NAME": BASE_DIR / "test_db.sqlite3",
+        },
     }
 }
 
+# Production SQLite profile, see deployment.md. Readers no longer wait for
+# writers, writers queue on the lock instead of failing, and workers keep
+# their connections open between requests.
+if os.environ.get("PICSCAPE_DB_PROFILE") == "sqlite-production":
+    DATABASES["default"].update({
+        "ENGINE": "picscape.db.backends.sqlite3",
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": 20,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": (
+                "PRAGMA journal_mode = WAL;"
+                "PRAGMA synchronous = NORMAL;"
+                "PRAGMA busy_timeout = 20000;"
+                "PRAGMA cache_size = -32000;"
+                "PRAGMA mmap_size = 268435456;"
+                "PRAGMA temp_store = MEMORY;"
+            ),
+        },
+    })
+
+# Read replicas, as a list of SQLite files separated by os.pathsep. Reads
+# are spread over them and users who just wrote are pinned to the primary
+# for PICSCAPE_DB_PIN_SECONDS, see picscape/routers.py.
+PICSCAPE_DB_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get("PICSCAPE_SQLITE_REPLICAS", "").split(os.pathsep)), 1):
+    alias = f"replica{number}"
+    DATABASES[alias] = {**DATABASES["default"], "NAME": path, "TEST": {"MIRROR": "default"}}
+    PICSCAPE_DB_REPLICAS.append(alias)
+
+PICSCAPE_DB_PIN_SECONDS = 5
+
+DATABASE_ROUTERS = ["picscape.routers.PrimaryReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Rendered fragments are kept in memory by default, set
+# PICSCAPE_FRAGMENT_CACHE=file to share them between workers on disk
+FRAGMENT_CACHES = {
+    "memory": {
+        "BACKEND": "picscape.cache.LocMemCache",
+        "LOCATION": "fragments",
+    },
+    "file": {
+        "BACKEND": "picscape.cache.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "fragments",
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "fragments": {
+        **FRAGMENT_CACHES[os.environ.get("PICSCAPE_FRAGMENT_CACHE", "memory")],
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,8 +212,165 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Media files are stored once, under the digest of their content, see
+# blobs/storage.py. Run `manage.py convert_media` to move older files.
+STORAGES = {
+    "default": {
+        "BACKEND": "blobs.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# Unreferenced blobs younger than this are kept, uploads in flight may be
+# about to point to them
+PICSCAPE_BLOB_GRACE_SECONDS = 3600
+
+# Front proxy sending the media files once Django allowed them: "x-accel"
+# for nginx, "x-sendfile" for Apache or lighttpd, or None to stream them
+# from Django
+PICSCAPE_MEDIA_OFFLOAD = os.environ.get("PICSCAPE_MEDIA_OFFLOAD") or None
+
+# Internal nginx location aliasing MEDIA_ROOT, for X-Accel-Redirect
+PICSCAPE_MEDIA_ACCEL_PREFIX = "/protected-media/"
+
 LOGIN_URL = "users:login"
 
+
+# Image renditions
+
+# Width, in pixels, of each rendition made from the uploaded pictures
+PICSCAPE_IMAGE_RENDITIONS = {
+    "avatar": 150,
+    "feed": 640,
+    "full": 1080,
+}
+
+# Formats every rendition is saved in, the first one is preferred by browsers
+PICSCAPE_IMAGE_FORMATS = ["webp", "jpeg"]
+
+# Process the uploads in a worker pool instead of the request thread
+PICSCAPE_IMAGE_ASYNC = True
+PICSCAPE_IMAGE_WORKERS = 2
+
+
+# Uploads
+
+# Stream every upload to disk instead of buffering the small ones in memory
+FILE_UPLOAD_HANDLERS = ["picscape.uploads.ImageUploadHandler"]
+
+# Largest photo accepted, in bytes and in pixels
+PICSCAPE_UPLOAD_MAX_BYTES = 25 * 1024 * 1024
+PICSCAPE_UPLOAD_MAX_PIXELS = 50_000_000
+
+
+# On-demand thumbnails
+
+# Widths, in pixels, thumbnails can be requested in
+PICSCAPE_THUMBNAIL_WIDTHS = [35, 150, 320, 640, 1080]
+
+# Directory and size budget of the generated thumbnails
+PICSCAPE_THUMBNAIL_CACHE_DIR = BASE_DIR / "cache" / "thumbnails"
+PICSCAPE_THUMBNAIL_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+# Home timelines
+
+# Maximum number of posts kept in each materialized timeline
+PICSCAPE_TIMELINE_MAX_LENGTH = 800
+
+# Authors with more followers than this are not fanned out on write,
+# their posts are pulled into their followers' feeds on read instead
+PICSCAPE_TIMELINE_FANOUT_LIMIT = 10000
+
+
+# Trending posts
+
+# Seconds after which a like counts half as much in the trending scores
+PICSCAPE_TRENDING_HALF_LIFE = 6 * 3600
+
+# Number of posts on the explore page
+PICSCAPE_TRENDING_LENGTH = 30
+
+# Posts whose likes are worth less than this many fresh likes are dropped
+# from the trending scores by the update_trending command
+PICSCAPE_TRENDING_MIN_SCORE = 0.1
+
+
+# Buffered likes
+
+# Write-behind likes, see posts/likes_buffer.py. Unset to write every like
+# directly, "memory" to buffer them in each process, or "file" to buffer
+# them in PICSCAPE_LIKES_BUFFER_PATH, shared by the processes of the host
+PICSCAPE_LIKES_BUFFER = os.environ.get("PICSCAPE_LIKES_BUFFER") or None
+PICSCAPE_LIKES_BUFFER_PATH = BASE_DIR / "cache" / "likes_buffer.sqlite3"
+
+# Seconds between the flushes of the buffered likes. None leaves the
+# flushes to posts.likes_buffer.flush()
+PICSCAPE_LIKES_BUFFER_INTERVAL = 1.0
+
+# Buffered likes applied per transaction, and flushed right away once reached
+PICSCAPE_LIKES_BUFFER_MAX = 1000
+
+
+# Follow suggestions
+
+# Number of users suggested to each user by the compute_suggestions command
+PICSCAPE_SUGGESTIONS_LENGTH = 20
+
+
+# Performance instrumentation
+
+# Fraction of the requests whose time, queries and template rendering are recorded
+PICSCAPE_PERFORMANCE_SAMPLE_RATE = float(os.environ.get("PICSCAPE_PERFORMANCE_SAMPLE_RATE", 1.0))
+
+# Report the recorded timings to clients in the Server-Timing header
+PICSCAPE_PERFORMANCE_SERVER_TIMING = True
+
+# Recorded requests slower than this, in milliseconds, are written to the
+# slow requests log along with their most expensive queries
+PICSCAPE_SLOW_REQUEST_MS = 500
+
+
+# Logging
+# https://docs.djangoproject.com/en/4.2/topics/logging/
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "performance": {
+            "format": "%(asctime)s %(levelname)s %(name)s %(message)s",
+        },
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": "performance",
+        },
+        "slow_requests": {
+            "class": "picscape.performance.SlowRequestFileHandler",
+            "filename": os.environ.get("PICSCAPE_SLOW_REQUEST_LOG", BASE_DIR / "logs" / "slow_requests.log"),
+            "formatter": "performance",
+            "delay": True,
+        },
+    },
+    "loggers": {
+        # Set PICSCAPE_PERFORMANCE_LOG_LEVEL=INFO to log every recorded request
+        "picscape.performance": {
+            "handlers": ["console"],
+            "level": os.environ.get("PICSCAPE_PERFORMANCE_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+        "picscape.performance.slow": {
+            "handlers": ["slow_requests"],
+            "level": "WARNING",
+        },
+    },
+}
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
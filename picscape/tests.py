@@ -0,0 +1,508 @@
+# Django
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.handlers.asgi import ASGIHandler
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Database
+from picscape.db.backends.sqlite3.base import DatabaseWrapper
+
+# Middleware
+from picscape.middleware import PIN_TO_PRIMARY_COOKIE, ProfileCompletionMiddleware, ReplicaPinningMiddleware
+
+# Routers
+from picscape import routers
+
+# Media
+from picscape import media, thumbnails
+
+# Uploads
+from picscape.uploads import ImageUploadHandler
+
+# Models
+from posts.models import Post
+
+# Utilities
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+from posts.tests import create_user
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+
+class ThumbnailCacheTestCase(TestCase):
+    """
+    Thumbnails cache tests.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_least_recently_used_files_are_evicted(self):
+        cache = thumbnails.ThumbnailCache(self.directory, max_bytes=250)
+        paths = [cache.get(key, 'jpeg', lambda: b'x' * 100) for key in ('aa1', 'bb2')]
+        os.utime(paths[0], (0, 0))
+        os.utime(paths[1], (1, 1))
+        cache.get('aa1', 'jpeg', lambda: b'')  # Hit, marks it as recently used
+
+        cache.get('cc3', 'jpeg', lambda: b'x' * 100)
+        self.assertTrue(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(paths[1]))
+
+    def test_concurrent_requests_render_once(self):
+        cache = thumbnails.ThumbnailCache(self.directory, max_bytes=1000)
+        renders = []
+        lock = threading.Lock()
+
+        def render():
+            with lock:
+                renders.append(1)
+            time.sleep(0.1)
+            return b'thumbnail'
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            paths = list(executor.map(lambda _: cache.get('abc', 'webp', render), range(8)))
+        self.assertEqual(len(renders), 1)
+        self.assertEqual(len(set(paths)), 1)
+
+
+class ThumbnailViewTestCase(TestCase):
+    """
+    Thumbnail view tests.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(
+            MEDIA_ROOT=media_root,
+            PICSCAPE_THUMBNAIL_CACHE_DIR=os.path.join(media_root, 'cache'),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        os.makedirs(os.path.join(media_root, 'posts'))
+        Image.new('RGB', (800, 400), 'blue').save(os.path.join(media_root, 'posts', 'photo.jpeg'))
+        self.client.force_login(create_user('viewer'))
+        self.url = reverse(
+            'thumbnail',
+            kwargs={'width': 320, 'format': 'webp', 'path': 'posts/photo.jpeg'},
+        )
+
+    def test_thumbnail_is_resized_and_cacheable(self):
+        version = thumbnails.version('posts/photo.jpeg')
+        response = self.client.get(self.url, {'v': version})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (320, 160))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_evicted_thumbnails_are_rendered_again(self):
+        # Every thumbnail is evicted as soon as it is written
+        with self.settings(PICSCAPE_THUMBNAIL_CACHE_MAX_BYTES=1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (320, 160))
+
+    def test_unsupported_thumbnails(self):
+        response = self.client.get(
+            reverse('thumbnail', kwargs={'width': 321, 'format': 'webp', 'path': 'posts/photo.jpeg'})
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse('thumbnail', kwargs={'width': 320, 'format': 'webp', 'path': 'posts/missing.jpeg'})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class MediaViewTestCase(TestCase):
+    """
+    Media view tests.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, PICSCAPE_MEDIA_OFFLOAD=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.content = bytes(range(256)) * 4
+        for name in ('posts/photo.jpeg', 'blobs/ab/cd/abcd.jpeg', 'blobs/.incoming/upload'):
+            os.makedirs(os.path.join(media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(media_root, name), 'wb') as file:
+                file.write(self.content)
+        self.path = os.path.join(media_root, 'posts', 'photo.jpeg')
+        self.url = reverse('media', kwargs={'path': 'posts/photo.jpeg'})
+        self.user = create_user('viewer')
+        self.client.force_login(self.user)
+
+    def test_whole_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=3600')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        for header, first, last in (
+            ('bytes=10-19', 10, 19),
+            ('bytes=1000-', 1000, 1023),
+            ('bytes=-24', 1000, 1023),
+            ('bytes=1000-5000', 1000, 1023),
+        ):
+            with self.subTest(header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {first}-{last}/1024')
+                self.assertEqual(response['Content-Length'], str(last - first + 1))
+                self.assertEqual(b''.join(response.streaming_content), self.content[first:last + 1])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        # Several ranges, or ranges of another version, get the whole file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(response.status_code, 206)
+
+    def test_ranges_can_be_sent_with_sendfile(self):
+        request = RequestFactory().get(self.url, HTTP_RANGE='bytes=100-199')
+        request.user = self.user
+        response = media.serve(request, 'posts/photo.jpeg')
+        descriptor = response.file_to_stream.fileno()
+        self.assertEqual(os.lseek(descriptor, 0, os.SEEK_CUR), 100)
+        # Closing the response would close the database connection too
+        response.file_to_stream.close()
+
+    def test_versioned_urls_are_immutable(self):
+        response = self.client.get(self.url, {'v': thumbnails.version('posts/photo.jpeg')})
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(reverse('media', kwargs={'path': 'blobs/ab/cd/abcd.jpeg'}))
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_media_are_only_served_to_signed_in_users(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        thumbnail = reverse('thumbnail', kwargs={'width': 320, 'format': 'webp', 'path': 'posts/photo.jpeg'})
+        self.assertEqual(self.client.get(thumbnail).status_code, 404)
+
+    def test_hidden_and_missing_files(self):
+        for path in ('blobs/.incoming/upload', 'posts/missing.jpeg', 'posts', '../secret'):
+            with self.subTest(path):
+                response = self.client.get(f'/media/{path}')
+                self.assertEqual(response.status_code, 404)
+
+    def test_offload_to_the_proxy(self):
+        with self.settings(PICSCAPE_MEDIA_OFFLOAD='x-accel'):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=0-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/posts/photo.jpeg')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.content, b'')
+
+        with self.settings(PICSCAPE_MEDIA_OFFLOAD='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.path)
+
+        with self.settings(PICSCAPE_MEDIA_OFFLOAD='x-accel'):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    def test_parse_range(self):
+        self.assertIsNone(media.parse_range(None, 100))
+        self.assertIsNone(media.parse_range('bytes=-', 100))
+        self.assertIsNone(media.parse_range('items=0-1', 100))
+        self.assertIsNone(media.parse_range('bytes=5-1', 100))
+        self.assertEqual(media.parse_range('bytes=-500', 100), (0, 99))
+        with self.assertRaises(ValueError):
+            media.parse_range('bytes=-0', 100)
+
+
+class ProfileCompletionMiddlewareTestCase(TestCase):
+    """
+    Profile completion middleware tests.
+    """
+
+    def setUp(self):
+        self.user = create_user('user')
+        self.middleware = ProfileCompletionMiddleware(lambda request: HttpResponse())
+
+    def get(self, user, session):
+        """
+        Run the middleware for a request to the feed.
+        """
+        request = RequestFactory().get(reverse('posts:feed'))
+        request.user = user
+        request.session = session
+        return self.middleware(request)
+
+    def test_complete_profiles_are_remembered(self):
+        session = SessionStore()
+        self.assertEqual(self.get(self.user, session).status_code, 200)
+
+        user = type(self.user).objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(user, session).status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+    def test_incomplete_profiles_are_redirected_until_updated(self):
+        self.user.profile.biography = ''
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('posts:feed'))
+        self.assertRedirects(response, reverse('users:profile'))
+        response = self.client.get('/media/posts/missing.jpeg')
+        self.assertEqual(response.status_code, 404)
+
+        self.client.post(reverse('users:profile'), {'biography': 'Hello!'})
+        response = self.client.get(reverse('posts:feed'))
+        self.assertEqual(response.status_code, 200)
+
+
+class SQLiteBackendTestCase(TestCase):
+    """
+    Production SQLite backend tests.
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'db.sqlite3')
+
+    def connect(self, **options):
+        """
+        Open a connection to a scratch database with the given options.
+        """
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': self.path, 'OPTIONS': options})
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_init_command_runs_on_connect(self):
+        wrapper = self.connect(init_command='PRAGMA journal_mode = WAL; PRAGMA synchronous = NORMAL;')
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_immediate_transactions_take_the_write_lock(self):
+        wrapper = self.connect(transaction_mode='immediate')
+        wrapper._start_transaction_under_autocommit()
+        self.addCleanup(wrapper.rollback)
+
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+            other.execute('BEGIN IMMEDIATE')
+
+    def test_unknown_transaction_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.connect(transaction_mode='eventually')
+
+
+@override_settings(PICSCAPE_DB_REPLICAS=['replica'])
+class ReplicaRoutingTestCase(SimpleTestCase):
+    """
+    Read replica routing tests.
+    """
+
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_requests_read_from_replicas_until_they_write(self):
+        with routers.routing():
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_pinned_requests_read_from_the_primary(self):
+        with routers.routing(pinned=True):
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_writers_are_pinned_to_the_primary(self):
+        def view(request):
+            if request.method == 'POST':
+                self.router.db_for_write(Post)
+            return HttpResponse(self.router.db_for_read(Post))
+
+        middleware = ReplicaPinningMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.get('/'))
+        self.assertEqual(response.content, b'replica')
+        self.assertNotIn(PIN_TO_PRIMARY_COOKIE, response.cookies)
+
+        response = middleware(factory.post('/'))
+        self.assertEqual(response.content, b'default')
+        cookie = response.cookies[PIN_TO_PRIMARY_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+
+        request = factory.get('/')
+        request.COOKIES[PIN_TO_PRIMARY_COOKIE] = cookie.value
+        self.assertEqual(middleware(request).content, b'default')
+
+
+class PerformanceMiddlewareTestCase(TestCase):
+    """
+    Performance instrumentation tests.
+    """
+
+    def setUp(self):
+        self.client.force_login(create_user('user'))
+
+    def test_requests_are_timed_and_logged(self):
+        with self.assertLogs('picscape.performance', 'INFO') as logs:
+            response = self.client.get(reverse('posts:feed'))
+        self.assertRegex(response['Server-Timing'], r'^sql;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=')
+
+        summary = json.loads(logs.records[0].getMessage())
+        self.assertEqual(summary['view'], 'posts:feed')
+        self.assertEqual(summary['status'], 200)
+        self.assertGreater(summary['queries'], 0)
+        self.assertGreater(summary['template_ms'], 0)
+
+    @override_settings(PICSCAPE_SLOW_REQUEST_MS=0)
+    def test_slow_requests_log_their_queries(self):
+        with self.assertLogs('picscape.performance.slow', 'WARNING') as logs:
+            self.client.get(reverse('posts:feed'))
+        summary = json.loads(logs.records[0].getMessage())
+        self.assertTrue(any('posts_post' in query['sql'] for query in summary['sql']))
+
+    @override_settings(PICSCAPE_PERFORMANCE_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        response = self.client.get(reverse('posts:feed'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class StreamedUploadsTestCase(TestCase):
+    """
+    Streamed image uploads tests.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, PICSCAPE_IMAGE_ASYNC=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(create_user('user'))
+
+    def upload(self, content, name='photo.jpeg'):
+        """
+        Post a new photo and return the response.
+        """
+        photo = SimpleUploadedFile(name, content, 'image/jpeg')
+        return self.client.post(reverse('posts:create'), {'title': 'Photo', 'photo': photo})
+
+    def png_header(self, width, height):
+        """
+        Return the beginning of a PNG file of the given dimensions.
+        """
+        data = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+        chunk = b'IHDR' + data
+        return (
+            b'\x89PNG\r\n\x1a\n'
+            + struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk))
+            + struct.pack('>I', 100) + b'IDAT'
+        )
+
+    def test_photos_are_accepted(self):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'green').save(buffer, 'JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(buffer.getvalue())
+        post = Post.objects.get()
+        self.assertRedirects(response, reverse('posts:detail', kwargs={'pk': post.pk}))
+        self.assertEqual(post.photo_renditions['width'], 800)
+
+    def test_uploads_are_hashed_as_they_arrive(self):
+        content = os.urandom(5000)
+        handler = ImageUploadHandler()
+        handler.new_file('photo', 'photo.jpeg', 'image/jpeg', len(content))
+        for start in range(0, len(content), 1024):
+            handler.receive_data_chunk(content[start:start + 1024], start)
+        upload = handler.file_complete(len(content))
+        self.addCleanup(upload.close)
+        self.assertEqual(upload.sha256, hashlib.sha256(content).hexdigest())
+
+    def test_files_that_are_not_images_are_refused(self):
+        response = self.upload(b'GIF89 but not quite an image')
+        self.assertFormError(response.context['form'], 'photo', [
+            'Upload a valid image. The file you uploaded was either not an image or a corrupted image.'
+        ])
+
+    def test_decompression_bombs_are_refused_from_their_header(self):
+        response = self.upload(self.png_header(20000, 20000) + b'\0' * 100, 'bomb.png')
+        self.assertFormError(response.context['form'], 'photo', [
+            'The photo is too large, upload one of 50 megapixels at most.'
+        ])
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(PICSCAPE_UPLOAD_MAX_BYTES=1000)
+    def test_large_files_are_refused(self):
+        response = self.upload(b'\xff\xd8\xff' + b'\0' * 5000)
+        self.assertFormError(response.context['form'], 'photo', [
+            'The file is too large, upload a photo of 1000\xa0bytes at most.'
+        ])
+
+
+class AsyncMiddlewareTestCase(TestCase):
+    """
+    Middleware tests under ASGI.
+    """
+
+    def setUp(self):
+        self.async_client.force_login(create_user('user'))
+
+    @override_settings(DEBUG=True)
+    def test_no_middleware_is_adapted(self):
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_requests_are_timed_and_logged(self):
+        with self.assertLogs('picscape.performance', 'INFO') as logs:
+            response = await self.async_client.get(reverse('posts:feed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Server-Timing', response)
+
+        summary = json.loads(logs.records[0].getMessage())
+        self.assertEqual(summary['view'], 'posts:feed')
+        self.assertGreater(summary['queries'], 0)
@@ -0,0 +1,225 @@
+"""
+On-demand thumbnails.
+
+Thumbnails are generated the first time they are requested and kept in a
+size-bounded directory, evicting the least recently used ones. Concurrent
+requests for the same thumbnail wait for a single resize.
+"""
+
+# Django
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils._os import safe_join
+
+# Images
+from picscape import images
+
+# Utilities
+from PIL import Image
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+
+class ThumbnailCache:
+    """
+    Directory of thumbnails bounded in size with LRU eviction.
+    Hits refresh the files' modification time, which is used as their last use.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.size = None
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def path(self, key, extension):
+        """
+        Return the cache file of a thumbnail.
+        """
+        return os.path.join(self.directory, key[:2], f'{key}.{extension}')
+
+    def get(self, key, extension, render):
+        """
+        Return the cache file of a thumbnail, rendering it if missing.
+        Only one thread renders a given thumbnail, the others wait for it.
+        """
+        path = self.path(key, extension)
+        if self.touch(path):
+            return path
+
+        with self.lock:
+            event = self.pending.get(key)
+            owner = event is None
+            if owner:
+                event = self.pending[key] = threading.Event()
+
+        if not owner:
+            event.wait()
+            if self.touch(path):
+                return path
+            return self.get(key, extension, render)
+
+        try:
+            if not os.path.exists(path):
+                self.write(path, render())
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+        return path
+
+    def touch(self, path):
+        """
+        Mark a cached file as recently used.
+        Return whether it exists.
+        """
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def write(self, path, content):
+        """
+        Atomically store a rendered thumbnail and evict old ones if needed.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(content)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self.entries())
+            else:
+                self.size += len(content)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def entries(self):
+        """
+        Yield the last use, size and path of every cached file.
+        """
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache is at 90% of its budget.
+        """
+        entries = sorted(self.entries())
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+
+_cache = None
+
+
+def get_cache():
+    """
+    Return the thumbnails cache configured in the settings.
+    """
+    global _cache
+    if _cache is None:
+        _cache = ThumbnailCache(
+            settings.PICSCAPE_THUMBNAIL_CACHE_DIR,
+            settings.PICSCAPE_THUMBNAIL_CACHE_MAX_BYTES,
+        )
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_cache(setting, **kwargs):
+    """
+    Drop the thumbnails cache when its settings change.
+    """
+    global _cache
+    if setting.startswith('PICSCAPE_THUMBNAIL_CACHE_'):
+        _cache = None
+
+
+def source_path(name):
+    """
+    Return the absolute path of a media file, refusing paths outside MEDIA_ROOT.
+    """
+    return safe_join(settings.MEDIA_ROOT, name)
+
+
+def version(name, stat=None):
+    """
+    Return a token that changes whenever the media file changes.
+    Pass the stat result of the file if it was read already.
+    """
+    stat = stat or os.stat(source_path(name))
+    return hashlib.sha256(f'{name}:{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()[:16]
+
+
+def thumbnail_key(name, width, extension):
+    """
+    Return the cache key, also used as strong ETag, of a thumbnail.
+    """
+    data = f'{version(name)}:{name}:{width}:{extension}'
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def render(name, width, extension):
+    """
+    Resize a media file to the given width and encode it.
+    """
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        # Let JPEG decoders skip the resolution we do not need
+        image.draft('RGB', (width, width))
+        image.load()
+    image = images.prepare(image)
+    if width < image.width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    return images.encode(image, extension).read()
+
+
+def get_thumbnail(name, width, extension):
+    """
+    Return the cache key and the file of a thumbnail.
+    """
+    key = thumbnail_key(name, width, extension)
+    path = get_cache().get(key, extension, lambda: render(name, width, extension))
+    return key, path
+
+
+def open_thumbnail(name, width, extension):
+    """
+    Return the cache key and the open file of a thumbnail. A thumbnail
+    evicted by another request before it is opened is rendered again, and
+    served from memory if the cache cannot keep it at all.
+    """
+    for _ in range(2):
+        key, path = get_thumbnail(name, width, extension)
+        try:
+            return key, open(path, 'rb')
+        except FileNotFoundError:
+            continue
+    return key, io.BytesIO(render(name, width, extension))
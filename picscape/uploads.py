@@ -0,0 +1,129 @@
+"""
+Streamed image uploads.
+
+Uploads are written to disk chunk by chunk and never held in memory. They
+are validated from their first bytes only: the format from its magic bytes,
+and the dimensions from the image header, so oversized files and
+decompression bombs are refused before anything is decoded. They are
+hashed as they arrive too, so the blob storage does not read them again.
+"""
+
+# Django
+from django import forms
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+
+# Utilities
+from PIL import Image
+import hashlib
+import warnings
+
+# Formats accepted by their leading bytes, mapped to their Pillow name
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+]
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream uploads to temporary files, whatever their size, and stop
+    writing them once they exceed PICSCAPE_UPLOAD_MAX_BYTES. The SHA-256
+    digest of complete uploads is left in their sha256 attribute.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file.too_large = False
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.PICSCAPE_UPLOAD_MAX_BYTES:
+            # Drain the rest of the request without keeping it
+            self.file.too_large = True
+            return
+        self.file.write(raw_data)
+        self.digest.update(raw_data)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if not file.too_large:
+            file.sha256 = self.digest.hexdigest()
+        return file
+
+
+def sniff_format(file):
+    """
+    Return the image format announced by the first bytes of a file.
+    """
+    file.seek(0)
+    head = file.read(16)
+    file.seek(0)
+    for signature, format in SIGNATURES:
+        if head.startswith(signature):
+            return format
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def read_size(file, format):
+    """
+    Return the dimensions stored in an image header, without decoding it.
+    """
+    file.seek(0)
+    with warnings.catch_warnings():
+        # Oversized images are refused by the caller, not by Pillow
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        with Image.open(file, formats=[format]) as image:
+            size = image.size
+    file.seek(0)
+    return size
+
+
+class StreamedImageField(forms.ImageField):
+    """
+    Image field validating uploads from their headers only.
+    """
+    default_error_messages = {
+        'too_large': 'The file is too large, upload a photo of %(max)s at most.',
+        'too_many_pixels': 'The photo is too large, upload one of %(max)s megapixels at most.',
+    }
+
+    def to_python(self, data):
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+
+        if getattr(f, 'too_large', False) or f.size > settings.PICSCAPE_UPLOAD_MAX_BYTES:
+            raise forms.ValidationError(
+                self.error_messages['too_large'],
+                code='too_large',
+                params={'max': filesizeformat(settings.PICSCAPE_UPLOAD_MAX_BYTES)},
+            )
+
+        format = sniff_format(f)
+        try:
+            if format is None:
+                raise ValueError('Unknown image signature')
+            width, height = read_size(f, format)
+        except Image.DecompressionBombError:
+            width = height = settings.PICSCAPE_UPLOAD_MAX_PIXELS
+        except (OSError, ValueError, SyntaxError) as exc:
+            raise forms.ValidationError(
+                self.error_messages['invalid_image'],
+                code='invalid_image',
+            ) from exc
+
+        if width * height > settings.PICSCAPE_UPLOAD_MAX_PIXELS:
+            raise forms.ValidationError(
+                self.error_messages['too_many_pixels'],
+                code='too_many_pixels',
+                params={'max': settings.PICSCAPE_UPLOAD_MAX_PIXELS // 1_000_000},
+            )
+
+        f.content_type = Image.MIME[format]
+        return f
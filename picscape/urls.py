@@ -1,7 +1,6 @@
 # Django
 from django.contrib import admin
 from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path, include
 
 # Views
@@ -9,9 +8,21 @@ from . import views
 
 urlpatterns = [
 
+    path('admin/cache-stats/', views.CacheStatsView.as_view(), name='cache_stats'),
     path('admin/', admin.site.urls),
     path('', views.RootRedirectView.as_view(), name='root_redirect'),
+    path(
+        f'{settings.MEDIA_URL.lstrip("/")}<path:path>',
+        views.MediaView.as_view(),
+        name='media',
+    ),
+    path(
+        'thumbs/<int:width>/<str:format>/<path:path>',
+        views.ThumbnailView.as_view(),
+        name='thumbnail',
+    ),
     path('', include(('posts.urls','posts'), namespace ='posts')),
     path('', include(('users.urls','users'), namespace ='users')),
+    path('', include(('search.urls','search'), namespace ='search')),
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
@@ -1,4 +1,19 @@
-from django.views.generic import RedirectView
+# Django
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.http import FileResponse, Http404, JsonResponse
+from django.utils.decorators import method_decorator
+from django.utils.cache import get_conditional_response
+from django.views.generic import RedirectView, View
+
+# Images
+from picscape import images, media, thumbnails
+
+# Utilities
+from PIL import UnidentifiedImageError
+import os
+
 
 class RootRedirectView(RedirectView):
     """
@@ -6,3 +21,61 @@ class RootRedirectView(RedirectView):
     """
     pattern_name = 'posts:feed'
     permanent = False
+
+
+class MediaView(View):
+    """
+    Return a media file to a signed-in user, or hand it to the front proxy.
+    Byte ranges and conditional requests are supported.
+    """
+
+    def get(self, request, path):
+        return media.serve(request, path)
+
+
+class ThumbnailView(View):
+    """
+    Return a media file resized to the requested width and format, to a
+    signed-in user. Thumbnails are generated on their first request and cached on disk.
+    """
+
+    def get(self, request, width, format, path):
+        if width not in settings.PICSCAPE_THUMBNAIL_WIDTHS or format not in images.FORMATS:
+            raise Http404('Unsupported thumbnail')
+        if not media.can_access(request, path):
+            raise Http404('Media file not found')
+        if not os.path.isfile(thumbnails.source_path(path)):
+            raise Http404('Media file not found')
+
+        key = thumbnails.thumbnail_key(path, width, format)
+        etag = f'"{key}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                key, thumbnail = thumbnails.open_thumbnail(path, width, format)
+            except UnidentifiedImageError:
+                raise Http404('Media file is not an image')
+            response = FileResponse(thumbnail, content_type=f'image/{format}')
+
+        response['ETag'] = etag
+        if request.GET.get('v') == thumbnails.version(path):
+            # Versioned URLs change along with the media file
+            response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'private, max-age=3600'
+        return response
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class CacheStatsView(View):
+    """
+    Return the hit and miss statistics of this process' caches.
+    """
+
+    def get(self, request):
+        stats = {
+            alias: caches[alias].stats()
+            for alias in settings.CACHES
+            if hasattr(caches[alias], 'stats')
+        }
+        return JsonResponse(stats)
@@ -0,0 +1,119 @@
+# Django
+from django.db import transaction
+from django.http import Http404, JsonResponse
+
+# Models
+from posts.models import Post
+
+# Timelines and buffered likes
+from posts import likes_buffer, timelines
+
+# Pagination
+from posts.pagination import CursorPaginator, InvalidCursor
+
+# API
+from picscape.api import ApiView, error, picture
+
+# Utilities
+from asgiref.sync import sync_to_async
+
+POST_FIELDS = (
+    'pk',
+    'title',
+    'photo',
+    'photo_renditions',
+    'created',
+    'likes_count',
+    'is_liking',
+    'user__username',
+    'user__profile__picture',
+    'user__profile__picture_renditions',
+)
+
+
+def post_values(queryset, user):
+    """
+    Return the rows of the posts needed to serialize them for the given user.
+    """
+    return queryset.with_is_liking(user).values(*POST_FIELDS)
+
+
+def serialize_post(row):
+    """
+    Return the representation of a post row.
+    """
+    return {
+        'id': row['pk'],
+        'title': row['title'],
+        'photo': picture(row['photo'], row['photo_renditions']),
+        'created': row['created'],
+        'likes_count': row['likes_count'],
+        'is_liking': row['is_liking'],
+        'author': {
+            'username': row['user__username'],
+            'picture': picture(row['user__profile__picture'], row['user__profile__picture_renditions']),
+        },
+    }
+
+
+class FeedApiView(ApiView):
+    """
+    Return a page of the user's home timeline.
+    """
+    paginate_by = 5
+
+    async def get(self, request):
+        queryset = post_values(timelines.timeline_posts(request.user), request.user)
+        try:
+            page = await CursorPaginator(queryset, self.paginate_by).apage(request.GET.get('cursor'))
+        except InvalidCursor as e:
+            return error(str(e), 400)
+        rows = await likes_buffer.aoverlay(request.user, list(page))
+        return JsonResponse({
+            'results': [serialize_post(row) for row in rows],
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        })
+
+
+class PostApiView(ApiView):
+    """
+    Return a post.
+    """
+
+    async def get(self, request, pk):
+        row = await post_values(Post.objects.filter(pk=pk), request.user).afirst()
+        if row is None:
+            raise Http404('No post found matching the query')
+        await likes_buffer.aoverlay(request.user, [row])
+        return JsonResponse(serialize_post(row))
+
+
+class LikeApiView(ApiView):
+    """
+    Like a post with PUT, unlike it with DELETE.
+    Repeating a request changes nothing, and both return the new state.
+    """
+
+    async def put(self, request, pk):
+        return await self.set_liking(request, pk, True)
+
+    async def delete(self, request, pk):
+        return await self.set_liking(request, pk, False)
+
+    async def set_liking(self, request, pk, liking):
+        if not await Post.objects.filter(pk=pk).aexists():
+            raise Http404('No post found matching the query')
+        # Transactions are not supported by the async ORM, write in a thread
+        likes_count = await sync_to_async(self.write)(request.user, Post(pk=pk), liking)
+        return JsonResponse({'id': pk, 'is_liking': liking, 'likes_count': likes_count})
+
+    def write(self, user, post, liking):
+        """
+        Like or unlike the post, now or once buffered, and return its new
+        likes count as the user sees it.
+        """
+        with transaction.atomic():
+            likes_buffer.set_liking(user, post.pk, liking)
+            row = Post.objects.filter(pk=post.pk).values('pk', 'likes_count').get()
+        return likes_buffer.overlay(user, [row])[0]['likes_count']
@@ -8,3 +8,9 @@ class PostsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = 'posts'
     verbose_name = 'Posts'
+
+    def ready(self):
+        """
+        Connect the signal receivers.
+        """
+        import posts.signals  # noqa: F401
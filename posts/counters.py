@@ -0,0 +1,66 @@
+"""
+Denormalized counters reconciliation.
+"""
+
+# Django
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery, Sum
+from django.db.models.functions import Abs, Coalesce
+
+# Models
+from posts.models import Post, Likes
+from users.models import Profile, Follows
+
+
+# (model, counter column, counted model, counted field, outer reference)
+COUNTERS = [
+    (Post, 'likes_count', Likes, 'post', 'pk'),
+    (Profile, 'posts_count', Post, 'user', 'user'),
+    (Profile, 'followers_count', Follows, 'followee', 'user'),
+    (Profile, 'following_count', Follows, 'follower', 'user'),
+]
+
+
+def counted_elsewhere(sender, origin):
+    """
+    Return whether a like or follow is deleted along with its user or post,
+    whose pre_delete receivers update the counters. The managers delete
+    without sending post_delete at all.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is not sender
+
+
+def actual_count(counted, field, outer):
+    """
+    Return a subquery counting the rows that point to the outer object.
+    """
+    rows = counted.objects.filter(
+        **{field: OuterRef(outer)}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows), 0)
+
+
+def reconcile(fix=True):
+    """
+    Compare every counter against the actual rows and fix the drifted ones.
+    Yield the counter name, the number of drifted rows and the total drift.
+    """
+    for model, column, counted, field, outer in COUNTERS:
+        with transaction.atomic():
+            drifted = model.objects.annotate(
+                actual=actual_count(counted, field, outer),
+            ).exclude(**{column: F('actual')})
+            report = drifted.aggregate(
+                rows=Count('pk'),
+                drift=Sum(Abs(F(column) - F('actual'))),
+            )
+            if fix and report['rows']:
+                model.objects.filter(pk__in=drifted.values('pk')).update(
+                    **{column: actual_count(counted, field, outer)}
+                )
+        yield (
+            f'{model._meta.model_name}.{column}',
+            report['rows'],
+            report['drift'] or 0,
+        )
@@ -0,0 +1,19 @@
+# Django
+from django import forms
+
+# Models
+from posts.models import Post
+
+# Uploads
+from picscape.uploads import StreamedImageField
+
+
+class PostForm(forms.ModelForm):
+    """
+    Post form.
+    """
+
+    class Meta:
+        model = Post
+        fields = ['title', 'photo']
+        field_classes = {'photo': StreamedImageField}
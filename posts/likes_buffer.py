@@ -0,0 +1,356 @@
+"""
+Write-behind buffer of likes.
+
+When a post goes viral, every like is a transaction of its own that inserts
+a row and updates the same counters, and on SQLite every worker waits for
+the write lock in turn. With PICSCAPE_LIKES_BUFFER set, likes and unlikes
+are recorded as intents instead, the latest one per user and post, and a
+flusher thread applies them in bulk every PICSCAPE_LIKES_BUFFER_INTERVAL
+seconds, with one counter update per post. A like withdrawn before the
+flush is never written at all.
+
+Intents are kept in each process ("memory"), or in a SQLite file shared by
+the processes of the host ("file", not available on Windows), which also
+survives restarts. Users see
+their own pending intents on every page, so their likes never seem to be
+lost; with "memory", only if their requests are served by the same process.
+"""
+
+# Django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+# Models
+from posts.models import Likes, Post
+
+# Utilities
+from asgiref.sync import sync_to_async
+from itertools import islice
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where only the "memory" buffer works
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBuffer:
+    """
+    Intents kept in the memory of the process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flushing = threading.Lock()
+        self.flusher = None
+        # {user id: {post id: (liking, liking in the database)}}
+        self.intents = {}
+        self.size = 0
+
+    def put(self, user_id, post_id, liking, original):
+        with self.lock:
+            intents = self.intents.setdefault(user_id, {})
+            if post_id in intents:
+                original = intents[post_id][1]
+            else:
+                self.size += 1
+            intents[post_id] = (liking, original)
+            return self.size
+
+    def pending(self, user_id):
+        with self.lock:
+            return dict(self.intents.get(user_id, {}))
+
+    def snapshot(self, limit):
+        with self.lock:
+            items = (
+                ((user_id, post_id), intent)
+                for user_id, intents in self.intents.items()
+                for post_id, intent in intents.items()
+            )
+            return dict(islice(items, limit))
+
+    def discard(self, applied):
+        with self.lock:
+            for (user_id, post_id), (liking, _) in applied.items():
+                intents = self.intents.get(user_id, {})
+                if post_id not in intents:
+                    continue
+                if intents[post_id][0] == liking:
+                    del intents[post_id]
+                    self.size -= 1
+                    if not intents:
+                        del self.intents[user_id]
+                else:
+                    # Changed again during the flush, on top of the applied state
+                    intents[post_id] = (intents[post_id][0], liking)
+
+    def lock_flush(self):
+        return self.flushing
+
+
+class FileBuffer:
+    """
+    Intents kept in a SQLite file shared by the processes of the host.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+        self.flushing = threading.Lock()
+        self.flusher = None
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS intent ('
+                'user_id INTEGER, post_id INTEGER, liking INTEGER, original INTEGER, '
+                'PRIMARY KEY (user_id, post_id)) WITHOUT ROWID'
+            )
+
+    def connect(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = sqlite3.connect(self.path, timeout=20)
+            # Intents are cheap to lose compared to a sync on every like
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = OFF')
+        return connection
+
+    def put(self, user_id, post_id, liking, original):
+        with self.connect() as connection:
+            connection.execute(
+                'INSERT INTO intent VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (user_id, post_id) DO UPDATE SET liking = excluded.liking',
+                (user_id, post_id, liking, original),
+            )
+            return connection.execute('SELECT count(*) FROM intent').fetchone()[0]
+
+    def pending(self, user_id):
+        rows = self.connect().execute(
+            'SELECT post_id, liking, original FROM intent WHERE user_id = ?', (user_id,),
+        )
+        return {post_id: (bool(liking), bool(original)) for post_id, liking, original in rows}
+
+    def snapshot(self, limit):
+        rows = self.connect().execute('SELECT user_id, post_id, liking, original FROM intent LIMIT ?', (limit,))
+        return {(user_id, post_id): (bool(liking), bool(original)) for user_id, post_id, liking, original in rows}
+
+    def discard(self, applied):
+        with self.connect() as connection:
+            rows = [(liking, user_id, post_id) for (user_id, post_id), (liking, _) in applied.items()]
+            connection.executemany(
+                'DELETE FROM intent WHERE liking = ? AND user_id = ? AND post_id = ?', rows,
+            )
+            # Changed again during the flush, on top of the applied state
+            connection.executemany('UPDATE intent SET original = ? WHERE user_id = ? AND post_id = ?', rows)
+
+    def lock_flush(self):
+        return FileLock(f'{self.path}.lock', self.flushing)
+
+
+class FileLock:
+    """
+    Lock held by a single thread of the processes of the host.
+    """
+
+    def __init__(self, path, thread_lock):
+        self.path = path
+        self.thread_lock = thread_lock
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        self.file = open(self.path, 'a')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        self.thread_lock.release()
+
+
+class Flusher(threading.Thread):
+    """
+    Thread applying the intents of a buffer periodically, or as soon as
+    there are enough of them.
+    """
+
+    def __init__(self, buffer, interval):
+        super().__init__(name='likes-flusher', daemon=True)
+        self.buffer = buffer
+        self.interval = interval
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if self.stopped.is_set():
+                return
+            close_old_connections()
+            try:
+                flush(self.buffer)
+            except Exception:
+                # The intents stay buffered for the next flush
+                logger.exception('Could not flush the likes')
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    Return the buffer of the likes, or None if likes are written directly.
+    """
+    global _buffer
+    mode = settings.PICSCAPE_LIKES_BUFFER
+    if not mode:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            if mode == 'memory':
+                _buffer = MemoryBuffer()
+            elif mode == 'file':
+                if fcntl is None:
+                    raise ImproperlyConfigured('PICSCAPE_LIKES_BUFFER "file" needs fcntl, use "memory" on Windows.')
+                _buffer = FileBuffer(settings.PICSCAPE_LIKES_BUFFER_PATH)
+            else:
+                raise ImproperlyConfigured(f'Unknown PICSCAPE_LIKES_BUFFER {mode!r}, use "memory" or "file".')
+            if settings.PICSCAPE_LIKES_BUFFER_INTERVAL:
+                _buffer.flusher = Flusher(_buffer, settings.PICSCAPE_LIKES_BUFFER_INTERVAL)
+                _buffer.flusher.start()
+                # Apply what is left when the server stops
+                atexit.register(flush, _buffer)
+    return _buffer
+
+
+@receiver(setting_changed)
+def reset_buffer(setting, **kwargs):
+    """
+    Drop the buffer when its settings change.
+    """
+    global _buffer
+    if setting.startswith('PICSCAPE_LIKES_BUFFER'):
+        with _buffer_lock:
+            if _buffer is not None and _buffer.flusher:
+                _buffer.flusher.stopped.set()
+                _buffer.flusher.wake.set()
+            _buffer = None
+
+
+def flush(buffer=None):
+    """
+    Apply the buffered intents to the database, in batches.
+    Return the number of likes added and removed.
+    """
+    buffer = buffer or get_buffer()
+    if buffer is None:
+        return 0
+    total = 0
+    batch_size = settings.PICSCAPE_LIKES_BUFFER_MAX
+    with buffer.lock_flush():
+        while intents := buffer.snapshot(batch_size):
+            # The likes in the database decide what is written, as the originals
+            # of intents put during a flush may be stale. Likes withdrawn before
+            # the flush, and the other way round, are read but not written.
+            total += Likes.objects.apply({key: liking for key, (liking, _) in intents.items()})
+            buffer.discard(intents)
+            if len(intents) < batch_size:
+                break
+    return total
+
+
+def pending(user):
+    """
+    Return the user's buffered intents, as {post id: (liking, liking in the database)}.
+    """
+    buffer = get_buffer()
+    return buffer.pending(user.pk) if buffer else {}
+
+
+async def apending(user):
+    """
+    Same as pending, for async views. The file buffer is read from a thread.
+    """
+    if settings.PICSCAPE_LIKES_BUFFER == 'file':
+        return await sync_to_async(pending)(user)
+    return pending(user)
+
+
+def is_liking(buffer, user, post_id):
+    """
+    Return whether the user likes the post, and whether the database says so.
+    """
+    intent = buffer.pending(user.pk).get(post_id)
+    if intent is None:
+        liking = Likes.objects.filter(user=user, post_id=post_id).exists()
+        return liking, liking
+    return intent
+
+
+def set_liking(user, post_id, liking):
+    """
+    Make the user like or unlike the post, now or at the next flush.
+    """
+    buffer = get_buffer()
+    if buffer is None:
+        if liking:
+            Likes.objects.like(user, Post(pk=post_id))
+        else:
+            Likes.objects.unlike(user, Post(pk=post_id))
+        return
+    _, original = is_liking(buffer, user, post_id)
+    if buffer.put(user.pk, post_id, liking, original) >= settings.PICSCAPE_LIKES_BUFFER_MAX and buffer.flusher:
+        buffer.flusher.wake.set()
+
+
+def toggle(user, post_id):
+    """
+    Unlike the post if the user is liking it, like it otherwise, now or at
+    the next flush. Return whether the user is liking the post afterwards.
+    """
+    buffer = get_buffer()
+    if buffer is None:
+        return Likes.objects.toggle(user, Post(pk=post_id))
+    liking, _ = is_liking(buffer, user, post_id)
+    set_liking(user, post_id, not liking)
+    return not liking
+
+
+def overlay(user, posts):
+    """
+    Show the user's buffered intents on posts, objects or rows, as if they
+    were applied already.
+    """
+    intents = pending(user)
+    for post in posts if intents else ():
+        # Rows hold their primary key as pk, objects as id
+        row = post if isinstance(post, dict) else post.__dict__
+        intent = intents.get(row.get('pk', row.get('id')))
+        if intent is not None:
+            liking, original = intent
+            row['is_liking'] = liking
+            row['likes_count'] = max(0, row['likes_count'] + liking - original)
+    return posts
+
+
+async def aoverlay(user, posts):
+    """
+    Same as overlay, for async views. The file buffer is read from a thread.
+    """
+    if settings.PICSCAPE_LIKES_BUFFER == 'file':
+        return await sync_to_async(overlay)(user, posts)
+    return overlay(user, posts)
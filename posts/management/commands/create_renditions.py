@@ -0,0 +1,27 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Models
+from posts.models import Post
+from users.models import Profile
+
+# Images
+from picscape import images
+
+
+class Command(BaseCommand):
+    """
+    Create the missing renditions of the uploaded pictures.
+    """
+    help = "Create the renditions of posts' photos and profiles' pictures."
+
+    def handle(self, *args, **options):
+        for model, field in ((Post, 'photo'), (Profile, 'picture')):
+            total = 0
+            for instance in model.objects.exclude(**{field: ''}).iterator():
+                if images.needs_renditions(instance, field):
+                    images.process(model, instance.pk, field)
+                    total += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'Processed {total} {model._meta.verbose_name_plural}.'
+            ))
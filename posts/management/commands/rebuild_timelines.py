@@ -0,0 +1,36 @@
+# Django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+# Timelines
+from posts import timelines
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the materialized home timelines from scratch.
+    """
+    help = "Rebuild users' home timelines from their posts and follows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames',
+            nargs='*',
+            help='Only rebuild the timelines of these users.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['usernames']:
+            timelines.rebuild_all()
+            total = User.objects.count()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} timelines.'))
+            return
+
+        users = User.objects.filter(username__in=options['usernames']).order_by('pk')
+
+        total = 0
+        for user in users.iterator():
+            timelines.rebuild(user)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} timelines.'))
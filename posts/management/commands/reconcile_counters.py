@@ -0,0 +1,24 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Counters
+from posts import counters
+
+
+class Command(BaseCommand):
+    """
+    Recompute the denormalized counters and report their drift.
+    """
+    help = "Recompute likes, posts, followers and following counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the drift, without fixing it.',
+        )
+
+    def handle(self, *args, **options):
+        for name, rows, drift in counters.reconcile(fix=not options['dry_run']):
+            style = self.style.WARNING if rows else self.style.SUCCESS
+            self.stdout.write(style(f'{name}: {rows} rows drifted by {drift} in total'))
@@ -0,0 +1,48 @@
+# Django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+# Seeding
+from posts import seeding
+
+# Utilities
+import time
+
+
+class Command(BaseCommand):
+    """
+    Fill the database with synthetic users, follows, posts and likes.
+    """
+    help = "Create a deterministic synthetic dataset for scale testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users.')
+        parser.add_argument('--follows', type=int, default=50, help='Mean followees per user.')
+        parser.add_argument('--posts', type=int, default=20, help='Mean posts per user.')
+        parser.add_argument('--likes', type=int, default=100, help='Mean likes per user.')
+        parser.add_argument('--images', type=int, default=20, help='Distinct photos and pictures to generate.')
+        parser.add_argument('--days', type=int, default=90, help='Spread the posts over this many days.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT.')
+        parser.add_argument('--workers', type=int, help='Processes drawing the images.')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f"seed{options['seed']}-").exists():
+            raise CommandError(f"The database was already seeded with seed {options['seed']}.")
+
+        start = time.perf_counter()
+        totals = seeding.seed(
+            users=options['users'],
+            follows=options['follows'],
+            posts=options['posts'],
+            likes=options['likes'],
+            images_count=options['images'],
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            log=self.stdout.write,
+        )
+        elapsed = time.perf_counter() - start
+        summary = ', '.join(f'{total} {name}' for name, total in totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary} in {elapsed:.0f}s.'))
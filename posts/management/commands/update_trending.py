@@ -0,0 +1,28 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Trending
+from posts import trending
+
+
+class Command(BaseCommand):
+    """
+    Maintain the trending scores of the explore page.
+    """
+    help = 'Drop the trending scores that decayed away. Run it periodically, for example hourly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every score from the likes counters, after bulk imports.',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            total = trending.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Scored {total} posts.'))
+            return
+
+        total = trending.prune()
+        self.stdout.write(self.style.SUCCESS(f'Dropped {total} scores.'))
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.5 on 2026-10-18 10:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_timelines(apps, schema_editor):
+    """
+    Fill every user's timeline with their own and their followees' posts.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model("posts", "Post")
+    Follows = apps.get_model("users", "Follows")
+    TimelineEntry = apps.get_model("posts", "TimelineEntry")
+
+    for user in User.objects.iterator():
+        followees = Follows.objects.filter(follower=user).values("followee")
+        posts = Post.objects.filter(
+            models.Q(user=user) | models.Q(user__in=followees)
+        ).order_by("-created", "-id")[: settings.PICSCAPE_TIMELINE_MAX_LENGTH]
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user=user, post_id=pk, created=created)
+                for pk, created in posts.values_list("pk", "created")
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("posts", "0001_initial"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField()),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to="posts.post",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-created"], name="timeline_user_created_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="timelineentry",
+            constraint=models.UniqueConstraint(
+                fields=("user", "post"), name="unique_timeline_entry"
+            ),
+        ),
+        migrations.RunPython(populate_timelines, migrations.RunPython.noop),
+    ]
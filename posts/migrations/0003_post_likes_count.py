@@ -0,0 +1,37 @@
+# Generated by Django 4.2.5 on 2026-10-18 10:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_likes_count(apps, schema_editor):
+    """
+    Count the existing likes of every post.
+    """
+    Post = apps.get_model("posts", "Post")
+    Likes = apps.get_model("posts", "Likes")
+    likes = (
+        Likes.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Post.objects.update(likes_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0002_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_likes_count, migrations.RunPython.noop),
+    ]
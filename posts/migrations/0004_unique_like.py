@@ -0,0 +1,53 @@
+# Generated by Django 4.2.5 on 2026-10-18 10:51
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    """
+    Keep the oldest of every duplicated like and recount the affected posts.
+    """
+    Post = apps.get_model("posts", "Post")
+    Likes = apps.get_model("posts", "Likes")
+    duplicates = (
+        Likes.objects.order_by()
+        .values("user", "post")
+        .annotate(kept=Min("pk"), total=Count("pk"))
+        .filter(total__gt=1)
+    )
+    post_ids = set()
+    for duplicate in duplicates:
+        Likes.objects.filter(user=duplicate["user"], post=duplicate["post"]).exclude(
+            pk=duplicate["kept"]
+        ).delete()
+        post_ids.add(duplicate["post"])
+
+    likes = (
+        Likes.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Post.objects.filter(pk__in=post_ids).update(
+        likes_count=Coalesce(Subquery(likes), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0003_post_likes_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="likes",
+            constraint=models.UniqueConstraint(
+                fields=("user", "post"), name="unique_like"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.5 on 2026-10-18 12:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0006_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingPost",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="posts.post",
+                    ),
+                ),
+                ("score", models.FloatField()),
+            ],
+            options={
+                "indexes": [models.Index(fields=["-score"], name="trending_score_idx")],
+            },
+        ),
+    ]
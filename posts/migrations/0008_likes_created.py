@@ -0,0 +1,22 @@
+# Generated by Django 4.2.5 on 2026-10-18 16:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0007_trendingpost"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="likes",
+            name="created",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
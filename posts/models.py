@@ -1,11 +1,21 @@
 # Django
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Utilities
+from collections import Counter, defaultdict
+from datetime import datetime
 from uuid import uuid4
+import math
 import os
 
+# Origin of the trending scores, see TrendingPostManager
+TRENDING_EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
 
 def picture_upload_path(instance, filename):
     """
@@ -17,21 +27,65 @@ def picture_upload_path(instance, filename):
     return os.path.join('posts', 'photos', unique_filename)
 
 
+class PostQuerySet(models.QuerySet):
+    """
+    Post queryset.
+    """
+
+    def with_feed_data(self, user):
+        """
+        Join the author and their profile, and annotate
+        whether the given user likes each post.
+        """
+        return self.select_related('user__profile').with_is_liking(user)
+
+    def with_is_liking(self, user):
+        """
+        Annotate whether the given user likes each post.
+        """
+        return self.annotate(
+            is_liking=Exists(
+                Likes.objects.filter(post=OuterRef('pk'), user=user)
+            ),
+        )
+
+
 class Post(models.Model):
     """
     Post model.
     """
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
-    
+    # Indexed by post_user_created_idx
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts', db_index=False)
+
     title = models.CharField(max_length=255)
 
     photo = models.ImageField(upload_to=picture_upload_path)
 
+    photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
+
     created = models.DateTimeField(auto_now_add=True)
 
     modified = models.DateTimeField(auto_now=True)
 
+    likes_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Profile pages, newest first
+            models.Index(
+                fields=['user', '-created', '-id'],
+                name='post_user_created_idx',
+            ),
+            # All posts, newest first
+            models.Index(
+                fields=['-created', '-id'],
+                name='post_created_idx',
+            ),
+        ]
+
     def __str__(self):
         """
         Return title and username.
@@ -39,14 +93,273 @@ class Post(models.Model):
         return '{} by @{}'.format(self.title, self.user.username)
         
 
+class LikesManager(models.Manager):
+    """
+    Likes manager.
+    Keeps the posts' likes counters in sync.
+    """
+
+    def like(self, user, post):
+        """
+        Make the user like the post.
+        Return whether a like was added.
+        """
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    self.create(user=user, post=post)
+            except IntegrityError:
+                # Already liking, possibly from a concurrent request
+                return False
+            Post.objects.filter(pk=post.pk).update(likes_count=F('likes_count') + 1)
+            TrendingPost.objects.add_like(post.pk)
+        return True
+
+    def unlike(self, user, post):
+        """
+        Make the user stop liking the post.
+        Return whether a like was removed.
+        """
+        with transaction.atomic():
+            dates = self.delete_returning_dates(user, post)
+            if dates:
+                Post.objects.filter(pk=post.pk, likes_count__gte=len(dates)).update(
+                    likes_count=F('likes_count') - len(dates)
+                )
+                TrendingPost.objects.remove_likes(post.pk, dates)
+        return bool(dates)
+
+    def delete_returning_dates(self, user, post):
+        """
+        Delete the user's like of the post and return the dates it was made.
+
+        A single DELETE ... RETURNING, without the post_delete receiver: it
+        takes the write lock before reading anything, and the caller updates
+        the counters.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        created = self.model._meta.get_field('created')
+        column = created.get_col(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {qn(self.model._meta.db_table)} WHERE user_id = %s AND post_id = %s '
+                f'RETURNING {qn(created.column)}',
+                [user.pk, post.pk],
+            )
+            dates = [value for value, in cursor.fetchall()]
+        for converter in connection.ops.get_db_converters(column):
+            dates = [converter(value, column, connection) for value in dates]
+        return dates
+
+    def apply(self, intents):
+        """
+        Make users like or unlike posts in bulk, from {(user id, post id): liking}.
+        Return the number of likes added and removed.
+
+        The counters of each post are updated once, however many of its likes
+        changed. Likes of posts or users deleted since are skipped.
+        """
+        if not intents:
+            return 0
+        with transaction.atomic():
+            existing = dict(
+                ((user_id, post_id), (pk, created))
+                for pk, user_id, post_id, created in self.filter(
+                    user_id__in={user_id for user_id, _ in intents},
+                    post_id__in={post_id for _, post_id in intents},
+                ).values_list('pk', 'user_id', 'post_id', 'created')
+            )
+            added = [key for key, liking in intents.items() if liking and key not in existing]
+            if added:
+                post_ids = set(Post.objects.filter(
+                    pk__in={post_id for _, post_id in added},
+                ).values_list('pk', flat=True))
+                user_ids = set(User.objects.filter(
+                    pk__in={user_id for user_id, _ in added},
+                ).values_list('pk', flat=True))
+                added = [key for key in added if key[0] in user_ids and key[1] in post_ids]
+            removed = [key for key, liking in intents.items() if not liking and key in existing]
+            self.bulk_create([self.model(user_id=user_id, post_id=post_id) for user_id, post_id in added])
+            # Without the post_delete receiver, the counters are updated below
+            self.filter(pk__in=[existing[key][0] for key in removed])._raw_delete(self.db)
+
+            changes = Counter(post_id for _, post_id in added)
+            changes.subtract(post_id for _, post_id in removed)
+            for post_id, change in changes.items():
+                if change > 0:
+                    Post.objects.filter(pk=post_id).update(likes_count=F('likes_count') + change)
+                elif change < 0:
+                    Post.objects.filter(pk=post_id).update(likes_count=Greatest(F('likes_count') + change, 0))
+
+            # The likes withdrawn are dated, the score loses what each of them added
+            withdrawn = defaultdict(list)
+            for key in removed:
+                withdrawn[key[1]].append(existing[key][1])
+            for post_id, count in Counter(post_id for _, post_id in added).items():
+                TrendingPost.objects.add_like(post_id, count)
+            for post_id, dates in withdrawn.items():
+                TrendingPost.objects.remove_likes(post_id, dates)
+        return len(added) + len(removed)
+
+    def toggle(self, user, post):
+        """
+        Unlike the post if the user is liking it, like it otherwise.
+        Return whether the user is liking the post afterwards.
+
+        The delete is issued first, so the toggle takes the write lock
+        before reading anything and concurrent toggles are serialized.
+        """
+        with transaction.atomic():
+            if self.unlike(user, post):
+                return False
+            self.like(user, post)
+        return True
+
+
 class Likes(models.Model):
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='likes')
+    # Indexed by unique_like
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='likes', db_index=False)
 
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
 
+    # Withdrawn likes take back the trending score they added at that date
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = LikesManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_like',
+            ),
+        ]
+
     def __str__(self):
         """
         Return username and title.
         """
         return '{} likes {}'.format(self.user.username, self.post.title)
+
+
+class TimelineEntry(models.Model):
+    """
+    Post delivered to a user's home timeline.
+    """
+
+    # Indexed by timeline_user_created_idx
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        db_index=False,
+    )
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+
+    # Copy of the post creation date, so timelines are sorted without a join
+    created = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='timeline_user_created_idx',
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Return username and title.
+        """
+        return '{} sees {}'.format(self.user.username, self.post.title)
+
+
+class TrendingPostManager(models.Manager):
+    """
+    Trending post manager.
+    Keeps the scores in sync with the likes.
+
+    A like made at time t is worth 2 ** -((now - t) / half-life). Instead of
+    decaying every score as time passes, likes are weighted up by the time
+    elapsed since a fixed epoch, which orders posts the same way, and scores
+    are stored as logarithms so they never overflow.
+    """
+
+    def rank(self, when=None):
+        """
+        Return the logarithm of the weight of a like made at the given time.
+        """
+        elapsed = ((when or timezone.now()) - TRENDING_EPOCH).total_seconds()
+        return elapsed * math.log(2) / settings.PICSCAPE_TRENDING_HALF_LIFE
+
+    def add_like(self, post_id, count=1):
+        """
+        Add likes made now to the post's score.
+        """
+        weight = self.rank() + math.log(count)
+        score = self.select_for_update().filter(post_id=post_id).values_list('score', flat=True).first()
+        if score is None:
+            try:
+                with transaction.atomic():
+                    self.create(post_id=post_id, score=weight)
+                return
+            except IntegrityError:
+                # Scored by a concurrent like
+                score = self.select_for_update().get(post_id=post_id).score
+        # log(e ** score + e ** weight), without leaving the logarithms
+        high, low = max(score, weight), min(score, weight)
+        self.filter(post_id=post_id).update(score=high + math.log1p(math.exp(low - high)))
+
+    def remove_likes(self, post_id, dates):
+        """
+        Remove likes made at the given dates from the post's score.
+        A post left with less than a thousandth of its score is unscored.
+        """
+        ranks = [self.rank(when) for when in dates]
+        top = max(ranks)
+        weight = top + math.log(sum(math.exp(rank - top) for rank in ranks))
+        score = self.select_for_update().filter(post_id=post_id).values_list('score', flat=True).first()
+        if score is None:
+            return
+        # Below a thousandth of the score, what is left is rounding
+        if score - weight < 0.001:
+            self.filter(post_id=post_id).delete()
+        else:
+            self.filter(post_id=post_id).update(score=score + math.log1p(-math.exp(weight - score)))
+
+
+class TrendingPost(models.Model):
+    """
+    Time-decayed likes score of a post, for the explore page.
+    """
+
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+
+    # Logarithm of the post's likes, weighted by how recent they are
+    score = models.FloatField()
+
+    objects = TrendingPostManager()
+
+    class Meta:
+        indexes = [
+            # Explore page, best first
+            models.Index(
+                fields=['-score'],
+                name='trending_score_idx',
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Return title and score.
+        """
+        return '{} scores {:.2f}'.format(self.post.title, self.score)
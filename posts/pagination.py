@@ -0,0 +1,199 @@
+# Django
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+# Utilities
+from asgiref.sync import sync_to_async
+import base64
+import json
+
+
+class InvalidCursor(InvalidPage):
+    """
+    The cursor token could not be decoded.
+    """
+    pass
+
+
+class CursorPage:
+    """
+    Page of results located by a cursor instead of a page number.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over objects ordered by newest (created, id) first.
+
+    Pages are located by filtering on the last seen key, so every page costs
+    the same regardless of its depth and no total count is computed.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def get_key(self, obj):
+        """
+        Return the (created, id) key of an object, or of a row read with .values().
+        """
+        if isinstance(obj, dict):
+            return obj['created'], obj['pk']
+        return obj.created, obj.pk
+
+    def encode_cursor(self, obj, direction):
+        """
+        Return an opaque token pointing before or after the given object.
+        """
+        created, pk = self.get_key(obj)
+        data = json.dumps([direction, created.isoformat(), pk])
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Return the direction and the key stored in a cursor token.
+        """
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            direction, created, pk = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            created = parse_datetime(created)
+            if direction not in ('next', 'prev') or created is None or not isinstance(pk, int):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        return direction, created, pk
+
+    def get_queryset(self, cursor=None):
+        """
+        Return the direction of a cursor and the queryset reading its page.
+        """
+        if not cursor:
+            return 'next', self.queryset.order_by('-created', '-pk')
+        direction, created, pk = self.decode_cursor(cursor)
+        if direction == 'next':
+            return direction, self.queryset.filter(
+                Q(created__lt=created) | Q(created=created, pk__lt=pk)
+            ).order_by('-created', '-pk')
+        return direction, self.queryset.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk)
+        ).order_by('created', 'pk')
+
+    def page(self, cursor=None):
+        """
+        Return the page that follows or precedes the cursor.
+        """
+        direction, queryset = self.get_queryset(cursor)
+        return self.make_page(list(queryset[:self.per_page + 1]), direction, cursor)
+
+    async def apage(self, cursor=None):
+        """
+        Return the page that follows or precedes the cursor, from async code.
+        """
+        direction, queryset = self.get_queryset(cursor)
+        return self.make_page([obj async for obj in queryset[:self.per_page + 1]], direction, cursor)
+
+    def make_page(self, object_list, direction, cursor):
+        """
+        Return the page of a cursor, from the objects read past it.
+        """
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if direction == 'prev':
+            object_list.reverse()
+
+        if not object_list:
+            return CursorPage(object_list, None, None)
+
+        has_next = has_more if direction == 'next' else True
+        has_previous = bool(cursor) if direction == 'next' else has_more
+        return CursorPage(
+            object_list,
+            self.encode_cursor(object_list[-1], 'next') if has_next else None,
+            self.encode_cursor(object_list[0], 'prev') if has_previous else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    Paginate a list view with cursors.
+
+    Page number URLs are still served with offset pagination while clients
+    move to cursors, and their responses carry a Deprecation header.
+    """
+    cursor_kwarg = 'cursor'
+
+    def uses_page_numbers(self):
+        """
+        Return whether the request asks for a page by its number.
+        """
+        return (
+            self.page_kwarg in self.request.GET
+            and self.cursor_kwarg not in self.request.GET
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginate the queryset with a cursor paginator.
+        """
+        if self.uses_page_numbers():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def paginate_page_numbers(self, queryset, page_size):
+        """
+        Paginate the queryset with the offset paginator, and read the page
+        right away, as async views cannot query the database themselves.
+        """
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+        page.object_list = list(object_list)
+        return (paginator, page, page.object_list, is_paginated)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """
+        Paginate the queryset with a cursor paginator, from an async view.
+        Page numbers are still served by the sync offset paginator.
+        """
+        if self.uses_page_numbers():
+            return await sync_to_async(self.paginate_page_numbers)(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = await paginator.apage(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def render_to_response(self, context, **response_kwargs):
+        """
+        Flag responses served with page numbers as deprecated.
+        """
+        response = super().render_to_response(context, **response_kwargs)
+        if self.uses_page_numbers():
+            response['Deprecation'] = 'true'
+        return response
@@ -0,0 +1,83 @@
+"""
+Query plans of the hot queries.
+
+Runs EXPLAIN on the queries behind the feed, the profile page and the like
+and follow toggles, and reports the ones that read a whole table instead of
+searching an index.
+"""
+
+# Django
+from django.db import connection
+
+# Models
+from django.contrib.auth.models import User
+from posts.models import Likes, Post, TimelineEntry, TrendingPost
+from users.models import Follows, Profile
+
+# Timelines and trending posts
+from posts import timelines, trending
+
+# Pagination
+from posts.pagination import CursorPaginator
+
+# Utilities
+import re
+
+# Tables that grow with the users and their activity, and must never be scanned
+LARGE_TABLES = {
+    User._meta.db_table,
+    Profile._meta.db_table,
+    Post._meta.db_table,
+    Likes._meta.db_table,
+    Follows._meta.db_table,
+    TimelineEntry._meta.db_table,
+    TrendingPost._meta.db_table,
+}
+
+SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+ALIAS = re.compile(r'"(\w+)" ([A-Z]\d+)\b')
+
+# Indexes that hot queries may walk in order, as they stop after their first rows
+INDEX_WALKS = {
+    'explore': {'trending_score_idx'},
+}
+
+
+def hot_queries(user, other, post):
+    """
+    Return the hot queries, as seen by user, by name.
+    """
+    feed = CursorPaginator(timelines.timeline_posts(user).with_feed_data(user), 5)
+    profile = CursorPaginator(other.posts.all(), 12)
+    cursor = feed.encode_cursor(post, 'next')
+    return {
+        'feed': feed.get_queryset()[1][:6],
+        'feed next page': feed.get_queryset(cursor)[1][:6],
+        'profile posts': profile.get_queryset()[1][:13],
+        'profile next page': profile.get_queryset(cursor)[1][:13],
+        'post detail': Post.objects.with_feed_data(user).filter(pk=post.pk),
+        'like toggle': Likes.objects.filter(user=user, post=post),
+        'follow toggle': Follows.objects.filter(follower=user, followee=other),
+        'fan out': Follows.objects.filter(followee=other).values('follower'),
+        'unfollow prune': TimelineEntry.objects.filter(user=user, post__user=other),
+        'explore': trending.trending_posts().with_feed_data(user)[:30],
+    }
+
+
+def full_scans(queryset, index_walks=()):
+    """
+    Return the lines of the query plan that scan a large table, except
+    walks of the given indexes.
+    """
+    if connection.vendor != 'sqlite':
+        raise NotImplementedError('Query plans are only checked on SQLite.')
+    # Subqueries refer to their tables by aliases such as U0
+    aliases = {alias: table for table, alias in ALIAS.findall(str(queryset.query))}
+    scans = []
+    for line in queryset.explain().splitlines():
+        match = SCAN.search(line)
+        if match and match.group(2) in index_walks and queryset.query.high_mark is not None:
+            continue
+        if match and aliases.get(match.group(1), match.group(1)) in LARGE_TABLES:
+            scans.append(line.strip())
+    return scans
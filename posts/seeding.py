@@ -0,0 +1,256 @@
+"""
+Synthetic data for scale testing.
+
+Users follow each other along a power-law graph, where a few users gather
+most of the followers, and likes concentrate on a few popular posts in the
+same way. Photos and profile pictures are drawn from a small pool of
+generated images, rendered by a process pool. Rows are inserted in batches,
+skipping the signals, and the counters and timelines are computed once at
+the end. The same seed always produces the same data.
+"""
+
+# Django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+import django
+
+# Models
+from posts.models import Likes, Post
+from users.models import Follows, Profile
+
+# Timelines, counters and trending posts
+from posts import counters, timelines, trending
+
+# Images
+from picscape import images
+
+# Blobs
+from blobs import references
+
+# Search
+from search import fulltext
+
+# Utilities
+from bisect import bisect
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+from itertools import islice
+from PIL import Image, ImageDraw
+import random
+
+# Shape of the follows, posts, likes and title words distributions
+PARETO_ALPHA = 2.0
+ZIPF_EXPONENT = 1.1
+
+# Vocabulary of the post titles
+WORDS = (
+    'sunset sunrise beach ocean wave sand summer winter autumn spring snow rain storm cloud sky '
+    'mountain hill valley lake river forest tree flower garden park field desert island city street '
+    'bridge tower building night light shadow reflection portrait selfie friends family wedding party '
+    'birthday dinner lunch breakfast coffee pizza cake dessert food travel trip road train plane car '
+    'bike walk hike run swim surf ski dog cat bird horse cow fish pet baby kid smile happy love '
+    'weekend holiday vacation morning evening golden blue green red yellow black white vintage '
+    'music concert festival art museum painting street graffiti market harbour boat sail camping '
+    'fire stars moon galaxy macro nature wildlife architecture minimal urban rooftop skyline'
+).split()
+
+
+def draw_image(name, size, seed):
+    """
+    Draw and save a deterministic image, then create its renditions.
+    Run in the worker processes.
+    """
+    rng = random.Random(seed)
+    image = Image.new('RGB', (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size), rng.randrange(size)
+        radius = rng.randrange(size // 20, size // 4)
+        draw.ellipse(
+            (x - radius, y - radius, x + radius, y + radius),
+            fill=tuple(rng.randrange(256) for _ in range(3)),
+        )
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    name = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return name, images.create_renditions(name)
+
+
+def draw_images(count, seed, workers):
+    """
+    Create the pools of photos and profile pictures.
+    Return them as lists of (name, renditions).
+    """
+    jobs = [
+        (f'posts/photos/seed-{seed}-{i}.jpeg', 1080, f'{seed}-photo-{i}') for i in range(count)
+    ] + [
+        (f'users/pictures/seed-{seed}-{i}.jpeg', 300, f'{seed}-picture-{i}') for i in range(count)
+    ]
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        results = list(executor.map(draw_image, *zip(*jobs)))
+    return results[:count], results[count:]
+
+
+def degree(rng, mean, maximum):
+    """
+    Return a random number of items, power-law distributed around the mean.
+    """
+    # The mean of a Pareto variate is alpha / (alpha - 1)
+    scale = mean * (PARETO_ALPHA - 1) / PARETO_ALPHA
+    return min(maximum, round(scale * rng.paretovariate(PARETO_ALPHA)))
+
+
+def popularity(rng, items):
+    """
+    Shuffle the items and return them with their cumulative Zipf weights.
+    """
+    items = list(items)
+    rng.shuffle(items)
+    weights = []
+    total = 0
+    for rank in range(1, len(items) + 1):
+        total += rank ** -ZIPF_EXPONENT
+        weights.append(total)
+    return items, weights
+
+
+def pick(rng, items, weights, count, exclude=None):
+    """
+    Return up to count distinct items, drawn by popularity.
+    """
+    picked = set()
+    for _ in range(count * 3):
+        if len(picked) >= count:
+            break
+        item = items[bisect(weights, rng.random() * weights[-1])]
+        if item != exclude:
+            picked.add(item)
+    return sorted(picked)
+
+
+def title(rng, words, weights):
+    """
+    Return a post title of a few words, drawn by popularity.
+    """
+    return ' '.join(
+        words[bisect(weights, rng.random() * weights[-1])] for _ in range(rng.randint(1, 4))
+    ).capitalize()
+
+
+@contextmanager
+def explicit_dates(model, field_name):
+    """
+    Let the given auto_now_add field be set by the caller. bulk_create
+    overwrites these fields even when set, so the shared field is switched
+    off for the whole process: this is not thread-safe, and only meant for
+    the seed command.
+    """
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def insert(model, objects, batch_size, **kwargs):
+    """
+    Insert objects from an iterable in batches.
+    Return the number of objects inserted.
+    """
+    objects = iter(objects)
+    total = 0
+    with transaction.atomic():
+        while batch := list(islice(objects, batch_size)):
+            model.objects.bulk_create(batch, **kwargs)
+            total += len(batch)
+    return total
+
+
+def seed(users=1000, follows=50, posts=20, likes=100, images_count=20, days=90,
+         seed=0, batch_size=5000, workers=None, log=None):
+    """
+    Create a synthetic dataset and return the number of rows of each kind.
+    The follows, posts and likes arguments are means per user.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    log(f'Drawing {images_count} photos and profile pictures...')
+    photos, pictures = draw_images(images_count, seed, workers)
+
+    log(f'Creating {users} users...')
+    password = make_password('1234')
+    insert(User, (User(username=f'seed{seed}-{i}', password=password) for i in range(users)), batch_size)
+    user_ids = list(
+        User.objects.filter(username__startswith=f'seed{seed}-').order_by('pk').values_list('pk', flat=True)
+    )
+    insert(Profile, (
+        Profile(
+            user_id=user_id,
+            biography='Hello!',
+            picture=picture,
+            picture_renditions=renditions,
+        )
+        for user_id in user_ids
+        for picture, renditions in [rng.choice(pictures)]
+    ), batch_size)
+
+    log('Creating follows...')
+    ranked_users, user_weights = popularity(rng, user_ids)
+    follows_total = insert(Follows, (
+        Follows(follower_id=follower_id, followee_id=followee_id)
+        for follower_id in user_ids
+        for followee_id in pick(
+            rng, ranked_users, user_weights, degree(rng, follows, len(user_ids) - 1), exclude=follower_id,
+        )
+    ), batch_size)
+
+    log('Creating posts...')
+    ranked_words, word_weights = popularity(rng, WORDS)
+    with explicit_dates(Post, 'created'):
+        posts_total = insert(Post, (
+            Post(
+                user_id=user_id,
+                title=title(rng, ranked_words, word_weights),
+                photo=photo,
+                photo_renditions=renditions,
+                created=now - timedelta(seconds=rng.randrange(days * 24 * 3600)),
+            )
+            for user_id in user_ids
+            for _ in range(degree(rng, posts, posts * 100))
+            for photo, renditions in [rng.choice(photos)]
+        ), batch_size)
+
+    log('Creating likes...')
+    post_ids = Post.objects.filter(user_id__in=user_ids).order_by('pk').values_list('pk', flat=True)
+    ranked_posts, post_weights = popularity(rng, post_ids)
+    likes_total = 0
+    if ranked_posts:
+        likes_total = insert(Likes, (
+            Likes(user_id=user_id, post_id=post_id)
+            for user_id in user_ids
+            for post_id in pick(rng, ranked_posts, post_weights, degree(rng, likes, len(ranked_posts)))
+        ), batch_size)
+
+    log('Updating counters, timelines, trending scores, blob references and the search index...')
+    for _ in counters.reconcile():
+        pass
+    timelines.rebuild_all()
+    trending.rebuild()
+    references.reconcile()
+    fulltext.rebuild()
+
+    return {
+        'users': len(user_ids),
+        'follows': follows_total,
+        'posts': posts_total,
+        'likes': likes_total,
+    }
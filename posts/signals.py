@@ -0,0 +1,127 @@
+# Django
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+# Models
+from posts.models import Likes, Post, TrendingPost
+from users.models import Profile
+
+# Images
+from picscape import images
+
+# Fragments
+from picscape import fragments
+
+# Blobs
+from blobs import references
+
+# Counters
+from posts.counters import counted_elsewhere
+
+
+@receiver(post_save, sender=Post)
+def increment_posts_count(sender, instance, created, **kwargs):
+    """
+    Count a new post in its author's profile.
+    """
+    if created:
+        Profile.objects.filter(user_id=instance.user_id).update(
+            posts_count=F('posts_count') + 1
+        )
+
+
+@receiver(post_save, sender=Post)
+def create_photo_renditions(sender, instance, **kwargs):
+    """
+    Create the renditions of a new or replaced photo.
+    """
+    if images.needs_renditions(instance, 'photo'):
+        images.schedule(instance, 'photo')
+
+
+@receiver(pre_save, sender=Post)
+def remember_photo_blobs(sender, instance, update_fields=None, **kwargs):
+    """
+    Remember the blobs the saved photo points to, before they are replaced.
+    """
+    instance._photo_blobs = set()
+    if instance.pk is not None and (update_fields is None or 'photo' in update_fields):
+        instance._photo_blobs = references.stored(Post, instance.pk, 'photo')
+
+
+@receiver(post_save, sender=Post)
+def count_photo_blobs(sender, instance, update_fields=None, **kwargs):
+    """
+    Count the references to the blobs of a new or replaced photo.
+    """
+    if update_fields is None or 'photo' in update_fields:
+        references.replace(instance._photo_blobs, references.names_of(instance, 'photo'))
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_photo_blobs(sender, instance, **kwargs):
+    """
+    Remember the blobs the photo of a post about to be deleted points to.
+    The instance may hold outdated renditions.
+    """
+    instance._photo_blobs = references.stored(Post, instance.pk, 'photo')
+
+
+@receiver(post_delete, sender=Post)
+def release_photo_blobs(sender, instance, **kwargs):
+    """
+    Discount the references of a deleted post to its photo blobs.
+    """
+    references.replace(instance._photo_blobs, set())
+
+
+@receiver(post_delete, sender=Post)
+def decrement_posts_count(sender, instance, **kwargs):
+    """
+    Discount a deleted post from its author's profile.
+    """
+    Profile.objects.filter(user_id=instance.user_id, posts_count__gt=0).update(
+        posts_count=F('posts_count') - 1
+    )
+
+
+@receiver(pre_delete, sender=User)
+def release_likes(sender, instance, **kwargs):
+    """
+    Discount the likes of a user that is about to be deleted.
+    """
+    Post.objects.filter(likes__user=instance, likes_count__gt=0).update(
+        likes_count=F('likes_count') - 1
+    )
+
+
+@receiver(post_delete, sender=Likes)
+def release_like(sender, instance, origin=None, **kwargs):
+    """
+    Discount a like deleted without the likes manager, from the admin for example.
+    """
+    if counted_elsewhere(sender, origin):
+        return
+    Post.objects.filter(pk=instance.post_id).update(likes_count=Greatest(F('likes_count') - 1, 0))
+    TrendingPost.objects.remove_likes(instance.post_id, [instance.created])
+
+
+@receiver(pre_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_card(sender, instance, **kwargs):
+    """
+    Drop the cached card of a post that is about to change or was deleted.
+    The post still holds the modified date its card was cached with.
+    """
+    if instance.pk is None or instance.modified is None:
+        return
+    profile_modified = Profile.objects.filter(
+        user_id=instance.user_id,
+    ).values_list('modified', flat=True).first()
+    if profile_modified:
+        fragments.invalidate([
+            fragments.post_card_key(instance.pk, instance.modified, profile_modified),
+        ])
@@ -0,0 +1,63 @@
+# Django
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+# Images
+from picscape import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(image, width, format, version=None):
+    """
+    Return the versioned URL of a thumbnail of the image.
+    """
+    url = reverse('thumbnail', kwargs={'width': width, 'format': format, 'path': image.name})
+    return f'{url}?v={version or thumbnails.version(image.name)}'
+
+
+@register.inclusion_tag('picture.html')
+def picture(image, renditions, sizes='100vw', **attrs):
+    """
+    Render a picture offering every rendition of the image through srcset.
+    Fall back to on-demand thumbnails until its renditions are ready.
+    """
+    sources = []
+    src = image.url if image else ''
+    renditions = renditions or {}
+
+    version = None
+    if image and not renditions:
+        try:
+            version = thumbnails.version(image.name)
+        except OSError:
+            pass
+
+    for extension in settings.PICSCAPE_IMAGE_FORMATS:
+        if renditions.get(extension):
+            candidates = [
+                (width, default_storage.url(path))
+                for width, path in renditions[extension]
+            ]
+        elif version:
+            candidates = [
+                (width, thumbnail_url(image, width, extension, version))
+                for width in sorted(settings.PICSCAPE_IMAGE_RENDITIONS.values(), reverse=True)
+            ]
+        else:
+            continue
+        sources.append({
+            'type': f'image/{extension}',
+            'srcset': ', '.join(f'{url} {width}w' for width, url in candidates),
+        })
+        src = candidates[0][1]
+
+    return {
+        'src': src,
+        'sources': sources,
+        'sizes': sizes,
+        'attrs': attrs,
+    }
@@ -1,3 +1,1021 @@
-from django.test import TestCase
+# Django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template import Context, Template
+from django.urls import resolve, reverse
+from django.utils import timezone
 
-# Create your tests here.
+# Utilities
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from PIL import Image
+import math
+import shutil
+import tempfile
+
+# Models
+from posts.models import Post, Likes, TimelineEntry, TrendingPost
+from users.models import Profile, Follows
+
+# Timelines
+from posts import counters, likes_buffer, query_plans, timelines, trending
+
+# Fragments
+from picscape import fragments
+
+# Views
+from posts.views import PostsFeedView
+
+
+def create_user(username):
+    """
+    Create a user with a complete profile.
+    """
+    user = User.objects.create_user(username=username, password='1234')
+    Profile.objects.create(
+        user=user,
+        biography='Hello!',
+        picture=f'users/pictures/{username}.jpeg',
+    )
+    return user
+
+
+def create_post(user, title='Post'):
+    """
+    Publish a post without uploading a photo.
+    """
+    post = Post.objects.create(
+        user=user,
+        title=title,
+        photo=f'posts/photos/{user.username}-{title}.jpeg',
+    )
+    timelines.fan_out(post)
+    return post
+
+
+def follow(follower, followee):
+    """
+    Make follower follow followee.
+    """
+    Follows.objects.follow(follower, followee)
+    timelines.backfill(follower, followee)
+
+
+class PostsFeedViewTestCase(TestCase):
+    """
+    Feed view tests.
+    """
+
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.author = create_user('author')
+        follow(self.viewer, self.author)
+        self.client.force_login(self.viewer)
+        # Let the session learn that the profile is complete
+        self.client.get(reverse('posts:feed'))
+
+    def count_feed_queries(self):
+        """
+        Return the number of queries needed to render the first feed page.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:feed'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_page_size(self):
+        post = create_post(self.author, 'first')
+        Likes.objects.like(self.viewer, post)
+        single_post_queries = self.count_feed_queries()
+
+        for i in range(PostsFeedView.paginate_by - 1):
+            other_author = create_user(f'author{i}')
+            follow(self.viewer, other_author)
+            other = create_post(other_author, f'post{i}')
+            Likes.objects.like(self.author, other)
+        self.assertEqual(self.count_feed_queries(), single_post_queries)
+
+    def test_feed_annotates_likes(self):
+        post = create_post(self.author)
+        Likes.objects.like(self.viewer, post)
+        Likes.objects.like(self.author, post)
+        create_post(self.author, 'unliked')
+
+        response = self.client.get(reverse('posts:feed'))
+        posts = {post.title: post for post in response.context['posts']}
+        self.assertEqual(posts['Post'].likes_count, 2)
+        self.assertTrue(posts['Post'].is_liking)
+        self.assertEqual(posts['unliked'].likes_count, 0)
+        self.assertFalse(posts['unliked'].is_liking)
+
+
+
+class TimelinesTestCase(TestCase):
+    """
+    Home timeline tests.
+    """
+
+    def setUp(self):
+        self.follower = create_user('follower')
+        self.author = create_user('author')
+
+    def timeline_titles(self, user):
+        """
+        Return the titles in the user's timeline, newest first.
+        """
+        return list(timelines.timeline_posts(user).values_list('title', flat=True))
+
+    def test_posts_are_fanned_out_to_followers(self):
+        follow(self.follower, self.author)
+        create_post(self.author, 'followed')
+        create_post(create_user('stranger'), 'unfollowed')
+        self.assertEqual(self.timeline_titles(self.follower), ['followed'])
+        self.assertEqual(self.timeline_titles(self.author), ['followed'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        create_post(self.author, 'old')
+        create_post(self.follower, 'own')
+        follow(self.follower, self.author)
+        self.assertEqual(self.timeline_titles(self.follower), ['own', 'old'])
+
+        timelines.prune(self.follower, self.author)
+        self.assertEqual(self.timeline_titles(self.follower), ['own'])
+
+    @override_settings(PICSCAPE_TIMELINE_MAX_LENGTH=2)
+    def test_timelines_are_capped(self):
+        for i in range(3):
+            create_post(self.author, f'post{i}')
+        follow(self.follower, self.author)
+        self.assertEqual(self.timeline_titles(self.follower), ['post2', 'post1'])
+
+    @override_settings(PICSCAPE_TIMELINE_MAX_LENGTH=2)
+    def test_fan_out_trims_timelines(self):
+        follow(self.follower, self.author)
+        for i in range(3):
+            create_post(self.author, f'post{i}')
+        entries = TimelineEntry.objects.filter(user=self.follower)
+        self.assertEqual(
+            list(entries.order_by('-created').values_list('post__title', flat=True)),
+            ['post2', 'post1'],
+        )
+
+    @override_settings(PICSCAPE_TIMELINE_FANOUT_LIMIT=0)
+    def test_high_fanout_posts_are_pulled(self):
+        follow(self.follower, self.author)
+        create_post(self.author, 'popular')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists()
+        )
+        self.assertEqual(self.timeline_titles(self.follower), ['popular'])
+
+    def test_rebuild_command(self):
+        create_post(self.author, 'post')
+        Follows.objects.create(follower=self.follower, followee=self.author)
+        self.assertEqual(self.timeline_titles(self.follower), [])
+
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline_titles(self.follower), ['post'])
+
+    @override_settings(PICSCAPE_TIMELINE_MAX_LENGTH=2, PICSCAPE_TIMELINE_FANOUT_LIMIT=5)
+    def test_rebuild_all_matches_rebuild(self):
+        popular = create_user('popular')
+        Profile.objects.filter(user=popular).update(followers_count=10)
+        for i in range(3):
+            create_post(self.author, f'post{i}')
+        create_post(self.follower, 'own')
+        create_post(popular, 'popular')
+        Follows.objects.create(follower=self.follower, followee=self.author)
+        Follows.objects.create(follower=self.follower, followee=popular)
+
+        for user in User.objects.all():
+            timelines.rebuild(user)
+        expected = set(TimelineEntry.objects.values_list('user', 'post', 'created'))
+        TimelineEntry.objects.all().delete()
+
+        timelines.rebuild_all()
+        self.assertEqual(set(TimelineEntry.objects.values_list('user', 'post', 'created')), expected)
+        self.assertCountEqual(
+            TimelineEntry.objects.filter(user=self.follower).values_list('post__title', flat=True),
+            ['own', 'post2'],
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.follower, post__user=popular).exists())
+
+
+class SeedTestCase(TestCase):
+    """
+    Synthetic data seeding tests.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_seeded_data_is_consistent(self):
+        call_command('seed', users=30, follows=5, posts=3, likes=5, images=1, workers=1, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 30)
+        self.assertTrue(Post.objects.exists())
+        self.assertTrue(Likes.objects.exists())
+        for name, rows, drift in counters.reconcile(fix=False):
+            self.assertEqual(rows, 0, name)
+
+        post = Post.objects.first()
+        self.assertTrue(default_storage.exists(post.photo.name))
+        self.assertEqual(post.photo_renditions['source'], post.photo.name)
+        follower = Follows.objects.first().follower
+        self.assertTrue(TimelineEntry.objects.filter(user=follower).exists())
+
+
+class QueryPlansTestCase(TestCase):
+    """
+    Hot query plans tests.
+    """
+
+    def test_hot_queries_search_indexes(self):
+        users = [create_user(f'user{i}') for i in range(5)]
+        for user in users:
+            for other in users:
+                if other != user:
+                    follow(user, other)
+            for i in range(3):
+                Likes.objects.like(user, create_post(user, f'post{i}'))
+
+        post = Post.objects.filter(user=users[1]).first()
+        for name, queryset in query_plans.hot_queries(users[0], users[1], post).items():
+            with self.subTest(name):
+                self.assertEqual(query_plans.full_scans(queryset, query_plans.INDEX_WALKS.get(name, ())), [])
+
+        # Walking an index to filter the rows is flagged, limited or not
+        self.assertTrue(query_plans.full_scans(Post.objects.filter(title='post1').order_by('-created')[:13]))
+
+
+class CursorPaginationTestCase(TestCase):
+    """
+    Feed cursor pagination tests.
+    """
+
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        for i in range(2 * PostsFeedView.paginate_by + 1):
+            create_post(self.viewer, f'post{i}')
+        self.client.force_login(self.viewer)
+
+    def get_feed(self, **params):
+        """
+        Return the feed response for the given query parameters.
+        """
+        response = self.client.get(reverse('posts:feed'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def titles(self, response):
+        """
+        Return the post titles on a feed page.
+        """
+        return [post.title for post in response.context['posts']]
+
+    def test_cursors_walk_the_feed_both_ways(self):
+        expected = [f'post{i}' for i in reversed(range(2 * PostsFeedView.paginate_by + 1))]
+        first = self.get_feed()
+        self.assertFalse(first.context['page_obj'].has_previous())
+
+        second = self.get_feed(cursor=first.context['page_obj'].next_cursor)
+        third = self.get_feed(cursor=second.context['page_obj'].next_cursor)
+        self.assertEqual(
+            self.titles(first) + self.titles(second) + self.titles(third),
+            expected,
+        )
+        self.assertFalse(third.context['page_obj'].has_next())
+
+        back = self.get_feed(cursor=third.context['page_obj'].previous_cursor)
+        self.assertEqual(self.titles(back), self.titles(second))
+
+    def test_cursor_pages_are_not_counted(self):
+        first = self.get_feed()
+        with CaptureQueriesContext(connection) as queries:
+            self.get_feed(cursor=first.context['page_obj'].next_cursor)
+        self.assertFalse(any('COUNT(*)' in query['sql'] for query in queries))
+
+    def test_page_numbers_are_deprecated_but_served(self):
+        response = self.get_feed(page=2)
+        self.assertEqual(response['Deprecation'], 'true')
+        self.assertEqual(self.titles(response), ['post5', 'post4', 'post3', 'post2', 'post1'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('posts:feed'), {'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CountersTestCase(TestCase):
+    """
+    Denormalized counters tests.
+    """
+
+    def setUp(self):
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.client.force_login(self.user)
+
+    def test_like_view_updates_likes_count(self):
+        post = create_post(self.author)
+        self.client.get(reverse('posts:like', kwargs={'pk': post.pk}))
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+
+        self.client.get(reverse('posts:like', kwargs={'pk': post.pk}))
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 0)
+
+    def test_follow_view_updates_profiles(self):
+        self.client.get(reverse('users:follow', kwargs={'username': 'author'}))
+        self.assertEqual(Profile.objects.get(user=self.user).following_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.author).followers_count, 1)
+
+        self.client.get(reverse('users:follow', kwargs={'username': 'author'}))
+        self.assertEqual(Profile.objects.get(user=self.user).following_count, 0)
+        self.assertEqual(Profile.objects.get(user=self.author).followers_count, 0)
+
+    def test_posts_count_follows_creations_and_deletions(self):
+        post = create_post(self.author)
+        self.assertEqual(Profile.objects.get(user=self.author).posts_count, 1)
+        post.delete()
+        self.assertEqual(Profile.objects.get(user=self.author).posts_count, 0)
+
+    def test_deleted_users_release_their_likes_and_follows(self):
+        post = create_post(self.author)
+        Likes.objects.like(self.user, post)
+        follow(self.user, self.author)
+        self.user.delete()
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 0)
+        self.assertEqual(Profile.objects.get(user=self.author).followers_count, 0)
+
+    def test_likes_and_follows_deleted_directly_are_discounted(self):
+        post = create_post(self.author)
+        other = create_post(self.author, 'other')
+        Likes.objects.like(self.user, post)
+        Likes.objects.like(self.user, other)
+        follow(self.user, self.author)
+
+        # As the admin deletes them, one or several at once
+        Likes.objects.get(post=post).delete()
+        Likes.objects.filter(post=other).delete()
+        Follows.objects.get(follower=self.user).delete()
+
+        for counted in (post, other):
+            counted.refresh_from_db()
+            self.assertEqual(counted.likes_count, 0)
+        self.assertEqual(Profile.objects.get(user=self.user).following_count, 0)
+        self.assertEqual(Profile.objects.get(user=self.author).followers_count, 0)
+        for name, rows, drift in counters.reconcile(fix=False):
+            self.assertEqual(rows, 0, name)
+
+    def test_reconcile_command_fixes_drift(self):
+        post = create_post(self.author)
+        Likes.objects.create(user=self.user, post=post)
+        Follows.objects.create(follower=self.user, followee=self.author)
+
+        output = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=output)
+        self.assertIn('post.likes_count: 1 rows drifted by 1 in total', output.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 0)
+
+        call_command('reconcile_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.user).following_count, 1)
+
+
+class TogglesTestCase(TestCase):
+    """
+    Like and follow toggles tests.
+    """
+
+    def setUp(self):
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.post = create_post(self.author)
+
+    def test_duplicates_are_rejected(self):
+        Likes.objects.create(user=self.user, post=self.post)
+        with self.assertRaises(IntegrityError):
+            Likes.objects.create(user=self.user, post=self.post)
+
+    def test_like_and_follow_are_idempotent(self):
+        self.assertTrue(Likes.objects.like(self.user, self.post))
+        self.assertFalse(Likes.objects.like(self.user, self.post))
+        self.assertTrue(Follows.objects.follow(self.user, self.author))
+        self.assertFalse(Follows.objects.follow(self.user, self.author))
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.author).followers_count, 1)
+
+    def test_toggles_return_the_new_state(self):
+        self.assertTrue(Likes.objects.toggle(self.user, self.post))
+        self.assertFalse(Likes.objects.toggle(self.user, self.post))
+        self.assertTrue(Follows.objects.toggle(self.user, self.author))
+        self.assertFalse(Follows.objects.toggle(self.user, self.author))
+
+
+class ConcurrentTogglesTestCase(TransactionTestCase):
+    """
+    Hammer the toggles from many threads at once.
+    """
+    threads = 16
+    toggles = 20
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.post = create_post(self.author)
+        self.users = [create_user(f'user{i}') for i in range(4)]
+
+    def hammer(self, toggle):
+        """
+        Run the toggle concurrently, several threads per user.
+        """
+        def run(user):
+            try:
+                for _ in range(self.toggles):
+                    toggle(user)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            users = [self.users[i % len(self.users)] for i in range(self.threads)]
+            for future in [executor.submit(run, user) for user in users]:
+                future.result()
+
+    def test_concurrent_likes(self):
+        self.hammer(lambda user: Likes.objects.toggle(user, self.post))
+
+        for user in self.users:
+            self.assertLessEqual(Likes.objects.filter(user=user, post=self.post).count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, self.post.likes.count())
+
+    def test_concurrent_follows(self):
+        self.hammer(lambda user: Follows.objects.toggle(user, self.author))
+
+        for user in self.users:
+            self.assertLessEqual(
+                Follows.objects.filter(follower=user, followee=self.author).count(), 1
+            )
+            self.assertEqual(
+                Profile.objects.get(user=user).following_count,
+                Follows.objects.filter(follower=user).count(),
+            )
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count,
+            Follows.objects.filter(followee=self.author).count(),
+        )
+
+
+class TrendingTestCase(TestCase):
+    """
+    Trending scores and explore page tests.
+    """
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.users = [create_user(f'user{i}') for i in range(3)]
+        self.client.force_login(self.users[0])
+
+    def score(self, likes, age=0):
+        """
+        Return the score of likes made age half-lives ago.
+        """
+        half_life = timedelta(seconds=settings.PICSCAPE_TRENDING_HALF_LIFE)
+        return TrendingPost.objects.rank(timezone.now() - age * half_life) + math.log(likes)
+
+    def test_likes_update_the_score(self):
+        post = create_post(self.author)
+        for user in self.users:
+            Likes.objects.like(user, post)
+        self.assertAlmostEqual(TrendingPost.objects.get(post=post).score, self.score(3), places=2)
+
+        Likes.objects.unlike(self.users[0], post)
+        self.assertAlmostEqual(TrendingPost.objects.get(post=post).score, self.score(2), places=2)
+
+        Likes.objects.unlike(self.users[1], post)
+        Likes.objects.unlike(self.users[2], post)
+        self.assertFalse(TrendingPost.objects.filter(post=post).exists())
+
+    def test_withdrawn_likes_take_back_what_they_added(self):
+        post = create_post(self.author)
+        half_life = timedelta(seconds=settings.PICSCAPE_TRENDING_HALF_LIFE)
+        for withdraw in (
+            lambda user: Likes.objects.unlike(user, post),
+            lambda user: Likes.objects.apply({(user.pk, post.pk): False}),
+            lambda user: Likes.objects.get(user=user, post=post).delete(),
+        ):
+            # An old like, then a fresh one
+            Likes.objects.like(self.users[0], post)
+            Likes.objects.filter(user=self.users[0]).update(created=timezone.now() - 2 * half_life)
+            TrendingPost.objects.filter(post=post).update(score=self.score(1, age=2))
+            Likes.objects.like(self.users[1], post)
+
+            withdraw(self.users[0])
+            self.assertAlmostEqual(TrendingPost.objects.get(post=post).score, self.score(1), places=2)
+            Likes.objects.unlike(self.users[1], post)
+            self.assertFalse(TrendingPost.objects.filter(post=post).exists())
+
+    def test_likes_decay(self):
+        old = create_post(self.author, 'Old')
+        new = create_post(self.author, 'New')
+        # Four likes two half-lives ago are worth one fresh like, eight are worth two
+        TrendingPost.objects.create(post=old, score=self.score(8, age=2))
+        Likes.objects.like(self.users[0], new)
+        self.assertEqual(list(trending.trending_posts()), [old, new])
+
+        Likes.objects.like(self.users[1], new)
+        Likes.objects.like(self.users[2], new)
+        self.assertEqual(list(trending.trending_posts()), [new, old])
+
+    def test_prune_drops_decayed_scores(self):
+        cold = create_post(self.author, 'Cold')
+        warm = create_post(self.author, 'Warm')
+        TrendingPost.objects.create(post=cold, score=self.score(1, age=4))
+        TrendingPost.objects.create(post=warm, score=self.score(1, age=2))
+
+        output = StringIO()
+        call_command('update_trending', stdout=output)
+        self.assertIn('Dropped 1 scores.', output.getvalue())
+        self.assertEqual(list(trending.trending_posts()), [warm])
+
+    def test_rebuild_scores_posts_from_their_counters(self):
+        post = create_post(self.author)
+        Likes.objects.bulk_create([Likes(user=user, post=post) for user in self.users])
+        Post.objects.filter(pk=post.pk).update(likes_count=3)
+        create_post(self.author, 'Unliked')
+
+        call_command('update_trending', '--rebuild', stdout=StringIO())
+        self.assertEqual(list(trending.trending_posts()), [post])
+        self.assertAlmostEqual(TrendingPost.objects.get(post=post).score, self.score(3), places=2)
+
+    def test_explore_view_lists_trending_posts(self):
+        posts = [create_post(self.author, f'Post {i}') for i in range(3)]
+        for i, post in enumerate(posts):
+            for user in self.users[:i + 1]:
+                Likes.objects.like(user, post)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:explore'))
+        self.assertEqual(list(response.context['posts']), posts[::-1])
+        # Posts, likes and authors are read at once, in score order
+        self.assertEqual(len([query for query in queries if 'posts_post' in query['sql']]), 1)
+        self.assertTrue(response.context['posts'][2].is_liking)
+
+
+class LikesBufferTestCase(TestCase):
+    """
+    Write-behind likes tests.
+    """
+
+    def setUp(self):
+        # A new buffer for each test, flushed by hand
+        buffered = override_settings(PICSCAPE_LIKES_BUFFER='memory', PICSCAPE_LIKES_BUFFER_INTERVAL=None)
+        buffered.enable()
+        self.addCleanup(buffered.disable)
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.post = create_post(self.author)
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def like(self):
+        return self.client.get(reverse('posts:like', kwargs={'pk': self.post.pk}))
+
+    def test_likes_are_written_on_flush(self):
+        self.like()
+        self.assertFalse(Likes.objects.exists())
+
+        # The user sees their like right away
+        response = self.client.get(reverse('posts:detail', kwargs={'pk': self.post.pk}))
+        self.assertTrue(response.context['is_liking'])
+        self.assertEqual(response.context['likes_count'], 1)
+
+        self.assertEqual(likes_buffer.flush(), 1)
+        self.assertTrue(Likes.objects.filter(user=self.user, post=self.post).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertTrue(TrendingPost.objects.filter(post=self.post).exists())
+
+    def test_likes_of_deleted_posts_and_users_are_dropped(self):
+        other = create_post(self.author, 'Other')
+        reader = create_user('reader')
+        likes_buffer.set_liking(self.user, self.post.pk, True)
+        likes_buffer.set_liking(reader, other.pk, True)
+        likes_buffer.set_liking(self.user, other.pk, True)
+        self.post.delete()
+        reader.delete()
+
+        self.assertEqual(likes_buffer.flush(), 1)
+        self.assertEqual(list(Likes.objects.values_list('user', 'post')), [(self.user.pk, other.pk)])
+        self.assertEqual(likes_buffer.pending(self.user), {})
+        self.assertEqual(likes_buffer.flush(), 0)
+
+    async def test_feed_pages_show_buffered_likes(self):
+        own = await sync_to_async(create_post)(self.user, 'Own')
+        await sync_to_async(likes_buffer.set_liking)(self.user, own.pk, True)
+        for params in ({}, {'page': 1}):
+            response = await self.async_client.get(reverse('posts:feed'), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '1 Likes')
+
+    def test_withdrawn_likes_cancel_out(self):
+        self.like()
+        self.like()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(likes_buffer.flush(), 0)
+        self.assertFalse([query for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
+        Likes.objects.like(self.user, self.post)
+        self.like()
+        self.like()
+        self.assertEqual(likes_buffer.flush(), 0)
+        self.assertTrue(Likes.objects.filter(user=self.user, post=self.post).exists())
+
+    def test_likes_of_a_post_update_its_counters_once(self):
+        users = [create_user(f'fan{i}') for i in range(10)]
+        for user in users:
+            likes_buffer.set_liking(user, self.post.pk, True)
+        likes_buffer.set_liking(self.user, self.post.pk, False)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(likes_buffer.flush(), 10)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "posts_post"')]), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 10)
+
+    def test_likes_changed_during_a_flush_are_kept(self):
+        buffer = likes_buffer.get_buffer()
+        likes_buffer.set_liking(self.user, self.post.pk, True)
+        intents = buffer.snapshot(10)
+        Likes.objects.apply({key: liking for key, (liking, _) in intents.items()})
+        # Withdrawn while the like was written
+        likes_buffer.set_liking(self.user, self.post.pk, False)
+        buffer.discard(intents)
+
+        self.assertEqual(likes_buffer.pending(self.user), {self.post.pk: (False, True)})
+        self.assertEqual(likes_buffer.flush(), 1)
+        self.assertFalse(Likes.objects.exists())
+
+    def test_likes_withdrawn_around_a_flush_are_removed(self):
+        buffer = likes_buffer.get_buffer()
+        likes_buffer.set_liking(self.user, self.post.pk, True)
+        # The unlike reads the pending like, which is flushed before it is put
+        liking, original = likes_buffer.is_liking(buffer, self.user, self.post.pk)
+        likes_buffer.flush()
+        buffer.put(self.user.pk, self.post.pk, not liking, original)
+
+        self.assertEqual(likes_buffer.flush(), 1)
+        self.assertFalse(Likes.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    async def test_validators_change_with_buffered_likes(self):
+        url = reverse('posts:detail', kwargs={'pk': self.post.pk})
+        etag = (await self.async_client.get(url))['ETag']
+        await self.async_client.put(reverse('posts:api_like', kwargs={'pk': self.post.pk}))
+
+        response = await self.async_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get(reverse('posts:api_detail', kwargs={'pk': self.post.pk}))
+        self.assertEqual((response.json()['is_liking'], response.json()['likes_count']), (True, 1))
+
+    def test_file_buffer_is_shared(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(PICSCAPE_LIKES_BUFFER='file', PICSCAPE_LIKES_BUFFER_PATH=f'{directory}/likes.sqlite3'):
+            self.like()
+            # As another process would see it
+            other = likes_buffer.FileBuffer(f'{directory}/likes.sqlite3')
+            self.assertEqual(other.pending(self.user.pk), {self.post.pk: (True, False)})
+
+            self.assertEqual(likes_buffer.flush(), 1)
+            self.assertEqual(other.pending(self.user.pk), {})
+        self.assertTrue(Likes.objects.filter(user=self.user, post=self.post).exists())
+
+
+class RenditionsTestCase(TestCase):
+    """
+    Image renditions tests.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, PICSCAPE_IMAGE_ASYNC=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = create_user('author')
+
+    def upload(self):
+        """
+        Return a landscape JPEG whose EXIF data says it must be rotated.
+        """
+        image = Image.new('RGB', (2000, 1000), 'red')
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpeg', buffer.getvalue(), 'image/jpeg')
+
+    def test_renditions_are_created_on_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(user=self.author, title='Photo', photo=self.upload())
+        post.refresh_from_db()
+
+        renditions = post.photo_renditions
+        self.assertEqual(renditions['source'], post.photo.name)
+        self.assertEqual((renditions['width'], renditions['height']), (1000, 2000))
+        self.assertEqual([width for width, _ in renditions['jpeg']], [1000, 640, 150])
+        self.assertEqual([width for width, _ in renditions['webp']], [1000, 640, 150])
+
+        width, path = renditions['jpeg'][1]
+        with Image.open(default_storage.open(path)) as rendition:
+            self.assertEqual(rendition.size, (640, 1280))
+            self.assertFalse(rendition.getexif())
+
+    def test_large_photos_are_decoded_at_a_reduced_scale(self):
+        buffer = BytesIO()
+        Image.new('RGB', (4400, 3300), 'blue').save(buffer, 'JPEG')
+        photo = SimpleUploadedFile('photo.jpeg', buffer.getvalue(), 'image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(user=self.author, title='Photo', photo=photo)
+        post.refresh_from_db()
+
+        renditions = post.photo_renditions
+        self.assertEqual((renditions['width'], renditions['height']), (4400, 3300))
+        self.assertEqual([width for width, _ in renditions['jpeg']], [1080, 640, 150])
+
+    def test_picture_tag_offers_every_rendition(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(user=self.author, title='Photo', photo=self.upload())
+        post.refresh_from_db()
+
+        html = Template(
+            '{% load pictures %}{% picture post.photo post.photo_renditions sizes="35px" %}'
+        ).render(Context({'post': post}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(' 150w', html)
+        self.assertIn('sizes="35px"', html)
+
+
+class FragmentCacheTestCase(TestCase):
+    """
+    Cached post cards tests.
+    """
+
+    def setUp(self):
+        self.cache = caches[fragments.CACHE]
+        self.cache.clear()
+        self.viewer = create_user('viewer')
+        self.post = create_post(self.viewer)
+        self.client.force_login(self.viewer)
+
+    def card_key(self):
+        """
+        Return the cache key of the post's card.
+        """
+        self.post.refresh_from_db()
+        return fragments.post_card_key(
+            self.post.pk, self.post.modified, self.viewer.profile.modified,
+        )
+
+    def test_cards_are_cached_and_likes_overlaid(self):
+        self.client.get(reverse('posts:feed'))
+        self.assertIsNotNone(self.cache.get(self.card_key()))
+
+        hits = self.cache.stats()['hits']
+        Likes.objects.like(self.viewer, self.post)
+        response = self.client.get(reverse('posts:feed'))
+        self.assertGreater(self.cache.stats()['hits'], hits)
+        self.assertContains(response, '1 Likes')
+        self.assertContains(response, 'fa fa-heart')
+
+    def test_saving_a_post_invalidates_its_card(self):
+        self.client.get(reverse('posts:feed'))
+        key = self.card_key()
+
+        self.post.title = 'Renamed'
+        self.post.save()
+        self.assertIsNone(self.cache.get(key))
+        self.assertContains(self.client.get(reverse('posts:feed')), 'Renamed')
+
+    def test_renaming_a_user_refreshes_their_cards(self):
+        self.client.get(reverse('posts:feed'))
+        self.viewer.first_name = 'Renamed'
+        self.viewer.save()
+        self.assertContains(self.client.get(reverse('posts:feed')), 'Renamed')
+
+        # Logins do not change the cards
+        self.viewer.profile.refresh_from_db()
+        modified = self.viewer.profile.modified
+        self.client.force_login(self.viewer)
+        self.viewer.profile.refresh_from_db()
+        self.assertEqual(self.viewer.profile.modified, modified)
+
+    def test_stats_are_exposed_to_staff(self):
+        self.assertEqual(self.client.get(reverse('cache_stats')).status_code, 302)
+
+        staff = User.objects.create_user(username='staff', password='1234', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('cache_stats'))
+        self.assertEqual(set(response.json()[fragments.CACHE]), {'hits', 'misses', 'hit_ratio'})
+
+
+class AsyncViewsTestCase(TestCase):
+    """
+    Async feed, detail and like views tests.
+    """
+
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.author = create_user('author')
+        follow(self.viewer, self.author)
+        self.post = create_post(self.author)
+        self.async_client.force_login(self.viewer)
+
+    def test_views_are_async(self):
+        for url in (
+            reverse('posts:feed'),
+            reverse('posts:detail', kwargs={'pk': self.post.pk}),
+            reverse('posts:like', kwargs={'pk': self.post.pk}),
+        ):
+            self.assertTrue(iscoroutinefunction(resolve(url).func), url)
+
+    async def test_feed(self):
+        response = await self.async_client.get(reverse('posts:feed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post.title for post in response.context['posts']], ['Post'])
+        self.assertFalse(response.context['page_obj'].has_other_pages())
+
+    async def test_detail(self):
+        response = await self.async_client.get(reverse('posts:detail', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['post'], self.post)
+        self.assertFalse(response.context['is_liking'])
+
+        response = await self.async_client.get(reverse('posts:detail', kwargs={'pk': 0}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_like_toggles(self):
+        url = reverse('posts:like', kwargs={'pk': self.post.pk})
+        response = await self.async_client.post(url)
+        self.assertRedirects(
+            response, reverse('posts:detail', kwargs={'pk': self.post.pk}), fetch_redirect_response=False,
+        )
+        self.assertTrue(await Likes.objects.filter(user=self.viewer, post=self.post).aexists())
+
+        await self.async_client.get(url)
+        self.assertFalse(await Likes.objects.filter(user=self.viewer, post=self.post).aexists())
+        self.assertEqual((await Post.objects.aget(pk=self.post.pk)).likes_count, 0)
+
+    async def test_anonymous_users_are_sent_to_login(self):
+        response = await self.async_client_class().get(reverse('posts:feed'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith(reverse('users:login')))
+
+
+class PostsApiTestCase(TestCase):
+    """
+    Feed, post and like API tests.
+    """
+
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.author = create_user('author')
+        follow(self.viewer, self.author)
+        self.async_client.force_login(self.viewer)
+
+    async def test_feed_is_cursor_paginated(self):
+        posts = [await sync_to_async(create_post)(self.author, f'post{i}') for i in range(7)]
+
+        response = await self.async_client.get(reverse('posts:api_feed'))
+        self.assertEqual(response.status_code, 200)
+        first = response.json()
+        self.assertEqual([post['title'] for post in first['results']], [f'post{i}' for i in range(6, 1, -1)])
+        self.assertEqual(first['results'][0]['author']['username'], 'author')
+        self.assertEqual(first['results'][0]['id'], posts[-1].pk)
+        self.assertIsNone(first['previous_cursor'])
+
+        response = await self.async_client.get(reverse('posts:api_feed'), {'cursor': first['next_cursor']})
+        second = response.json()
+        self.assertEqual([post['title'] for post in second['results']], ['post1', 'post0'])
+        self.assertIsNone(second['next_cursor'])
+
+        response = await self.async_client.get(reverse('posts:api_feed'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_post_detail(self):
+        post = await sync_to_async(create_post)(self.author)
+        response = await self.async_client.get(reverse('posts:api_detail', kwargs={'pk': post.pk}))
+        data = response.json()
+        self.assertEqual(data['title'], 'Post')
+        self.assertFalse(data['is_liking'])
+        self.assertEqual(data['photo']['url'], post.photo.url)
+
+        response = await self.async_client.get(reverse('posts:api_detail', kwargs={'pk': 0}))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+
+    async def test_likes_are_idempotent(self):
+        post = await sync_to_async(create_post)(self.author)
+        url = reverse('posts:api_like', kwargs={'pk': post.pk})
+        for _ in range(2):
+            response = await self.async_client.put(url)
+            self.assertEqual(response.json(), {'id': post.pk, 'is_liking': True, 'likes_count': 1})
+        for _ in range(2):
+            response = await self.async_client.delete(url)
+            self.assertEqual(response.json(), {'id': post.pk, 'is_liking': False, 'likes_count': 0})
+        self.assertFalse(await Likes.objects.filter(post=post).aexists())
+
+        response = await self.async_client.post(url)
+        self.assertEqual(response.status_code, 405)
+
+    async def test_anonymous_users_are_unauthorized(self):
+        response = await self.async_client_class().get(reverse('posts:api_feed'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'error': 'Authentication required'})
+
+
+class ConditionalGetTestCase(TestCase):
+    """
+    Validators of the feed, post and profile pages tests.
+    """
+
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.author = create_user('author')
+        follow(self.viewer, self.author)
+        self.post = create_post(self.author)
+        self.client.force_login(self.viewer)
+
+    def assertRevalidates(self, url, change, queries_count=3):
+        """
+        Assert that the page is not sent again until the change is made.
+        """
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # The session, the user and the validator
+        self.assertEqual(len(queries), queries_count)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_detail(self):
+        self.assertRevalidates(
+            reverse('posts:detail', kwargs={'pk': self.post.pk}),
+            lambda: Likes.objects.like(self.viewer, self.post),
+        )
+
+    def test_feed(self):
+        self.assertRevalidates(reverse('posts:feed'), lambda: create_post(self.author, 'New'))
+
+    def test_feed_of_another_viewer(self):
+        etag = self.client.get(reverse('posts:feed'))['ETag']
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:feed'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile(self):
+        self.assertRevalidates(
+            reverse('users:detail', kwargs={'username': 'author'}),
+            lambda: Follows.objects.unfollow(self.viewer, self.author),
+        )
+
+    def test_profile_without_posts(self):
+        def update_biography():
+            profile = Profile.objects.get(user=self.viewer)
+            profile.biography = 'Updated'
+            profile.save()
+
+        # Without posts, the header is read on its own
+        self.assertRevalidates(reverse('users:detail', kwargs={'username': 'viewer'}), update_biography, 4)
@@ -0,0 +1,204 @@
+"""
+Materialized home timelines.
+
+New posts are pushed to the timelines of the author's followers when they
+are created. Authors with a very large audience are not fanned out, their
+posts are pulled into their followers' feeds when the feed is read.
+"""
+
+# Django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+
+# Models
+from posts.models import Post, TimelineEntry
+from users.models import Follows, Profile
+
+
+def high_fanout_users():
+    """
+    Return the users whose posts are pulled on read instead of fanned out.
+    """
+    return User.objects.filter(
+        profile__followers_count__gt=settings.PICSCAPE_TIMELINE_FANOUT_LIMIT,
+    )
+
+
+def is_high_fanout(user):
+    """
+    Return whether the user has too many followers to fan out their posts.
+    """
+    return high_fanout_users().filter(pk=user.pk).exists()
+
+
+def fan_out(post):
+    """
+    Deliver a new post to its author's and their followers' timelines.
+    """
+    user_ids = [post.user_id]
+    if not is_high_fanout(post.user):
+        user_ids += Follows.objects.filter(
+            followee_id=post.user_id,
+        ).values_list('follower_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, created=post.created)
+            for user_id in user_ids
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    trim_many(user_ids)
+
+
+def backfill(follower, followee):
+    """
+    Add the recent posts of a newly followed user to the follower's timeline.
+    """
+    if is_high_fanout(followee):
+        return
+    posts = followee.posts.order_by('-created')[:settings.PICSCAPE_TIMELINE_MAX_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user=follower, post_id=pk, created=created)
+            for pk, created in posts.values_list('pk', 'created')
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    trim(follower)
+
+
+def prune(follower, followee):
+    """
+    Remove the posts of an unfollowed user from the follower's timeline.
+    Their own posts stay, whoever they unfollow.
+    """
+    TimelineEntry.objects.filter(
+        user=follower,
+        post__user=followee,
+    ).exclude(post__user=follower).delete()
+
+
+def trim(user):
+    """
+    Drop the entries that fall beyond the timeline's maximum length.
+    """
+    max_length = settings.PICSCAPE_TIMELINE_MAX_LENGTH
+    entries = TimelineEntry.objects.filter(user=user).order_by('-created', '-post_id')
+    oldest_kept = entries.values_list('created', 'post_id')[max_length - 1:max_length]
+    if not oldest_kept:
+        return
+    created, post_id = oldest_kept[0]
+    entries.filter(
+        Q(created__lt=created) | Q(created=created, post_id__lt=post_id)
+    ).delete()
+
+
+def trim_many(user_ids):
+    """
+    Drop the entries that fall beyond the maximum length of several
+    timelines, with one windowed DELETE per batch of users.
+    """
+    qn = connection.ops.quote_name
+    table = qn(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(user_ids), 1000):
+            batch = user_ids[start:start + 1000]
+            cursor.execute(
+                f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM (
+                        SELECT
+                            id,
+                            ROW_NUMBER() OVER (
+                                PARTITION BY user_id
+                                ORDER BY created DESC, post_id DESC
+                            ) AS position
+                        FROM {table}
+                        WHERE user_id IN ({', '.join(['%s'] * len(batch))})
+                    ) ranked
+                    WHERE position > %s
+                )
+                """,
+                [*batch, settings.PICSCAPE_TIMELINE_MAX_LENGTH],
+            )
+
+
+def rebuild(user):
+    """
+    Recompute a user's timeline from their own posts and their followees'.
+    """
+    posts = Post.objects.filter(
+        Q(user=user)
+        | Q(user__in=Follows.objects.filter(follower=user).values('followee'))
+    ).exclude(
+        Q(user__in=high_fanout_users()) & ~Q(user=user)
+    ).order_by('-created', '-id')[:settings.PICSCAPE_TIMELINE_MAX_LENGTH]
+
+    TimelineEntry.objects.filter(user=user).delete()
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user=user, post_id=pk, created=created)
+            for pk, created in posts.values_list('pk', 'created')
+        ],
+        batch_size=1000,
+    )
+
+
+def rebuild_all():
+    """
+    Recompute every timeline at once with a single INSERT ... SELECT.
+    Much faster than rebuilding users one by one after bulk imports.
+    """
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        TimelineEntry.objects.all().delete()
+        cursor.execute(
+            f"""
+            INSERT INTO {qn(TimelineEntry._meta.db_table)} (user_id, post_id, created)
+            SELECT user_id, post_id, created FROM (
+                SELECT
+                    audience.user_id,
+                    post.id AS post_id,
+                    post.created,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY audience.user_id
+                        ORDER BY post.created DESC, post.id DESC
+                    ) AS position
+                FROM (
+                    SELECT follower_id AS user_id, followee_id AS author_id
+                    FROM {qn(Follows._meta.db_table)}
+                    WHERE followee_id NOT IN (
+                        SELECT user_id FROM {qn(Profile._meta.db_table)}
+                        WHERE followers_count > %s
+                    )
+                    UNION
+                    SELECT id, id FROM {qn(User._meta.db_table)}
+                ) audience
+                INNER JOIN {qn(Post._meta.db_table)} post ON post.user_id = audience.author_id
+            ) ranked
+            WHERE position <= %s
+            ORDER BY user_id, created DESC
+            """,
+            [settings.PICSCAPE_TIMELINE_FANOUT_LIMIT, settings.PICSCAPE_TIMELINE_MAX_LENGTH],
+        )
+
+
+def timeline_posts(user):
+    """
+    Return the posts in a user's home timeline, newest first.
+    """
+    entries = TimelineEntry.objects.filter(
+        user=user,
+    ).order_by('-created', '-post_id')[:settings.PICSCAPE_TIMELINE_MAX_LENGTH]
+    pulled_followees = Follows.objects.filter(
+        follower=user,
+        followee__in=high_fanout_users(),
+    )
+    return Post.objects.filter(
+        Q(pk__in=entries.values('post'))
+        | Q(user__in=pulled_followees.values('followee'))
+    ).order_by('-created', '-id')
@@ -0,0 +1,82 @@
+"""
+Trending posts, ranked by their time-decayed likes.
+
+Every like and unlike updates its post's score as it happens, see
+TrendingPostManager, so the explore page reads the best posts straight from
+the scores index. Posts stop being worth a score as their likes age, and the
+update_trending command drops them periodically to keep the table small.
+"""
+
+# Django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+# Models
+from posts.models import Post, TrendingPost
+
+# Utilities
+from datetime import timedelta
+import math
+
+BATCH_SIZE = 1000
+
+
+def floor(now=None):
+    """
+    Return the lowest score still worth keeping.
+    """
+    return TrendingPost.objects.rank(now) + math.log(settings.PICSCAPE_TRENDING_MIN_SCORE)
+
+
+def prune(now=None):
+    """
+    Drop the scores that decayed below the minimum.
+    Return the number of dropped scores.
+    """
+    deleted, _ = TrendingPost.objects.filter(score__lt=floor(now)).delete()
+    return deleted
+
+
+def rebuild(now=None):
+    """
+    Recompute every score from the likes counters.
+    Return the number of scored posts.
+
+    The likes of a post are counted from its counter, as if made when it was
+    published, without reading the likes. Posts too old for their likes to
+    be worth a score are skipped.
+    """
+    now = now or timezone.now()
+    lowest = floor(now)
+    # Even the likes of the most liked post are worth too little past this age
+    most_likes = Post.objects.aggregate(most=Max('likes_count'))['most'] or 0
+    max_age = settings.PICSCAPE_TRENDING_HALF_LIFE * math.log2(
+        max(most_likes, settings.PICSCAPE_TRENDING_MIN_SCORE) / settings.PICSCAPE_TRENDING_MIN_SCORE
+    )
+    posts = Post.objects.filter(
+        created__gte=now - timedelta(seconds=max_age),
+        likes_count__gt=0,
+    ).values_list('pk', 'created', 'likes_count')
+
+    total = 0
+    with transaction.atomic():
+        TrendingPost.objects.all().delete()
+        scores = []
+        for pk, created, likes_count in posts.iterator(chunk_size=BATCH_SIZE):
+            score = TrendingPost.objects.rank(created) + math.log(likes_count)
+            if score >= lowest:
+                scores.append(TrendingPost(post_id=pk, score=score))
+            if len(scores) == BATCH_SIZE:
+                total += len(TrendingPost.objects.bulk_create(scores))
+                scores = []
+        total += len(TrendingPost.objects.bulk_create(scores))
+    return total
+
+
+def trending_posts():
+    """
+    Return the best scored posts, best first.
+    """
+    return Post.objects.filter(trending__isnull=False).order_by('-trending__score')
@@ -2,7 +2,7 @@
 from django.urls import path
 
 # Views
-from posts import views
+from posts import api, views
 
 urlpatterns = [
 
@@ -11,6 +11,11 @@ urlpatterns = [
         view=views.PostsFeedView.as_view(),
         name='feed'
     ),
+    path(
+        route='explore/',
+        view=views.ExploreView.as_view(),
+        name='explore'
+    ),
     path(
         route='p/<int:pk>/',
         view=views.PostDetailView.as_view(),
@@ -26,5 +31,22 @@ urlpatterns = [
         view=views.LikeView.as_view(),
         name='like'
     ),
+
+    # API
+    path(
+        route='api/feed/',
+        view=api.FeedApiView.as_view(),
+        name='api_feed'
+    ),
+    path(
+        route='api/p/<int:pk>/',
+        view=api.PostApiView.as_view(),
+        name='api_detail'
+    ),
+    path(
+        route='api/p/<int:pk>/like/',
+        view=api.LikeApiView.as_view(),
+        name='api_like'
+    ),
   
 ]
\ No newline at end of file
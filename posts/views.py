@@ -1,38 +1,128 @@
 # Django
+from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import ListView, DetailView, RedirectView
+from django.views.generic import ListView, DetailView, View
+from django.views.generic.base import ContextMixin
 from django.views.generic.edit import CreateView
-from django.shortcuts import get_object_or_404
+from django.shortcuts import redirect
+from django.db import transaction
+from django.http import Http404
 
 # Models
-from posts.models import Post, Likes
+from posts.models import Post
+from users.models import Profile
 
+# Forms
+from posts.forms import PostForm
 
-class PostsFeedView(LoginRequiredMixin, ListView):
+# Timelines, trending posts and buffered likes
+from posts import likes_buffer, timelines, trending
+
+# Pagination
+from posts.pagination import CursorPaginationMixin, CursorPaginator, InvalidCursor
+
+# Validators
+from picscape import conditional
+
+# Async views
+from picscape.async_views import AsyncLoginRequiredMixin, aget_object_or_404
+
+# Utilities
+from asgiref.sync import sync_to_async
+
+# Version of a post as the viewer sees it, see picscape.conditional
+POST_VERSION = ('pk', 'modified', 'likes_count', 'user__profile__modified', 'is_liking')
+
+
+class PostsFeedView(AsyncLoginRequiredMixin, CursorPaginationMixin, ListView):
     """
-    Return all published posts
+    Return the posts in the user's home timeline.
     """
     model = Post
     paginate_by = 5
-    ordering = ('-created')
     context_object_name = 'posts'
     template_name = 'posts/feed.html'
 
+    def get_queryset(self):
+        """
+        Return timeline posts with their likes and authors preloaded.
+        """
+        user = self.request.user
+        return timelines.timeline_posts(user).with_feed_data(user)
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Read the requested page of the timeline, then render it,
+        unless the client's copy is still current.
+        """
+        etag = None
+        if not self.uses_page_numbers():
+            etag = await self.get_etag()
+            response = conditional.not_modified(request, etag)
+            if response is not None:
+                return response
+
+        self.object_list = self.get_queryset()
+        paginator, page, posts, is_paginated = await self.apaginate_queryset(
+            self.object_list, self.paginate_by,
+        )
+        posts = await likes_buffer.aoverlay(request.user, posts)
+        # The page is read already, skip the pagination of ListView
+        context = ContextMixin.get_context_data(
+            self,
+            paginator=paginator,
+            page_obj=page,
+            is_paginated=is_paginated,
+            object_list=posts,
+            **{self.context_object_name: posts},
+        )
+        response = self.render_to_response(context)
+        return conditional.set_validator(response, etag) if etag else response
+
+    async def get_etag(self):
+        """
+        Return the validator of the requested page, from the versions of its posts.
+        """
+        user = self.request.user
+        paginator = CursorPaginator(timelines.timeline_posts(user).with_is_liking(user), self.paginate_by)
+        try:
+            _, queryset = paginator.get_queryset(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        versions = queryset.annotate(
+            viewer_modified=conditional.viewer_version(user),
+        ).values_list(*POST_VERSION, 'viewer_modified')
+        rows = [row async for row in versions[:self.paginate_by + 1]]
+        if not rows:
+            rows = await Profile.objects.filter(user=user).values_list('modified', flat=True).afirst()
+        return conditional.etag(user.pk, rows, sorted((await likes_buffer.apending(user)).items()))
+
+
+class ExploreView(LoginRequiredMixin, ListView):
+    """
+    Return the trending posts.
+    """
+    context_object_name = 'posts'
+    template_name = 'posts/explore.html'
+
+    def get_queryset(self):
+        """
+        Return the best scored posts with their likes and authors preloaded.
+        """
+        posts = trending.trending_posts().with_feed_data(self.request.user)
+        return posts[:settings.PICSCAPE_TRENDING_LENGTH]
+
     def get_context_data(self, **kwargs):
         """
-        Add post's likes to context
+        Show the user's buffered likes on the posts.
         """
         context = super().get_context_data(**kwargs)
-        for post in context['posts']:
-            post.likes_count = post.likes.count()
-            post.is_liking = post.likes.filter(
-                user=self.request.user
-            ).exists()
+        context['posts'] = likes_buffer.overlay(self.request.user, list(context['posts']))
         return context
 
 
-class PostDetailView(LoginRequiredMixin, DetailView):
+class PostDetailView(AsyncLoginRequiredMixin, DetailView):
     """
     Return post detail.
     """
@@ -42,15 +132,46 @@ class PostDetailView(LoginRequiredMixin, DetailView):
     slug_field = 'pk'
     slug_url_kwarg = 'pk'
 
+    def get_queryset(self):
+        """
+        Return posts with their likes and authors preloaded.
+        """
+        return super().get_queryset().with_feed_data(self.request.user)
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Read the post, then render it, unless the client's copy is still current.
+        """
+        etag = await self.get_etag()
+        if etag:
+            response = conditional.not_modified(request, etag)
+            if response is not None:
+                return response
+
+        self.object = await aget_object_or_404(self.get_queryset(), pk=kwargs['pk'])
+        await likes_buffer.aoverlay(request.user, [self.object])
+        response = self.render_to_response(self.get_context_data(object=self.object))
+        return conditional.set_validator(response, etag) if etag else response
+
+    async def get_etag(self):
+        """
+        Return the validator of the post's page, or None if there is no such post.
+        """
+        user = self.request.user
+        version = await Post.objects.filter(pk=self.kwargs['pk']).with_is_liking(user).annotate(
+            viewer_modified=conditional.viewer_version(user),
+        ).values_list(*POST_VERSION, 'viewer_modified').afirst()
+        if version is None:
+            return None
+        return conditional.etag(user.pk, version, (await likes_buffer.apending(user)).get(version[0]))
+
     def get_context_data(self, **kwargs):
         """
         Add post's likes to context
         """
         context = super().get_context_data(**kwargs)
-        context['likes_count'] = self.get_object().likes.count()
-        context['is_liking'] = self.get_object().likes.filter(
-            user=self.request.user
-        ).exists()
+        context['likes_count'] = self.object.likes_count
+        context['is_liking'] = self.object.is_liking
         return context
 
 
@@ -60,18 +181,17 @@ class CreatePostView(LoginRequiredMixin, CreateView):
     """
     model = Post
     template_name = 'posts/new.html'
-    fields = [
-        'title',
-        'photo'
-    ]
+    form_class = PostForm
 
     def form_valid(self, form):
         """
-        Validate form.
+        Save the post and deliver it to the followers' timelines.
         """
         form.instance.user = self.request.user
-        form.save()
-        return super(CreatePostView, self).form_valid(form)
+        with transaction.atomic():
+            response = super(CreatePostView, self).form_valid(form)
+            timelines.fan_out(self.object)
+        return response
 
     def get_success_url(self):
         """
@@ -80,35 +200,20 @@ class CreatePostView(LoginRequiredMixin, CreateView):
         return reverse('posts:detail', kwargs={'pk': self.object.pk})
         
 
-class LikeView(LoginRequiredMixin, RedirectView):
+class LikeView(AsyncLoginRequiredMixin, View):
     """
     Like or unlike a post.
     """
-    pattern_name = 'posts:detail'
-    permanent = False
 
-    def get_redirect_url(self, *args, **kwargs):
-        pk = kwargs['pk']
-        post = get_object_or_404(Post, pk=pk)
-        user = self.request.user
+    async def get(self, request, pk):
+        post = await aget_object_or_404(Post.objects.only('pk'), pk=pk)
+
+        # Unlike the post if already liking it, like it otherwise, now or once
+        # buffered. Transactions are not supported by the async ORM, the
+        # toggle runs in a thread.
+        await sync_to_async(likes_buffer.toggle)(request.user, post.pk)
+
+        return redirect('posts:detail', pk=pk)
 
-        # Check if the user is already liking the post
-        like_exists = Likes.objects.filter(
-            user=user,
-            post=post,
-        ).exists()
-
-        if like_exists:
-            # If already liking, unlike
-            Likes.objects.filter(
-                user=user,
-                post=post,
-            ).delete()
-        else:
-            # If not liking, like
-            Likes.objects.create(
-                user=user,
-                post=post,
-            )
-
-        return super().get_redirect_url(*args, **kwargs)
+    async def post(self, request, pk):
+        return await self.get(request, pk)
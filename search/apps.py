@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    """
+    Search application settings.
+    """
+    default_auto_field = "django.db.models.BigAutoField"
+    name = 'search'
+    verbose_name = 'Search'
+
+    def ready(self):
+        """
+        Connect the signal receivers.
+        """
+        import search.signals  # noqa: F401
@@ -0,0 +1,196 @@
+"""
+Full-text indexes of the database engines.
+
+On SQLite, posts and users are indexed in FTS5 virtual tables, ranked with
+BM25. On PostgreSQL, their tsvector documents are stored in tables with GIN
+indexes, ranked with ts_rank. Both backends index the same documents under
+the id of their post or user, and answer searches with lists of ids.
+
+Only the newest matches of a search are ranked: a common word matches a good
+share of all posts, and scoring every one of them would make the most
+frequent searches the slowest.
+"""
+
+# Matches ranked by a search, newest first
+CANDIDATES = 1000
+
+
+class SQLiteBackend:
+    """
+    Full-text index in SQLite FTS5 tables, keyed by rowid.
+    """
+    tables = {
+        # Titles are stemmed, so "sunsets" finds "sunset"
+        'search_post': "fts5(title, tokenize='porter unicode61 remove_diacritics 2')",
+        'search_user': "fts5(username, name, biography, tokenize='unicode61 remove_diacritics 2')",
+        # Whole usernames, with prefix indexes for autocomplete
+        'search_username': (
+            "fts5(username, tokenize=\"unicode61 remove_diacritics 2 tokenchars '_.@+-'\", prefix='1 2 3')"
+        ),
+    }
+
+    # BM25 weights of the username, name and biography columns
+    user_weights = (10.0, 5.0, 1.0)
+
+    def create(self, cursor):
+        for table, definition in self.tables.items():
+            cursor.execute(f'CREATE VIRTUAL TABLE {table} USING {definition}')
+
+    def drop(self, cursor):
+        for table in self.tables:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+    def clear(self, cursor):
+        for table in self.tables:
+            cursor.execute(f'DELETE FROM {table}')
+
+    def delete(self, cursor, tables, ids):
+        if not ids:
+            return
+        placeholders = ', '.join(['%s'] * len(ids))
+        for table in tables:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid IN ({placeholders})', ids)
+
+    def save_posts(self, cursor, rows):
+        self.delete(cursor, ['search_post'], [pk for pk, *_ in rows])
+        cursor.executemany('INSERT INTO search_post (rowid, title) VALUES (%s, %s)', rows)
+
+    def delete_posts(self, cursor, ids):
+        self.delete(cursor, ['search_post'], ids)
+
+    def save_users(self, cursor, rows):
+        self.delete_users(cursor, [pk for pk, *_ in rows])
+        cursor.executemany(
+            'INSERT INTO search_user (rowid, username, name, biography) VALUES (%s, %s, %s, %s)', rows,
+        )
+        cursor.executemany(
+            'INSERT INTO search_username (rowid, username) VALUES (%s, %s)',
+            [(pk, username) for pk, username, *_ in rows],
+        )
+
+    def delete_users(self, cursor, ids):
+        self.delete(cursor, ['search_user', 'search_username'], ids)
+
+    def match(self, terms):
+        # Quoted, the terms are never read as FTS5 operators
+        return ' '.join(f'"{term}"' for term in terms)
+
+    def search_posts(self, cursor, terms, offset, limit):
+        cursor.execute(
+            'SELECT rowid FROM ('
+            'SELECT rowid, rank FROM search_post WHERE search_post MATCH %s ORDER BY rowid DESC LIMIT %s'
+            ') ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+            [self.match(terms), CANDIDATES, limit, offset],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+    def search_users(self, cursor, terms, offset, limit):
+        weights = ', '.join(str(weight) for weight in self.user_weights)
+        cursor.execute(
+            f'SELECT rowid FROM ('
+            f'SELECT rowid, bm25(search_user, {weights}) AS score FROM search_user WHERE search_user MATCH %s '
+            f'ORDER BY rowid DESC LIMIT %s'
+            f') ORDER BY score, rowid LIMIT %s OFFSET %s',
+            [self.match(terms), CANDIDATES, limit, offset],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+    def autocomplete(self, cursor, prefix, limit):
+        cursor.execute(
+            'SELECT rowid FROM search_username WHERE search_username MATCH %s '
+            'ORDER BY length(username), username LIMIT %s',
+            [f'"{prefix}"*', limit],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+class PostgreSQLBackend:
+    """
+    Full-text index in PostgreSQL tsvector documents, keyed by id.
+    """
+
+    def create(self, cursor):
+        cursor.execute('CREATE TABLE search_post (id bigint PRIMARY KEY, document tsvector NOT NULL)')
+        cursor.execute('CREATE INDEX search_post_document_idx ON search_post USING GIN (document)')
+        cursor.execute(
+            'CREATE TABLE search_user (id bigint PRIMARY KEY, username text NOT NULL, document tsvector NOT NULL)'
+        )
+        cursor.execute('CREATE INDEX search_user_document_idx ON search_user USING GIN (document)')
+        cursor.execute('CREATE INDEX search_user_username_idx ON search_user (lower(username) text_pattern_ops)')
+
+    def drop(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS search_post, search_user')
+
+    def clear(self, cursor):
+        cursor.execute('TRUNCATE search_post, search_user')
+
+    def save_posts(self, cursor, rows):
+        cursor.executemany(
+            "INSERT INTO search_post (id, document) VALUES (%s, to_tsvector('english', %s)) "
+            "ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document",
+            rows,
+        )
+
+    def delete_posts(self, cursor, ids):
+        cursor.execute('DELETE FROM search_post WHERE id = ANY(%s)', [list(ids)])
+
+    def save_users(self, cursor, rows):
+        # Weighted like the BM25 columns of SQLite
+        cursor.executemany(
+            "INSERT INTO search_user (id, username, document) VALUES (%s, %s, "
+            "setweight(to_tsvector('simple', %s), 'A') "
+            "|| setweight(to_tsvector('simple', %s), 'B') "
+            "|| setweight(to_tsvector('simple', %s), 'C')) "
+            "ON CONFLICT (id) DO UPDATE SET username = EXCLUDED.username, document = EXCLUDED.document",
+            [(pk, username, username, name, biography) for pk, username, name, biography in rows],
+        )
+
+    def delete_users(self, cursor, ids):
+        cursor.execute('DELETE FROM search_user WHERE id = ANY(%s)', [list(ids)])
+
+    def search_posts(self, cursor, terms, offset, limit):
+        cursor.execute(
+            "SELECT id FROM ("
+            "SELECT id, ts_rank(document, query) AS score "
+            "FROM search_post, plainto_tsquery('english', %s) query WHERE document @@ query "
+            "ORDER BY id DESC LIMIT %s"
+            ") candidates ORDER BY score DESC, id DESC LIMIT %s OFFSET %s",
+            [' '.join(terms), CANDIDATES, limit, offset],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+    def search_users(self, cursor, terms, offset, limit):
+        cursor.execute(
+            "SELECT id FROM ("
+            "SELECT id, ts_rank(document, query) AS score "
+            "FROM search_user, plainto_tsquery('simple', %s) query WHERE document @@ query "
+            "ORDER BY id DESC LIMIT %s"
+            ") candidates ORDER BY score DESC, id LIMIT %s OFFSET %s",
+            [' '.join(terms), CANDIDATES, limit, offset],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+    def autocomplete(self, cursor, prefix, limit):
+        pattern = prefix.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        cursor.execute(
+            'SELECT id FROM search_user WHERE lower(username) LIKE %s '
+            'ORDER BY length(username), username LIMIT %s',
+            [pattern, limit],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgreSQLBackend,
+}
+
+
+def get_backend(connection):
+    """
+    Return the full-text backend of a database connection.
+    """
+    try:
+        return BACKENDS[connection.vendor]()
+    except KeyError:
+        raise NotImplementedError(f'Full-text search is not available on {connection.vendor}.')
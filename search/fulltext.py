@@ -0,0 +1,153 @@
+"""
+Full-text search over posts and users.
+
+Posts are indexed by their title, users by their username, name and
+biography. The signal receivers keep the index in sync with every save and
+delete, in the same transaction, and rebuild() reindexes everything after
+bulk changes that skip the signals.
+"""
+
+# Django
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+
+# Models
+from posts.models import Post
+
+# Backends
+from search.backends import get_backend
+
+# Utilities
+import re
+
+BATCH_SIZE = 1000
+
+# Words of a query past this many are ignored
+MAX_TERMS = 8
+
+# Characters usernames are made of
+USERNAME_CHARACTERS = re.compile(r'[^\w.@+-]')
+
+
+def terms(query):
+    """
+    Return the words of a search query.
+    """
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def write(method, *args):
+    """
+    Run a backend method that changes the index, on the primary database.
+    """
+    connection = connections[router.db_for_write(Post)]
+    with connection.cursor() as cursor:
+        return getattr(get_backend(connection), method)(cursor, *args)
+
+
+def read(method, *args):
+    """
+    Run a backend method that searches the index, on a database read from.
+    """
+    connection = connections[router.db_for_read(Post)]
+    with connection.cursor() as cursor:
+        return getattr(get_backend(connection), method)(cursor, *args)
+
+
+def post_rows(queryset):
+    """
+    Return the indexed documents of posts.
+    """
+    return list(queryset.values_list('pk', 'title'))
+
+
+def user_rows(queryset):
+    """
+    Return the indexed documents of users.
+    """
+    return [
+        (pk, username, f'{first_name} {last_name}'.strip(), biography or '')
+        for pk, username, first_name, last_name, biography in queryset.values_list(
+            'pk', 'username', 'first_name', 'last_name', 'profile__biography',
+        )
+    ]
+
+
+def index_post(post):
+    """
+    Index or reindex a post.
+    """
+    write('save_posts', [(post.pk, post.title)])
+
+
+def unindex_post(pk):
+    """
+    Remove a post from the index.
+    """
+    write('delete_posts', [pk])
+
+
+def index_user(pk):
+    """
+    Index or reindex a user, along with their profile.
+    """
+    write('save_users', user_rows(User.objects.filter(pk=pk)))
+
+
+def unindex_user(pk):
+    """
+    Remove a user from the index.
+    """
+    write('delete_users', [pk])
+
+
+def rebuild(log=None):
+    """
+    Reindex every post and user from scratch.
+    Return the number of indexed posts and users.
+    """
+    log = log or (lambda message: None)
+    totals = {}
+    with transaction.atomic():
+        write('clear')
+        for name, queryset, rows, method in (
+            ('posts', Post.objects.all(), post_rows, 'save_posts'),
+            ('users', User.objects.all(), user_rows, 'save_users'),
+        ):
+            log(f'Indexing {name}...')
+            totals[name] = 0
+            last = 0
+            while True:
+                # Walk the rows in primary key batches, so they are never all in memory
+                batch = rows(queryset.filter(pk__gt=last).order_by('pk')[:BATCH_SIZE])
+                if not batch:
+                    break
+                last = batch[-1][0]
+                write(method, batch)
+                totals[name] += len(batch)
+    return totals
+
+
+def search_posts(query, offset=0, limit=10):
+    """
+    Return the ids of the posts matching every word of the query, best first.
+    """
+    words = terms(query)
+    return read('search_posts', words, offset, limit) if words else []
+
+
+def search_users(query, offset=0, limit=10):
+    """
+    Return the ids of the users matching every word of the query, best first.
+    """
+    words = terms(query)
+    return read('search_users', words, offset, limit) if words else []
+
+
+def autocomplete(prefix, limit=10):
+    """
+    Return the ids of the users whose username starts with the prefix,
+    regardless of case, shortest first.
+    """
+    prefix = USERNAME_CHARACTERS.sub('', prefix)
+    return read('autocomplete', prefix, limit) if prefix else []
@@ -0,0 +1,23 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Search
+from search import fulltext
+
+# Utilities
+import time
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the full-text index from scratch.
+    """
+    help = "Reindex every post and user for full-text search."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        totals = fulltext.rebuild(log=self.stdout.write)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {totals['posts']} posts and {totals['users']} users in {elapsed:.1f}s."
+        ))
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+from search.backends import get_backend
+
+BATCH_SIZE = 1000
+
+
+def batches(queryset, fields):
+    """
+    Yield the values of the rows in primary key batches.
+    """
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last).order_by("pk").values_list("pk", *fields)[:BATCH_SIZE])
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield rows
+
+
+def create_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    Post = apps.get_model("posts", "Post")
+    User = apps.get_model("auth", "User")
+    with schema_editor.connection.cursor() as cursor:
+        backend.create(cursor)
+        for rows in batches(Post.objects.all(), ["title"]):
+            backend.save_posts(cursor, rows)
+        for rows in batches(User.objects.all(), ["username", "first_name", "last_name", "profile__biography"]):
+            backend.save_users(cursor, [
+                (pk, username, f"{first_name} {last_name}".strip(), biography or "")
+                for pk, username, first_name, last_name, biography in rows
+            ])
+
+
+def drop_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        get_backend(schema_editor.connection).drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("posts", "0006_hot_query_indexes"),
+        ("users", "0005_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,63 @@
+# Django
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Models
+from posts.models import Post
+from users.models import Profile
+
+# Search
+from search import fulltext
+
+
+def indexed_fields_changed(update_fields, fields):
+    """
+    Return whether a save may have changed any of the indexed fields.
+    """
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    """
+    Index a new or edited post.
+    """
+    if indexed_fields_changed(update_fields, {'title'}):
+        fulltext.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    """
+    Remove a deleted post from the index.
+    """
+    fulltext.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    """
+    Index a new user, or reindex them when their names change.
+    Logins only update the last login date, and are skipped.
+    """
+    if indexed_fields_changed(update_fields, {'username', 'first_name', 'last_name'}):
+        fulltext.index_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def index_profile(sender, instance, update_fields=None, **kwargs):
+    """
+    Reindex a user when their biography changes.
+    """
+    if indexed_fields_changed(update_fields, {'biography'}):
+        fulltext.index_user(instance.user_id)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    """
+    Remove a deleted user from the index.
+    """
+    fulltext.unindex_user(instance.pk)
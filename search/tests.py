@@ -0,0 +1,128 @@
+# Django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase
+
+# Models
+from users.models import Profile
+
+# Search
+from search import fulltext
+
+# Utilities
+from io import StringIO
+from posts.tests import create_post, create_user
+
+
+class FullTextSearchTestCase(TestCase):
+    """
+    Full-text index tests.
+    """
+
+    def setUp(self):
+        self.author = create_user('author')
+
+    def test_posts_are_indexed_on_save_and_delete(self):
+        post = create_post(self.author, 'Sunset over the ocean')
+        self.assertEqual(fulltext.search_posts('sunsets'), [post.pk])
+        self.assertEqual(fulltext.search_posts('ocean sunset'), [post.pk])
+        self.assertEqual(fulltext.search_posts('ocean mountain'), [])
+
+        post.title = 'Mountain lake'
+        post.save()
+        self.assertEqual(fulltext.search_posts('sunset'), [])
+        self.assertEqual(fulltext.search_posts('lake'), [post.pk])
+
+        post.delete()
+        self.assertEqual(fulltext.search_posts('lake'), [])
+
+    def test_posts_are_ranked(self):
+        once = create_post(self.author, 'Beach trip with a dog, and a long walk home')
+        twice = create_post(self.author, 'Dog on the beach, happy dog')
+        self.assertEqual(fulltext.search_posts('dog'), [twice.pk, once.pk])
+        self.assertEqual(fulltext.search_posts('dog', offset=1), [once.pk])
+
+    def test_queries_are_not_parsed_as_operators(self):
+        post = create_post(self.author, 'Beach OR city')
+        self.assertEqual(fulltext.search_posts('"beach" OR (city*'), [post.pk])
+        self.assertEqual(fulltext.search_posts('" * ()'), [])
+
+    def test_users_are_indexed_with_their_profile(self):
+        user = User.objects.create_user(username='jane_doe', first_name='Jane', last_name='Roe', password='1234')
+        Profile.objects.create(user=user, biography='Street photographer')
+        self.assertEqual(fulltext.search_users('photographer'), [user.pk])
+        self.assertEqual(fulltext.search_users('jane roe'), [user.pk])
+
+        user.last_name = 'Smith'
+        user.save()
+        self.assertEqual(fulltext.search_users('roe'), [])
+        self.assertEqual(fulltext.search_users('smith'), [user.pk])
+
+        user.delete()
+        self.assertEqual(fulltext.search_users('smith'), [])
+        self.assertEqual(fulltext.autocomplete('jane'), [])
+
+    def test_usernames_autocomplete(self):
+        jane = User.objects.create_user(username='jane_doe', password='1234')
+        janet = User.objects.create_user(username='Janet', password='1234')
+        User.objects.create_user(username='john', password='1234')
+        self.assertEqual(fulltext.autocomplete('jan'), [janet.pk, jane.pk])
+        self.assertEqual(fulltext.autocomplete('JANE_'), [jane.pk])
+        self.assertEqual(fulltext.autocomplete('"*'), [])
+
+    def test_rebuild(self):
+        post = create_post(self.author, 'Golden hour')
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM search_post')
+        self.assertEqual(fulltext.search_posts('golden'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(fulltext.search_posts('golden'), [post.pk])
+        self.assertEqual(fulltext.autocomplete('auth'), [self.author.pk])
+
+
+class SearchViewTestCase(TestCase):
+    """
+    Search page and autocomplete API tests.
+    """
+
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.client.force_login(self.viewer)
+        self.async_client.force_login(self.viewer)
+
+    def test_results_are_paginated(self):
+        author = create_user('beach_lover')
+        posts = [create_post(author, f'Beach {i}') for i in range(11)]
+
+        response = self.client.get(reverse('search:results'), {'q': 'beach'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['posts']), 10)
+        self.assertEqual(response.context['users'], [author])
+        self.assertTrue(response.context['has_next'])
+
+        response = self.client.get(reverse('search:results'), {'q': 'beach', 'page': 2})
+        self.assertEqual(len(response.context['posts']), 1)
+        self.assertIn(response.context['posts'][0], posts)
+        self.assertFalse(response.context['has_next'])
+        self.assertEqual(response.context['users'], [])
+
+        response = self.client.get(reverse('search:results'), {'q': 'beach', 'page': 'last'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_users_without_a_picture_or_a_profile(self):
+        User.objects.create_user(username='admin', last_name='Keeper', password='1234')
+        user = User.objects.create_user(username='goalie', last_name='Keeper', password='1234')
+        Profile.objects.create(user=user, biography='Hello!')
+
+        response = self.client.get(reverse('search:results'), {'q': 'keeper'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['users'], [user])
+        self.assertContains(response, 'img/default-profile.png')
+
+    async def test_autocomplete(self):
+        response = await self.async_client.get(reverse('search:api_autocomplete'), {'q': 'vie'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['username'] for user in response.json()['results']], ['viewer'])
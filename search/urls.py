@@ -0,0 +1,22 @@
+# Django
+from django.urls import path
+
+# Views
+from search import views
+
+urlpatterns = [
+
+    path(
+        route='search/',
+        view=views.SearchView.as_view(),
+        name='results'
+    ),
+
+    # API
+    path(
+        route='api/search/users/',
+        view=views.AutocompleteApiView.as_view(),
+        name='api_autocomplete'
+    ),
+
+]
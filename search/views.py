@@ -0,0 +1,103 @@
+# Django
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.models import User
+from django.http import Http404, JsonResponse
+from django.views.generic import TemplateView
+
+# Models
+from posts.models import Post
+
+# Search
+from search import fulltext
+
+# Buffered likes
+from posts import likes_buffer
+
+# API
+from picscape.api import ApiView, picture
+
+# Utilities
+from asgiref.sync import sync_to_async
+
+
+def in_order(objects, ids):
+    """
+    Return the objects of a bulk lookup in the order of the given ids.
+    """
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+class SearchView(LoginRequiredMixin, TemplateView):
+    """
+    Return the users and posts matching a query, best first.
+    """
+    template_name = 'search/results.html'
+    paginate_by = 10
+    users_shown = 5
+
+    # Deeper pages are rarely wanted, and cost more than the first ones
+    max_pages = 50
+
+    def get_page_number(self):
+        """
+        Return the requested page number.
+        """
+        try:
+            number = int(self.request.GET.get('page', 1))
+        except ValueError:
+            raise Http404('Invalid page')
+        if not 1 <= number <= self.max_pages:
+            raise Http404('Invalid page')
+        return number
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user = self.request.user
+        query = self.request.GET.get('q', '').strip()
+        number = self.get_page_number()
+
+        # One more post than shown tells whether there is a next page
+        ids = fulltext.search_posts(query, (number - 1) * self.paginate_by, self.paginate_by + 1)
+        has_next = len(ids) > self.paginate_by and number < self.max_pages
+        ids = ids[:self.paginate_by]
+        context['posts'] = likes_buffer.overlay(user, in_order(Post.objects.with_feed_data(user).in_bulk(ids), ids))
+
+        context['users'] = []
+        if number == 1:
+            user_ids = fulltext.search_users(query, limit=self.users_shown)
+            # Users without a profile, such as the admins, are not shown
+            users = User.objects.filter(profile__isnull=False).select_related('profile')
+            context['users'] = in_order(users.in_bulk(user_ids), user_ids)
+
+        context.update({
+            'query': query,
+            'page_number': number,
+            'has_previous': number > 1,
+            'has_next': has_next,
+        })
+        return context
+
+
+class AutocompleteApiView(ApiView):
+    """
+    Return the users whose username starts with the query.
+    """
+    limit = 10
+
+    async def get(self, request):
+        ids = await sync_to_async(fulltext.autocomplete)(request.GET.get('q', ''), self.limit)
+        rows = {
+            row['pk']: row
+            async for row in User.objects.filter(pk__in=ids).values(
+                'pk', 'username', 'profile__picture', 'profile__picture_renditions',
+            )
+        }
+        return JsonResponse({
+            'results': [
+                {
+                    'username': row['username'],
+                    'picture': picture(row['profile__picture'], row['profile__picture_renditions']),
+                }
+                for row in in_order(rows, ids)
+            ],
+        })
@@ -0,0 +1,125 @@
+# Django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404, JsonResponse
+
+# Models
+from users.models import Follows, Profile, Suggestion
+
+# Timelines
+from posts import timelines
+
+# API
+from picscape.api import ApiView, error, picture
+
+# Utilities
+from asgiref.sync import sync_to_async
+
+
+def serialize_profile(row):
+    """
+    Return the representation of a profile row.
+    """
+    return {
+        'username': row['username'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'biography': row['profile__biography'],
+        'website': row['profile__website'],
+        'picture': picture(row['profile__picture'], row['profile__picture_renditions']),
+        'posts_count': row['profile__posts_count'],
+        'followers_count': row['profile__followers_count'],
+        'following_count': row['profile__following_count'],
+        'is_following': row['is_following'],
+    }
+
+
+class ProfileApiView(ApiView):
+    """
+    Return the summary of a user's profile.
+    """
+
+    async def get(self, request, username):
+        row = await User.objects.filter(username=username).annotate(
+            is_following=Exists(
+                Follows.objects.filter(follower=request.user, followee=OuterRef('pk'))
+            ),
+        ).values(
+            'username',
+            'first_name',
+            'last_name',
+            'profile__biography',
+            'profile__website',
+            'profile__picture',
+            'profile__picture_renditions',
+            'profile__posts_count',
+            'profile__followers_count',
+            'profile__following_count',
+            'is_following',
+        ).afirst()
+        if row is None:
+            raise Http404('No user found matching the query')
+        return JsonResponse(serialize_profile(row))
+
+
+class SuggestionsApiView(ApiView):
+    """
+    Return the users suggested to follow, with how many of the user's
+    followees follow them.
+    """
+
+    async def get(self, request):
+        rows = Suggestion.objects.filter(user=request.user).exclude(
+            # Followed since the suggestions were computed
+            Exists(Follows.objects.filter(follower=request.user, followee=OuterRef('suggested'))),
+        ).order_by('-mutuals', 'suggested').values(
+            'suggested__username',
+            'suggested__profile__picture',
+            'suggested__profile__picture_renditions',
+            'mutuals',
+        )[:settings.PICSCAPE_SUGGESTIONS_LENGTH]
+        return JsonResponse({'results': [
+            {
+                'username': row['suggested__username'],
+                'picture': picture(row['suggested__profile__picture'], row['suggested__profile__picture_renditions']),
+                'mutuals': row['mutuals'],
+            }
+            async for row in rows
+        ]})
+
+
+class FollowApiView(ApiView):
+    """
+    Follow a user with PUT, unfollow them with DELETE.
+    Repeating a request changes nothing, and both return the new state.
+    """
+
+    async def put(self, request, username):
+        return await self.set_following(request, username, True)
+
+    async def delete(self, request, username):
+        return await self.set_following(request, username, False)
+
+    async def set_following(self, request, username, following):
+        followee_id = await User.objects.filter(username=username).values_list('pk', flat=True).afirst()
+        if followee_id is None:
+            raise Http404('No user found matching the query')
+        if followee_id == request.user.pk:
+            return error('Users cannot follow themselves', 400)
+        # Transactions are not supported by the async ORM, write in a thread
+        counts = await sync_to_async(self.write)(request.user, User(pk=followee_id), following)
+        return JsonResponse({'username': username, 'is_following': following, **counts})
+
+    def write(self, follower, followee, following):
+        """
+        Follow or unfollow the user, and return their new counts.
+        """
+        with transaction.atomic():
+            if following:
+                if Follows.objects.follow(follower, followee):
+                    timelines.backfill(follower, followee)
+            elif Follows.objects.unfollow(follower, followee):
+                timelines.prune(follower, followee)
+            return Profile.objects.filter(user=followee).values('followers_count', 'following_count').get()
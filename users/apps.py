@@ -7,3 +7,9 @@ class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
     verbose_name = "Users"
+
+    def ready(self):
+        """
+        Connect the signal receivers.
+        """
+        import users.signals  # noqa: F401
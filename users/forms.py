@@ -5,6 +5,9 @@ from django.contrib.auth.models import User
 # Models
 from users.models import Profile
 
+# Uploads
+from picscape.uploads import StreamedImageField
+
 
 class SignupForm(forms.Form):
     """
@@ -64,3 +67,14 @@ class SignupForm(forms.Form):
         user = User.objects.create_user(**data)
         profile = Profile(user=user)
         profile.save()
+
+
+class ProfileForm(forms.ModelForm):
+    """
+    Profile form.
+    """
+
+    class Meta:
+        model = Profile
+        fields = ['website', 'biography', 'phone_number', 'picture']
+        field_classes = {'picture': StreamedImageField}
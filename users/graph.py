@@ -0,0 +1,109 @@
+"""
+Compact follow graph, for the friends-of-friends suggestions.
+
+Users are numbered by ascending id, and their followees are kept in two flat
+arrays in compressed sparse row form: the followees of the user numbered i
+are targets[offsets[i]:offsets[i + 1]]. Tens of millions of follows fit in a
+few hundred megabytes, and the graph is cheap to send to worker processes.
+
+This module does not use Django, so worker processes can import it without
+setting Django up.
+"""
+
+# Utilities
+from array import array
+from bisect import bisect_left
+from collections import Counter
+import heapq
+
+
+class FollowGraph:
+    """
+    Followees of every user, in compressed sparse row form.
+    """
+
+    def __init__(self, ids, offsets, targets):
+        self.ids = ids
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_follows(cls, ids, follows):
+        """
+        Build the graph of the given ascending user ids, from (follower id,
+        followee id) pairs sorted by follower id. Follows of other users,
+        such as users who signed up after the ids were read, are skipped.
+        """
+        ids = array('q', ids)
+        graph = cls(ids, array('q', [0]), array('i'))
+        follower = 0
+        for follower_id, followee_id in follows:
+            try:
+                position = graph.index(follower_id)
+                followee = graph.index(followee_id)
+            except KeyError:
+                continue
+            while follower < position:
+                graph.offsets.append(len(graph.targets))
+                follower += 1
+            graph.targets.append(followee)
+        while len(graph.offsets) <= len(ids):
+            graph.offsets.append(len(graph.targets))
+        return graph
+
+    def __contains__(self, user_id):
+        try:
+            self.index(user_id)
+        except KeyError:
+            return False
+        return True
+
+    def index(self, user_id):
+        """
+        Return the number of a user, from their id.
+        """
+        position = bisect_left(self.ids, user_id)
+        if position == len(self.ids) or self.ids[position] != user_id:
+            raise KeyError(user_id)
+        return position
+
+    def followees(self, position):
+        """
+        Return the numbers of the users followed by the numbered user.
+        """
+        return self.targets[self.offsets[position]:self.offsets[position + 1]]
+
+    def suggest(self, user_id, limit):
+        """
+        Return up to limit (user id, mutuals) pairs of the users followed by
+        the most users the given user follows, and not by them yet.
+        """
+        position = self.index(user_id)
+        following = self.followees(position)
+        mutuals = Counter()
+        for followee in following:
+            mutuals.update(self.followees(followee))
+        for excluded in (position, *following):
+            mutuals.pop(excluded, None)
+        # Most mutuals first, then oldest users first
+        best = heapq.nsmallest(limit, mutuals.items(), key=lambda item: (-item[1], item[0]))
+        return [(self.ids[suggested], count) for suggested, count in best]
+
+
+# Graph of the worker processes, sent once when they start
+worker_graph = None
+
+
+def start_worker(graph):
+    """
+    Keep the graph in a worker process.
+    """
+    global worker_graph
+    worker_graph = graph
+
+
+def suggest_batch(user_ids, limit):
+    """
+    Return the suggestions of a batch of users, from a worker process.
+    """
+    return [(user_id, worker_graph.suggest(user_id, limit)) for user_id in user_ids]
@@ -0,0 +1,42 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Suggestions
+from users import suggestions
+
+# Utilities
+import os
+
+
+class Command(BaseCommand):
+    """
+    Compute the friends-of-friends follow suggestions.
+    """
+    help = (
+        'Refresh the follow suggestions of the users whose follows changed since the last run, '
+        'or of every user with --full. Run it periodically, for example nightly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Compute the suggestions of every user.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Worker processes the users are sharded over (default: one per CPU).',
+        )
+
+    def handle(self, *args, **options):
+        run = suggestions.refresh(
+            full=options['full'],
+            workers=options['workers'],
+            log=self.stdout.write,
+        )
+        duration = (run.finished - run.started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed the suggestions of {run.users_count} users in {duration:.1f} s.'
+        ))
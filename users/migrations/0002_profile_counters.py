@@ -0,0 +1,60 @@
+# Generated by Django 4.2.5 on 2026-10-18 10:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(model, field):
+    """
+    Return a subquery counting the rows of model that point to the profile's user.
+    """
+    rows = (
+        model.objects.filter(**{field: OuterRef("user")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def populate_counters(apps, schema_editor):
+    """
+    Count the existing posts, followers and followees of every profile.
+    """
+    Profile = apps.get_model("users", "Profile")
+    Follows = apps.get_model("users", "Follows")
+    Post = apps.get_model("posts", "Post")
+    Profile.objects.update(
+        posts_count=count(Post, "user"),
+        followers_count=count(Follows, "followee"),
+        following_count=count(Follows, "follower"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+        ("posts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="posts_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.5 on 2026-10-18 10:51
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(model, field):
+    """
+    Return a subquery counting the rows of model that point to the profile's user.
+    """
+    rows = (
+        model.objects.filter(**{field: OuterRef("user")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """
+    Keep the oldest of every duplicated follow and recount the affected profiles.
+    """
+    Profile = apps.get_model("users", "Profile")
+    Follows = apps.get_model("users", "Follows")
+    duplicates = (
+        Follows.objects.order_by()
+        .values("follower", "followee")
+        .annotate(kept=Min("pk"), total=Count("pk"))
+        .filter(total__gt=1)
+    )
+    user_ids = set()
+    for duplicate in duplicates:
+        Follows.objects.filter(
+            follower=duplicate["follower"], followee=duplicate["followee"]
+        ).exclude(pk=duplicate["kept"]).delete()
+        user_ids.update((duplicate["follower"], duplicate["followee"]))
+
+    Profile.objects.filter(user__in=user_ids).update(
+        followers_count=count(Follows, "followee"),
+        following_count=count(Follows, "follower"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_profile_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="follows",
+            constraint=models.UniqueConstraint(
+                fields=("follower", "followee"), name="unique_follow"
+            ),
+        ),
+    ]
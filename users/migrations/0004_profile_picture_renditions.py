@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_unique_follow"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="picture_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
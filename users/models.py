@@ -1,6 +1,9 @@
 # Django
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 # Utilities
 import os
@@ -35,10 +38,42 @@ class Profile(models.Model):
         null=True
     )
 
+    picture_renditions = models.JSONField(default=dict, blank=True, editable=False)
+
     created = models.DateTimeField(auto_now_add=True)
 
     modified = models.DateTimeField(auto_now=True)
 
+    posts_count = models.PositiveIntegerField(default=0)
+
+    followers_count = models.PositiveIntegerField(default=0)
+
+    following_count = models.PositiveIntegerField(default=0)
+
+    # Last follow or unfollow of the user, for the suggestions refresh
+    following_changed = models.DateTimeField(blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Users with too many followers to fan out their posts
+            models.Index(
+                fields=['followers_count'],
+                name='profile_followers_count_idx',
+            ),
+            # Users whose suggestions are outdated
+            models.Index(
+                fields=['following_changed'],
+                name='profile_following_changed_idx',
+            ),
+        ]
+
+    @property
+    def is_complete(self):
+        """
+        Return whether the profile has a picture and a biography.
+        """
+        return bool(self.picture and self.biography)
+
     def __str__(self):
         """
         Return username.
@@ -46,16 +81,146 @@ class Profile(models.Model):
         return self.user.username
 
 
+class FollowsManager(models.Manager):
+    """
+    Follows manager.
+    Keeps the profiles' followers and following counters in sync.
+    """
+
+    def follow(self, follower, followee):
+        """
+        Make follower follow followee.
+        Return whether a follow was added.
+        """
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    self.create(follower=follower, followee=followee)
+            except IntegrityError:
+                # Already following, possibly from a concurrent request
+                return False
+            Profile.objects.filter(user=follower).update(
+                following_count=F('following_count') + 1,
+                following_changed=timezone.now(),
+            )
+            Profile.objects.filter(user=followee).update(
+                followers_count=F('followers_count') + 1
+            )
+        return True
+
+    def unfollow(self, follower, followee):
+        """
+        Make follower stop following followee.
+        Return whether a follow was removed.
+        """
+        with transaction.atomic():
+            # A single DELETE, without the post_delete receiver: it takes the
+            # write lock first, and the counters are updated below
+            deleted = self.filter(follower=follower, followee=followee)._raw_delete(self.db)
+            if deleted:
+                Profile.objects.filter(user=follower).update(
+                    following_count=Greatest(F('following_count') - deleted, 0),
+                    following_changed=timezone.now(),
+                )
+                Profile.objects.filter(user=followee).update(
+                    followers_count=Greatest(F('followers_count') - deleted, 0)
+                )
+        return bool(deleted)
+
+    def toggle(self, follower, followee):
+        """
+        Unfollow followee if follower is following them, follow otherwise.
+        Return whether follower is following followee afterwards.
+
+        The delete is issued first, so the toggle takes the write lock
+        before reading anything and concurrent toggles are serialized.
+        """
+        with transaction.atomic():
+            if self.unfollow(follower, followee):
+                return False
+            self.follow(follower, followee)
+        return True
+
+
 class Follows(models.Model):
 
-    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    # Indexed by unique_follow
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following', db_index=False)
 
-    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    # Indexed by follow_followee_idx
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers', db_index=False)
 
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = FollowsManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['follower', 'followee'],
+                name='unique_follow',
+            ),
+        ]
+        indexes = [
+            # Followers of a user, covering the fan out of their posts
+            models.Index(
+                fields=['followee', 'follower'],
+                name='follow_followee_idx',
+            ),
+        ]
+
     def __str__(self):
         """
         Return username of both.
         """
         return f"{self.follower} follows {self.followee}"
+
+
+class Suggestion(models.Model):
+    """
+    User suggested to follow, computed by users.suggestions.
+    """
+
+    # Indexed by suggestion_user_mutuals_idx
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggestions', db_index=False)
+
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    # Number of users followed by user that follow suggested
+    mutuals = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            # Suggestions of a user, best first
+            models.Index(
+                fields=['user', '-mutuals', 'suggested'],
+                name='suggestion_user_mutuals_idx',
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Return username of both.
+        """
+        return f"{self.suggested} is suggested to {self.user}"
+
+
+class SuggestionsRun(models.Model):
+    """
+    Computation of the suggestions, see users.suggestions.
+    """
+
+    started = models.DateTimeField()
+
+    finished = models.DateTimeField(blank=True, null=True)
+
+    # Whether the suggestions of every user were computed
+    full = models.BooleanField()
+
+    users_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        """
+        Return start date.
+        """
+        return f"Suggestions run of {self.started}"
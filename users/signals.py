@@ -0,0 +1,119 @@
+# Django
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+# Models
+from users.models import Follows, Profile
+
+# Images
+from picscape import images
+
+# Fragments
+from picscape import fragments
+
+# Blobs
+from blobs import references
+
+# Counters
+from posts.counters import counted_elsewhere
+
+
+@receiver(post_save, sender=Profile)
+def create_picture_renditions(sender, instance, **kwargs):
+    """
+    Create the renditions of a new or replaced profile picture.
+    """
+    if images.needs_renditions(instance, 'picture'):
+        images.schedule(instance, 'picture')
+
+
+@receiver(pre_save, sender=Profile)
+def remember_picture_blobs(sender, instance, update_fields=None, **kwargs):
+    """
+    Remember the blobs the saved picture points to, before they are replaced.
+    """
+    instance._picture_blobs = set()
+    if instance.pk is not None and (update_fields is None or 'picture' in update_fields):
+        instance._picture_blobs = references.stored(Profile, instance.pk, 'picture')
+
+
+@receiver(post_save, sender=Profile)
+def count_picture_blobs(sender, instance, update_fields=None, **kwargs):
+    """
+    Count the references to the blobs of a new or replaced picture.
+    """
+    if update_fields is None or 'picture' in update_fields:
+        references.replace(instance._picture_blobs, references.names_of(instance, 'picture'))
+
+
+@receiver(pre_delete, sender=Profile)
+def remember_deleted_picture_blobs(sender, instance, **kwargs):
+    """
+    Remember the blobs the picture of a profile about to be deleted points to.
+    The instance may hold outdated renditions.
+    """
+    instance._picture_blobs = references.stored(Profile, instance.pk, 'picture')
+
+
+@receiver(post_delete, sender=Profile)
+def release_picture_blobs(sender, instance, **kwargs):
+    """
+    Discount the references of a deleted profile to its picture blobs.
+    """
+    references.replace(instance._picture_blobs, set())
+
+
+@receiver(pre_delete, sender=User)
+def release_follows(sender, instance, **kwargs):
+    """
+    Discount the follows of a user that is about to be deleted.
+    """
+    Profile.objects.filter(user__followers__follower=instance, followers_count__gt=0).update(
+        followers_count=F('followers_count') - 1
+    )
+    Profile.objects.filter(user__following__followee=instance, following_count__gt=0).update(
+        following_count=F('following_count') - 1
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_profile_version(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Refresh the cached cards and headers showing a user's names when they
+    change. They are keyed by the profile's modified date, not the user's.
+    """
+    if created or (update_fields is not None and not {'username', 'first_name', 'last_name'} & set(update_fields)):
+        return
+    Profile.objects.filter(user=instance).update(modified=timezone.now())
+
+
+@receiver(post_delete, sender=Follows)
+def release_follow(sender, instance, origin=None, **kwargs):
+    """
+    Discount a follow deleted without the follows manager, from the admin for example.
+    """
+    if counted_elsewhere(sender, origin):
+        return
+    Profile.objects.filter(user_id=instance.follower_id).update(
+        following_count=Greatest(F('following_count') - 1, 0),
+        following_changed=timezone.now(),
+    )
+    Profile.objects.filter(user_id=instance.followee_id).update(
+        followers_count=Greatest(F('followers_count') - 1, 0)
+    )
+
+
+@receiver(pre_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_header(sender, instance, **kwargs):
+    """
+    Drop the cached header of a profile that is about to change or was deleted.
+    Post cards are keyed by the profile version too, so they are refreshed as well.
+    """
+    if instance.pk is None or instance.modified is None:
+        return
+    fragments.invalidate(fragments.profile_header_keys(instance.user_id, instance.modified))
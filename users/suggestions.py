@@ -0,0 +1,125 @@
+"""
+Friends-of-friends follow suggestions.
+
+A batch job loads the whole follow graph in compact arrays, see users.graph,
+and suggests to every user the users followed by most of their followees.
+The users are sharded by id over worker processes, and the suggestions are
+written back in batches as the workers finish them.
+
+Each run is recorded, so the next one can refresh only the users whose
+follows changed since, along with their followers, whose friends of friends
+those follows are.
+"""
+
+# Django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Models
+from users.models import Follows, Profile, Suggestion, SuggestionsRun
+
+# Graph
+from users.graph import FollowGraph, start_worker, suggest_batch
+
+# Utilities
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+BATCH_SIZE = 1000
+
+
+def load_graph():
+    """
+    Read the follow graph from the database.
+    """
+    ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    # Covered by the unique_follow index, in its order
+    follows = Follows.objects.order_by('follower', 'followee').values_list('follower', 'followee')
+    return FollowGraph.from_follows(
+        ids.iterator(chunk_size=10000),
+        follows.iterator(chunk_size=10000),
+    )
+
+
+def changed_users(since):
+    """
+    Return the ids of the users whose suggestions may have changed since
+    the given date.
+    """
+    changed = Profile.objects.filter(following_changed__gte=since).values_list('user', flat=True)
+    followers = Follows.objects.filter(followee__in=changed).values_list('follower', flat=True)
+    return sorted(set(chain(changed, followers.iterator(chunk_size=10000))))
+
+
+def batches(user_ids):
+    """
+    Split ascending user ids into batches of consecutive ids.
+    """
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        yield user_ids[start:start + BATCH_SIZE]
+
+
+def save(results):
+    """
+    Replace the suggestions of a batch of users.
+    """
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        Suggestion.objects.filter(user__in=[user_id for user_id, _ in results]).delete()
+        # Many thousands of rows per batch, without building model instances
+        cursor.executemany(
+            f'INSERT INTO {qn(Suggestion._meta.db_table)} (user_id, suggested_id, mutuals) VALUES (%s, %s, %s)',
+            [
+                (user_id, suggested_id, mutuals)
+                for user_id, suggestions in results
+                for suggested_id, mutuals in suggestions
+            ],
+        )
+
+
+def compute(user_ids, graph, workers=1, limit=None):
+    """
+    Compute and save the suggestions of the given users.
+    """
+    limit = limit or settings.PICSCAPE_SUGGESTIONS_LENGTH
+    if workers <= 1:
+        start_worker(graph)
+        for user_ids_batch in batches(user_ids):
+            save(suggest_batch(user_ids_batch, limit))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=start_worker, initargs=(graph,)) as executor:
+        futures = [executor.submit(suggest_batch, user_ids_batch, limit) for user_ids_batch in batches(user_ids)]
+        for future in futures:
+            save(future.result())
+
+
+def refresh(full=False, workers=1, log=None):
+    """
+    Compute the suggestions of every user, or only of the users affected by
+    the follows since the last run. Return the run.
+    """
+    log = log or (lambda message: None)
+    last_run = SuggestionsRun.objects.filter(finished__isnull=False).order_by('-started').first()
+    full = full or last_run is None
+    # Follows made from now on are refreshed again by the next run
+    run = SuggestionsRun.objects.create(started=timezone.now(), full=full)
+
+    log('Loading the follow graph...')
+    graph = load_graph()
+
+    if full:
+        user_ids = list(graph.ids)
+    else:
+        # Users who signed up since the graph was read are left to the next run
+        user_ids = [user_id for user_id in changed_users(last_run.started) if user_id in graph]
+
+    log(f'Computing the suggestions of {len(user_ids)} users...')
+    compute(user_ids, graph, workers)
+
+    run.finished = timezone.now()
+    run.users_count = len(user_ids)
+    run.save()
+    return run
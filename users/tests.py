@@ -1,3 +1,200 @@
+# Django
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+# Models
+from posts.models import TimelineEntry
+from users.models import Follows, Suggestion
+
+# Timelines
+from posts import timelines
+
+# Suggestions
+from users import suggestions
+from users.graph import FollowGraph
+
+# Views
+from users.views import ProfileDetailView
+
+# Utilities
+from asgiref.sync import sync_to_async
+from io import StringIO
+from posts.tests import create_user, create_post
+
+
+class ProfileDetailViewTestCase(TestCase):
+    """
+    Profile detail view tests.
+    """
+
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.author = create_user('author')
+        self.client.force_login(self.viewer)
+
+    def get_profile(self, **params):
+        """
+        Return the author's profile page.
+        """
+        response = self.client.get(
+            reverse('users:detail', kwargs={'username': 'author'}),
+            params,
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_posts_are_cursor_paginated(self):
+        for i in range(ProfileDetailView.posts_paginate_by + 1):
+            create_post(self.author, f'post{i}')
+
+        first = self.get_profile()
+        self.assertEqual(len(first.context['posts']), ProfileDetailView.posts_paginate_by)
+        second = self.get_profile(cursor=first.context['page_obj'].next_cursor)
+        self.assertEqual([post.title for post in second.context['posts']], ['post0'])
+        self.assertFalse(second.context['page_obj'].has_next())
+
+
+class FollowViewTestCase(TestCase):
+    """
+    Follow view tests.
+    """
+
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.author = create_user('author')
+        self.post = create_post(self.author)
+        self.async_client.force_login(self.viewer)
+
+    async def test_follow_toggles(self):
+        url = reverse('users:follow', kwargs={'username': 'author'})
+        response = await self.async_client.post(url)
+        self.assertRedirects(
+            response, reverse('users:detail', kwargs={'username': 'author'}), fetch_redirect_response=False,
+        )
+        self.assertTrue(await Follows.objects.filter(follower=self.viewer, followee=self.author).aexists())
+        self.assertTrue(await TimelineEntry.objects.filter(user=self.viewer, post=self.post).aexists())
+
+        await self.async_client.get(url)
+        self.assertFalse(await Follows.objects.filter(follower=self.viewer, followee=self.author).aexists())
+        self.assertFalse(await TimelineEntry.objects.filter(user=self.viewer, post=self.post).aexists())
+
+    async def test_users_cannot_follow_themselves(self):
+        own = await sync_to_async(create_post)(self.viewer, 'own')
+        url = reverse('users:follow', kwargs={'username': 'viewer'})
+        for _ in range(2):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(await Follows.objects.filter(follower=self.viewer, followee=self.viewer).aexists())
+        self.assertTrue(await TimelineEntry.objects.filter(user=self.viewer, post=own).aexists())
+
+        # Even from code that does not check
+        await sync_to_async(timelines.prune)(self.viewer, self.viewer)
+        self.assertTrue(await TimelineEntry.objects.filter(user=self.viewer, post=own).aexists())
+
+    async def test_unknown_users_are_not_found(self):
+        response = await self.async_client.post(reverse('users:follow', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class UsersApiTestCase(TestCase):
+    """
+    Profile and follow API tests.
+    """
+
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.author = create_user('author')
+        self.post = create_post(self.author)
+        self.async_client.force_login(self.viewer)
+
+    async def test_profile_summary(self):
+        response = await self.async_client.get(reverse('users:api_detail', kwargs={'username': 'author'}))
+        data = response.json()
+        self.assertEqual(data['username'], 'author')
+        self.assertEqual(data['posts_count'], 1)
+        self.assertFalse(data['is_following'])
+
+        response = await self.async_client.get(reverse('users:api_detail', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_follows_are_idempotent(self):
+        url = reverse('users:api_follow', kwargs={'username': 'author'})
+        for _ in range(2):
+            response = await self.async_client.put(url)
+            self.assertEqual(response.json(), {
+                'username': 'author', 'is_following': True, 'followers_count': 1, 'following_count': 0,
+            })
+        self.assertTrue(await TimelineEntry.objects.filter(user=self.viewer, post=self.post).aexists())
+
+        for _ in range(2):
+            response = await self.async_client.delete(url)
+            self.assertEqual(response.json()['followers_count'], 0)
+            self.assertFalse(response.json()['is_following'])
+        self.assertFalse(await TimelineEntry.objects.filter(user=self.viewer, post=self.post).aexists())
+
+    async def test_users_cannot_follow_themselves(self):
+        response = await self.async_client.put(reverse('users:api_follow', kwargs={'username': 'viewer'}))
+        self.assertEqual(response.status_code, 400)
+
+
+class SuggestionsTestCase(TestCase):
+    """
+    Friends-of-friends suggestions tests.
+    """
+
+    def setUp(self):
+        self.users = {name: create_user(name) for name in ('ann', 'bob', 'cat', 'dan', 'eve', 'fay')}
+        for follower, followees in {
+            'ann': ['bob', 'cat'],
+            'bob': ['ann', 'dan', 'eve'],
+            'cat': ['dan'],
+            'fay': ['eve'],
+        }.items():
+            for followee in followees:
+                Follows.objects.follow(self.users[follower], self.users[followee])
+        self.async_client.force_login(self.users['ann'])
+
+    def suggested(self, name):
+        """
+        Return the usernames and mutuals of the users suggested to a user.
+        """
+        return list(Suggestion.objects.filter(user=self.users[name]).order_by('-mutuals', 'suggested').values_list(
+            'suggested__username', 'mutuals',
+        ))
+
+    def test_graph(self):
+        graph = FollowGraph.from_follows([1, 2, 3, 5], [(1, 2), (1, 3), (2, 5), (3, 4), (3, 5), (5, 1)])
+        self.assertEqual(list(graph.followees(graph.index(3))), [graph.index(5)])
+        self.assertEqual(graph.suggest(1, 10), [(5, 2)])
+        self.assertEqual(graph.suggest(5, 10), [(2, 1), (3, 1)])
+        self.assertNotIn(4, graph)
+
+    def test_full_run(self):
+        call_command('compute_suggestions', '--full', '--workers', '2', stdout=StringIO())
+        self.assertEqual(self.suggested('ann'), [('dan', 2), ('eve', 1)])
+        self.assertEqual(self.suggested('bob'), [('cat', 1)])
+        self.assertEqual(self.suggested('dan'), [])
+
+    def test_incremental_run_refreshes_changed_users_and_their_followers(self):
+        suggestions.refresh(full=True)
+        Follows.objects.unfollow(self.users['cat'], self.users['dan'])
+        Follows.objects.follow(self.users['cat'], self.users['fay'])
+
+        run = suggestions.refresh()
+        self.assertFalse(run.full)
+        # Cat, and Ann who follows them
+        self.assertEqual(run.users_count, 2)
+        self.assertEqual(self.suggested('ann'), [('dan', 1), ('eve', 1), ('fay', 1)])
+        self.assertEqual(self.suggested('cat'), [('eve', 1)])
+        self.assertEqual(self.suggested('bob'), [('cat', 1)])
+
+    async def test_api_skips_users_followed_since(self):
+        await sync_to_async(suggestions.refresh)(full=True)
+        await Follows.objects.acreate(follower=self.users['ann'], followee=self.users['eve'])
+
+        response = await self.async_client.get(reverse('users:api_suggestions'))
+        self.assertEqual(
+            [(user['username'], user['mutuals']) for user in response.json()['results']],
+            [('dan', 2)],
+        )
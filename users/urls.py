@@ -2,7 +2,7 @@
 from django.urls import path
 
 # View
-from users import views
+from users import api, views
 
 urlpatterns = [
 
@@ -40,4 +40,21 @@ urlpatterns = [
         name='follow'
     ),
 
+    # API
+    path(
+        route='api/u/<str:username>/',
+        view=api.ProfileApiView.as_view(),
+        name='api_detail'
+    ),
+    path(
+        route='api/u/<str:username>/follow/',
+        view=api.FollowApiView.as_view(),
+        name='api_follow'
+    ),
+    path(
+        route='api/suggestions/',
+        view=api.SuggestionsApiView.as_view(),
+        name='api_suggestions'
+    ),
+
 ]
\ No newline at end of file
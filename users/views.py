@@ -1,17 +1,38 @@
 # Django
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import views as auth_views
-from django.views.generic import DetailView, FormView, UpdateView, RedirectView
+from django.views.generic import DetailView, FormView, UpdateView, View
 from django.urls import reverse, reverse_lazy
-from django.shortcuts import get_object_or_404
+from django.shortcuts import redirect
+from django.http import Http404, HttpResponseBadRequest
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 
 # Models
 from django.contrib.auth.models import User
 from posts.models import Post
 from users.models import Profile, Follows
 
+# Timelines
+from posts import timelines
+
+# Pagination
+from posts.pagination import CursorPaginator, InvalidCursor
+
 # Forms
-from users.forms import SignupForm
+from users.forms import ProfileForm, SignupForm
+
+# Middleware
+from picscape.middleware import remember_profile_completion
+
+# Validators
+from picscape import conditional
+
+# Async views
+from picscape.async_views import AsyncLoginRequiredMixin, aget_object_or_404
+
+# Utilities
+from asgiref.sync import sync_to_async
 
 
 class LoginView(auth_views.LoginView):
@@ -57,12 +78,7 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
     """
     template_name = 'users/profile.html'
     model = Profile
-    fields = [
-        'website', 
-        'biography', 
-        'phone_number', 
-        'picture'
-    ]
+    form_class = ProfileForm
 
     def get_object(self):
         """
@@ -70,6 +86,14 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
         """
         return self.request.user.profile
 
+    def form_valid(self, form):
+        """
+        Save the profile and refresh its completion status in the session.
+        """
+        response = super().form_valid(form)
+        remember_profile_completion(self.request, self.object)
+        return response
+
     def get_success_url(self):
         """
         Return to user's profile.
@@ -92,13 +116,64 @@ class ProfileDetailView(LoginRequiredMixin, DetailView):
     slug_field = 'username'
     slug_url_kwarg = 'username' 
     context_object_name = 'user'
+    posts_paginate_by = 12
+
+    def get_queryset(self):
+        """
+        Return users with their profiles preloaded.
+        """
+        return super().get_queryset().select_related('profile')
+
+    def get(self, request, *args, **kwargs):
+        """
+        Render the profile, unless the client's copy is still current.
+        """
+        etag = self.get_etag()
+        if etag:
+            response = conditional.not_modified(request, etag)
+            if response is not None:
+                return response
+        response = super().get(request, *args, **kwargs)
+        return conditional.set_validator(response, etag) if etag else response
+
+    def get_etag(self):
+        """
+        Return the validator of the profile's page, from the versions of its
+        header and of its posts, or None if there is no such user.
+        """
+        viewer = self.request.user
+        username = self.kwargs[self.slug_url_kwarg]
+        header = ('modified', 'posts_count', 'followers_count', 'following_count')
+        is_following = Exists(Follows.objects.filter(follower=viewer, followee=OuterRef('user')))
+        viewer_modified = conditional.viewer_version(viewer)
+
+        paginator = CursorPaginator(Post.objects.filter(user__username=username), self.posts_paginate_by)
+        try:
+            _, posts = paginator.get_queryset(self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        # The header is read along with every post, so a single query is enough
+        versions = list(posts.annotate(
+            is_following=is_following,
+            viewer_modified=viewer_modified,
+        ).values_list(
+            'pk', 'modified', *(f'user__profile__{field}' for field in header), 'is_following', 'viewer_modified',
+        )[:self.posts_paginate_by + 1])
+        if not versions:
+            versions = Profile.objects.filter(user__username=username).annotate(
+                is_following=is_following,
+                viewer_modified=viewer_modified,
+            ).values_list(*header, 'is_following', 'viewer_modified').first()
+            if versions is None:
+                return None
+        return conditional.etag(viewer.pk, versions)
 
     def get_context_data(self, **kwargs):
         """
         Add user's posts to context
         """
         context = super().get_context_data(**kwargs)
-        followee = self.get_object()
+        followee = self.object
         follower = self.request.user
 
         context['is_following'] = Follows.objects.filter(
@@ -106,43 +181,43 @@ class ProfileDetailView(LoginRequiredMixin, DetailView):
             followee=followee,
         ).exists()
 
-        context['posts'] = self.get_object().posts.all()
-        context['posts_count'] = self.get_object().posts.count()
-        context['followers_count'] = self.get_object().followers.count()
-        context['following_count'] = self.get_object().following.count()
+        paginator = CursorPaginator(followee.posts.all(), self.posts_paginate_by)
+        try:
+            context['page_obj'] = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        context['posts'] = context['page_obj'].object_list
+        context['posts_count'] = followee.profile.posts_count
+        context['followers_count'] = followee.profile.followers_count
+        context['following_count'] = followee.profile.following_count
 
         return context
 
 
-class FollowView(LoginRequiredMixin, RedirectView):
+class FollowView(AsyncLoginRequiredMixin, View):
     """
     Follow or unfollow a user.
     """
-    pattern_name = 'users:detail'
-    permanent = False
 
-    def get_redirect_url(self, *args, **kwargs):
-        username = kwargs['username']
-        followee = get_object_or_404(User, username=username)
-        follower = self.request.user
+    async def get(self, request, username):
+        followee = await aget_object_or_404(User.objects.all(), username=username)
+        if followee.pk == request.user.pk:
+            return HttpResponseBadRequest('Users cannot follow themselves')
 
-        # Check if the user is already following
-        follow_exists = Follows.objects.filter(
-            follower=follower,
-            followee=followee,
-        ).exists()
+        # Transactions are not supported by the async ORM, toggle in a thread
+        await sync_to_async(self.toggle)(request.user, followee)
+
+        return redirect('users:detail', username=username)
 
-        if follow_exists:
-            # If already following, unfollow
-            Follows.objects.filter(
-                follower=follower,
-                followee=followee,
-            ).delete()
-        else:
-            # If not following, follow
-            Follows.objects.create(
-                follower=follower,
-                followee=followee,
-            )
-
-        return super().get_redirect_url(*args, **kwargs)
+    async def post(self, request, username):
+        return await self.get(request, username)
+
+    def toggle(self, follower, followee):
+        """
+        Unfollow the user if already following, follow otherwise.
+        """
+        with transaction.atomic():
+            if Follows.objects.toggle(follower, followee):
+                timelines.backfill(follower, followee)
+            else:
+                timelines.prune(follower, followee)